@@ -1,6 +1,7 @@
 from django.contrib import admin
-from .models import Session, Message, MeetingLink
+from .models import Session, Message, MeetingLink, SessionArchive
 from django.utils.html import format_html
+from . import search
 
 class MessageInline(admin.TabularInline):
     model = Message
@@ -11,9 +12,9 @@ class MessageInline(admin.TabularInline):
 
 @admin.register(Session)
 class SessionAdmin(admin.ModelAdmin):
-    list_display = ("id", "title", "created_at", "agent_id", "customer_id", "meeting_link")
+    list_display = ("id", "title", "created_at", "agent_id", "customer_id", "meeting_link", "archived_at")
     search_fields = ("id", "title", "agent_id", "customer_id")
-    readonly_fields = ("created_at",)
+    readonly_fields = ("created_at", "closed_at", "archived_at")
     inlines = [MessageInline]
 
 @admin.register(Message)
@@ -23,10 +24,22 @@ class MessageAdmin(admin.ModelAdmin):
     search_fields = ("sender", "text")
     readonly_fields = ("sent_at",)
 
+    def get_search_results(self, request, queryset, search_term):
+        # full-text index instead of icontains scans over the whole table
+        if not search_term.strip():
+            return queryset, False
+        return search.match(queryset, search_term), False
+
 @admin.register(MeetingLink)
 class MeetingLinkAdmin(admin.ModelAdmin):
     list_display=('id','session','creator','room_name','expires_at','created_at')
     readonly_fields=('created_at',)
     search_fields=('id','session_id','creator','room_name')
     def join_link(self,obj):
-        return format_html("<a href='{}' target='_blank'>Open Join URL</a>",obj.public_url(base='http://127.0.0.1:3000/meet/'))
\ No newline at end of file
+        return format_html("<a href='{}' target='_blank'>Open Join URL</a>",obj.public_url(base='http://127.0.0.1:3000/meet/'))
+
+@admin.register(SessionArchive)
+class SessionArchiveAdmin(admin.ModelAdmin):
+    list_display = ("session", "message_count", "event_count", "last_event_at", "created_at")
+    exclude = ("data",)
+    readonly_fields = ("session", "format", "message_count", "event_count", "last_event_at", "created_at")
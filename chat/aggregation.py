@@ -0,0 +1,218 @@
+#meeting analytics as a fold over the event log. MeetingAccumulator consumes events
+#in created_at order; its state is small and JSON-able, so meeting_event keeps it in
+#MeetingState and meeting_analytics reads one row instead of replaying every event.
+#recompute_meeting_state replays the log through the same code to rebuild or check it.
+#session_report builds session_summary from the same state, one query for all meetings.
+import uuid
+from collections import namedtuple
+from django.utils.dateparse import parse_datetime
+
+#what the accumulator needs from an event; archived events are rebuilt as these
+LoggedEvent=namedtuple("LoggedEvent","meeting_id event_type identity created_at")
+
+
+def _iso(dt):
+    return dt.isoformat() if dt else None
+
+
+def _dt(value):
+    return parse_datetime(value) if value else None
+
+
+class MeetingAccumulator:
+    FIELDS=("event_count","first_event_at","last_event_at","participants","first_join",
+            "last_leave","open_shares","share_intervals")
+
+    def __init__(self,state=None):
+        state=state or {}
+        self.event_count=state.get("event_count",0)
+        self.first_event_at=state.get("first_event_at")
+        self.last_event_at=state.get("last_event_at")
+        self.participants=list(state.get("participants") or [])
+        #identity -> iso time
+        self.first_join=dict(state.get("first_join") or {})
+        self.last_leave=dict(state.get("last_leave") or {})
+        #[[identity, start iso]] (identity may be null, so not a dict)
+        self.open_shares=[list(p) for p in state.get("open_shares") or []]
+        #[[identity, start iso, end iso]]
+        self.share_intervals=[list(p) for p in state.get("share_intervals") or []]
+
+    def state(self):
+        return {f:getattr(self,f) for f in self.FIELDS}
+
+    @classmethod
+    def from_row(cls,row):
+        state={f:getattr(row,f) for f in cls.FIELDS}
+        state["first_event_at"]=_iso(row.first_event_at)
+        state["last_event_at"]=_iso(row.last_event_at)
+        return cls(state)
+
+    def to_row(self,row):
+        for f in self.FIELDS:
+            setattr(row,f,getattr(self,f))
+        row.first_event_at=_dt(self.first_event_at)
+        row.last_event_at=_dt(self.last_event_at)
+        return row
+
+    def add(self,event_type,identity,at):
+        at=_iso(at)
+        self.event_count+=1
+        if self.first_event_at is None:
+            self.first_event_at=at
+        self.last_event_at=at
+        if identity and identity not in self.participants:
+            self.participants.append(identity)
+            self.participants.sort()
+        if event_type=="joined":
+            if identity and identity not in self.first_join:
+                self.first_join[identity]=at
+        elif event_type=="left":
+            if identity:
+                self.last_leave[identity]=at
+        elif event_type=="screen_share_started":
+            #a restart replaces the open share's start but keeps its position
+            for share in self.open_shares:
+                if share[0]==identity:
+                    share[1]=at
+                    break
+            else:
+                self.open_shares.append([identity,at])
+        elif event_type=="screen_share_stopped":
+            for i,(who,start) in enumerate(self.open_shares):
+                if who==identity:
+                    del self.open_shares[i]
+                    self.share_intervals.append([identity,start,at])
+                    break
+
+    def add_event(self,event):
+        self.add(event.event_type,event.identity,event.created_at)
+
+    def call_window(self):
+        #first identified join to last identified leave, falling back to the first/last event
+        start=min(map(_dt,self.first_join.values()),default=None) or _dt(self.first_event_at)
+        end=max(map(_dt,self.last_leave.values()),default=None) or _dt(self.last_event_at)
+        return start,end
+
+    def screen_share_sessions(self,end=None):
+        #closed intervals, then shares still open closed at `end` (default: the last event)
+        end=end or _dt(self.last_event_at)
+        out=[]
+        for who,start,stop in self.share_intervals:
+            start,stop=_dt(start),_dt(stop)
+            out.append({"identity":who,"start":start,"end":stop,"duration_seconds":(stop-start).total_seconds()})
+        if end:
+            for who,start in self.open_shares:
+                start=_dt(start)
+                out.append({"identity":who,"start":start,"end":end,"duration_seconds":(end-start).total_seconds()})
+        return out
+
+    def summary(self,meeting_id,session_id):
+        #the "summary" block of meeting_analytics
+        start,end=_dt(self.first_event_at),_dt(self.last_event_at)
+        return {
+            "meeting_id":str(meeting_id),
+            "session_id":str(session_id),
+            "participants":self.participants,
+            "start_time":start,
+            "end_time":end,
+            "duration_seconds":(end-start).total_seconds() if start and end else None,
+            "first_join":{k:_dt(self.first_join.get(k)) for k in self.participants},
+            "last_leave":{k:_dt(self.last_leave.get(k)) for k in self.participants},
+            "screen_share_sessions":self.screen_share_sessions(),
+        }
+
+
+    def meeting_report(self,link):
+        #one entry of session_summary's "meetings"; shares left open end with the call
+        start,end=self.call_window()
+        shares=[
+            {**share,"start":share["start"].isoformat(),"end":share["end"].isoformat()}
+            for share in self.screen_share_sessions(end=end)
+        ]
+        return {
+            "id":str(link.id),
+            "link_id":str(link.id),
+            "room_name":link.room_name,
+            "started_at":_iso(start),
+            "ended_at":_iso(end),
+            "duration_seconds":(end-start).total_seconds() if start and end else None,
+            "participants":self.participants,
+            "screen_share_sessions":shares,
+            "total_screen_share_seconds":sum(share["duration_seconds"] for share in shares),
+        }
+
+
+def _state_of(link):
+    #accumulator for a MeetingLink fetched with select_related("state")
+    from .models import MeetingState
+    try:
+        return MeetingAccumulator.from_row(link.state)
+    except MeetingState.DoesNotExist:
+        #no events logged yet
+        return MeetingAccumulator()
+
+
+def session_report(session_id):
+    #(meetings, session-level fields) for session_summary. every meeting comes with its
+    #state in one query, so the cost does not grow with the number of meetings or events
+    from .models import MeetingLink
+    links=MeetingLink.objects.filter(session_id=session_id).select_related("state").order_by("-created_at")
+    meetings=[]
+    starts=[]
+    ends=[]
+    for link in links:
+        acc=_state_of(link)
+        start,end=acc.call_window()
+        if start:
+            starts.append(start)
+            ends.append(end)
+        meetings.append(acc.meeting_report(link))
+    return meetings,{
+        "meeting_count":len(meetings),
+        "first_meeting_at":_iso(min(starts,default=None)),
+        "last_meeting_at":_iso(max(ends,default=None)),
+    }
+
+
+def lock_state(meeting_id):
+    #MeetingState row for a meeting, locked for the rest of the transaction. taken
+    #before the event is inserted, so events are folded in created_at order
+    from .models import MeetingState
+    MeetingState.objects.get_or_create(meeting_id=meeting_id)
+    return MeetingState.objects.select_for_update().get(meeting_id=meeting_id)
+
+
+def fold(row,*events):
+    acc=MeetingAccumulator.from_row(row)
+    for event in events:
+        acc.add_event(event)
+    acc.to_row(row).save()
+    return acc
+
+
+def replay_session(events):
+    #{meeting_id: accumulator} from a session's events in created_at order, in one pass
+    accs={}
+    for e in events:
+        acc=accs.get(e.meeting_id)
+        if acc is None:
+            acc=accs[e.meeting_id]=MeetingAccumulator()
+        acc.add_event(e)
+    return accs
+
+
+def _archived_log(data):
+    from .archive import unpack
+    for e in unpack(data)["meeting_events"] if data else []:
+        yield LoggedEvent(uuid.UUID(e["meeting_id"]),e["event_type"],e["identity"],parse_datetime(e["created_at"]))
+
+
+def session_event_log(session_id):
+    #every meeting event of a session in created_at order, one query (or the archive)
+    from .models import MeetingEvent, Session, SessionArchive
+    if Session.objects.filter(id=session_id,archived_at__isnull=False).exists():
+        data=SessionArchive.objects.filter(session_id=session_id).values_list("data",flat=True).first()
+        yield from _archived_log(data)
+        return
+    yield from MeetingEvent.objects.filter(session_id=session_id).order_by("created_at","id").iterator()
+
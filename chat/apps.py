@@ -1,5 +1,15 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_migrate, post_save
 
 
 class ChatConfig(AppConfig):
     name = 'chat'
+
+    def ready(self):
+        from . import search
+        from .cache import link_changed
+        post_migrate.connect(search.ensure_triggers, sender=self)
+        # new, edited or deleted links replace whatever the link cache holds for them
+        MeetingLink = self.get_model("MeetingLink")
+        post_save.connect(link_changed, sender=MeetingLink, dispatch_uid="chat_link_cache_save")
+        post_delete.connect(link_changed, sender=MeetingLink, dispatch_uid="chat_link_cache_delete")
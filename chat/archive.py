@@ -0,0 +1,125 @@
+#hot/cold archival. sessions closed for longer than CHAT_ARCHIVE["AFTER_DAYS"] have
+#their Message and MeetingEvent rows packed into one compressed SessionArchive blob
+#and deleted from the live tables. Session and MeetingLink rows stay, so ids, urls
+#and listings keep working; readers ask this module for the archived rows.
+import json
+import uuid
+import zlib
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .cache import TTLCache
+
+FORMAT=1
+
+#archives never change, so unpacked payloads can be cached for a while
+archive_cache=TTLCache(max_size=256,ttl=300)
+
+
+def _archive_settings():
+    conf=getattr(settings,"CHAT_ARCHIVE",{})
+    return conf.get("AFTER_DAYS",30),conf.get("BATCH",100)
+
+
+def pack(payload):
+    return zlib.compress(json.dumps(payload,separators=(",",":")).encode(),6)
+
+
+def unpack(blob):
+    return json.loads(zlib.decompress(bytes(blob)))
+
+
+def _dt(value):
+    return value.isoformat() if value else None
+
+
+def candidates(days=None,limit=None):
+    #ids of closed, not yet archived sessions past the cutoff, oldest first.
+    #sessions closed before closed_at existed are aged by their last change instead
+    from .models import Session
+    after_days,batch=_archive_settings()
+    cutoff=timezone.now()-timedelta(days=after_days if days is None else days)
+    qs=(
+        Session.objects.filter(is_active=False,archived_at__isnull=True)
+        .alias(closed=Coalesce("closed_at","updated_at"))
+        .filter(closed__lt=cutoff)
+        .order_by("closed","created_at")
+        .values_list("id",flat=True)
+    )
+    return list(qs[:limit or batch])
+
+
+def archive_session(session_id):
+    #moves one session's rows into its archive in a single transaction, so a crash
+    #leaves it either fully live or fully archived. returns (messages, events) moved,
+    #or None if the session isn't eligible any more
+    from .models import Session, SessionArchive, Message, MeetingEvent
+    with transaction.atomic():
+        session=Session.objects.select_for_update().filter(id=session_id).first()
+        if session is None or session.is_active or session.archived_at is not None:
+            return None
+        messages=[
+            {"id":m[0],"seq":m[1],"sender":m[2],"role":m[3],"text":m[4],"sent_at":_dt(m[5])}
+            for m in Message.objects.filter(session=session).order_by("sent_at","id")
+            .values_list("id","seq","sender","role","text","sent_at").iterator()
+        ]
+        events=[
+            {"id":str(e[0]),"meeting_id":str(e[1]),"event_type":e[2],"identity":e[3],"role":e[4],
+             "metadata":e[5],"created_at":_dt(e[6])}
+            for e in MeetingEvent.objects.filter(session=session).order_by("created_at","id")
+            .values_list("id","meeting_id","event_type","identity","role","metadata","created_at").iterator()
+        ]
+        SessionArchive.objects.create(
+            session=session,
+            format=FORMAT,
+            data=pack({"messages":messages,"meeting_events":events}),
+            message_count=len(messages),
+            event_count=len(events),
+            last_event_at=parse_datetime(events[-1]["created_at"]) if events else None,
+        )
+        MeetingEvent.objects.filter(session=session).delete()
+        Message.objects.filter(session=session).delete()
+        session.archived_at=timezone.now()
+        session.save(update_fields=["archived_at"])
+    return len(messages),len(events)
+
+
+def load(session_id):
+    #unpacked payload {"messages": [...], "meeting_events": [...]}, or None
+    from .models import SessionArchive
+    key=str(session_id)
+    payload=archive_cache.get(key)
+    if payload is None:
+        row=SessionArchive.objects.filter(session_id=session_id).values_list("data",flat=True).first()
+        if row is None:
+            return None
+        payload=unpack(row)
+        archive_cache.set(key,payload)
+    return payload
+
+
+def archived_messages(session_id):
+    #unsaved Message instances in (sent_at, id) order
+    from .models import Message
+    payload=load(session_id) or {"messages":[]}
+    return [
+        Message(id=m["id"],session_id=session_id,seq=m["seq"],sender=m["sender"],role=m["role"],
+                text=m["text"],sent_at=parse_datetime(m["sent_at"]))
+        for m in payload["messages"]
+    ]
+
+
+def archived_events(session_id,meeting_id=None):
+    #unsaved MeetingEvent instances in created_at order
+    from .models import MeetingEvent
+    payload=load(session_id) or {"meeting_events":[]}
+    return [
+        MeetingEvent(id=uuid.UUID(e["id"]),meeting_id=uuid.UUID(e["meeting_id"]),session_id=session_id,event_type=e["event_type"],
+                     identity=e["identity"],role=e["role"],metadata=e["metadata"],
+                     created_at=parse_datetime(e["created_at"]))
+        for e in payload["meeting_events"]
+        if meeting_id is None or e["meeting_id"]==str(meeting_id)
+    ]
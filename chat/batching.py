@@ -0,0 +1,151 @@
+#write-behind group commit for chat messages.
+#consumers hand frames to the worker's MessageWriter, which collects them for a few
+#milliseconds (or until the batch is full) and persists them with one bulk_create.
+#a single flusher per event loop keeps insert order == submit order, so per-session
+#ordering is preserved.
+import asyncio
+import weakref
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from .metrics import MESSAGE_BATCH_SIZE
+from .versioning import touch_sessions
+from . import stats
+
+
+def _batch_settings():
+    conf=getattr(settings,"CHAT_MESSAGE_BATCH",{})
+    return conf.get("MAX_SIZE",100),conf.get("MAX_DELAY_MS",5)/1000.0
+
+
+def message_event(msg):
+    #chat.message group payload for a saved Message
+    return {
+        "type":"chat.message",
+        "id":str(msg.id),
+        "seq":msg.seq,
+        "session_id":str(msg.session_id),
+        "sender":msg.sender,
+        "role":msg.role,
+        "text":msg.text,
+        "created_at":msg.sent_at.isoformat(),
+    }
+
+
+def _allocate_seq(session_id,count):
+    #reserve `count` sequence numbers for a session, returns the first one.
+    #the row update takes the session's write lock until commit, so concurrent
+    #workers never hand out the same range.
+    from .models import Session
+    #same UPDATE bumps the session's version stamp for conditional GETs
+    updated=Session.objects.filter(id=session_id).update(
+        last_seq=F("last_seq")+count,version=F("version")+1,updated_at=timezone.now(),
+    )
+    if not updated:
+        raise Session.DoesNotExist(f"session {session_id} not found")
+    touch_sessions()
+    last=Session.objects.filter(id=session_id).values_list("last_seq",flat=True).get()
+    return last-count+1
+
+
+def save_messages(items):
+    #items: list of dicts with session_id/sender/role/text. returns one result per item,
+    #either the saved Message or the exception that item failed with.
+    from .models import Message
+    objs=[Message(**item) for item in items]
+    by_session={}
+    for o in objs:
+        by_session.setdefault(str(o.session_id),[]).append(o)
+    results={}
+    try:
+        with transaction.atomic():
+            for session_id,group in by_session.items():
+                try:
+                    first=_allocate_seq(session_id,len(group))
+                except ObjectDoesNotExist as e:
+                    for o in group:
+                        results[id(o)]=e
+                    continue
+                for i,o in enumerate(group):
+                    o.seq=first+i
+            rows=[o for o in objs if id(o) not in results]
+            if connection.features.can_return_rows_from_bulk_insert:
+                Message.objects.bulk_create(rows)
+            else:
+                for o in rows:
+                    o.save(force_insert=True)
+            for session_id,group in by_session.items():
+                if id(group[0]) not in results:
+                    stats.on_messages(session_id,len(group),max(o.sent_at for o in group))
+        return [results.get(id(o),o) for o in objs]
+    except Exception:
+        if len(objs)==1:
+            raise
+    #a bad row must not sink the rest of the batch
+    out=[]
+    for item in items:
+        try:
+            out.append(save_messages([item])[0])
+        except Exception as e:
+            out.append(e)
+    return out
+
+
+class MessageWriter:
+    def __init__(self,max_size=100,max_delay=0.005):
+        self.max_size=max_size
+        self.max_delay=max_delay
+        self._pending=[]
+        self._full=asyncio.Event()
+        self._task=None
+
+    async def write(self,session_id,sender,role,text):
+        #queue one message and wait until it's committed; returns the saved Message
+        fut=asyncio.get_running_loop().create_future()
+        self._pending.append(({"session_id":session_id,"sender":sender,"role":role,"text":text},fut))
+        if self._task is None or self._task.done():
+            self._task=asyncio.ensure_future(self._run())
+        elif len(self._pending)>=self.max_size:
+            self._full.set()
+        return await fut
+
+    async def _run(self):
+        #flusher only lives while there is work, so short-lived loops don't leak it
+        while self._pending:
+            if len(self._pending)<self.max_size:
+                try:
+                    await asyncio.wait_for(self._full.wait(),self.max_delay)
+                except asyncio.TimeoutError:
+                    pass
+            self._full.clear()
+            batch=self._pending[:self.max_size]
+            del self._pending[:self.max_size]
+            MESSAGE_BATCH_SIZE.observe(len(batch))
+            try:
+                #not thread sensitive: sync views blocked in async_to_sync(pipeline.submit) may be
+                #holding the shared sync thread while they wait for this flush
+                results=await database_sync_to_async(save_messages,thread_sensitive=False)([item for item,_ in batch])
+            except Exception as e:
+                results=[e]*len(batch)
+            for (_,fut),res in zip(batch,results):
+                if fut.done():
+                    continue
+                if isinstance(res,Exception):
+                    fut.set_exception(res)
+                else:
+                    fut.set_result(res)
+
+
+_writers=weakref.WeakKeyDictionary()
+
+def get_writer():
+    #one writer per running event loop (i.e. per ASGI worker)
+    loop=asyncio.get_running_loop()
+    writer=_writers.get(loop)
+    if writer is None:
+        max_size,max_delay=_batch_settings()
+        writer=_writers[loop]=MessageWriter(max_size=max_size,max_delay=max_delay)
+    return writer
@@ -0,0 +1,176 @@
+#small worker-local caches for hot lookups
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+_MISSING=object()
+
+
+class TTLCache:
+    #LRU with a per-entry time to live. thread safe so sync views can invalidate
+    #entries that the event loop is reading.
+    def __init__(self,max_size=10000,ttl=30.0):
+        self.max_size=max_size
+        self.ttl=ttl
+        self._data=OrderedDict()
+        self._lock=threading.Lock()
+
+    def get(self,key,default=None):
+        now=time.monotonic()
+        with self._lock:
+            item=self._data.get(key,_MISSING)
+            if item is _MISSING:
+                return default
+            value,expires=item
+            if expires<=now:
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self,key,value,ttl=None):
+        expires=time.monotonic()+(self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key]=(value,expires)
+            self._data.move_to_end(key)
+            while len(self._data)>self.max_size:
+                self._data.popitem(last=False)
+
+    def invalidate(self,key):
+        with self._lock:
+            self._data.pop(key,None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+def _session_cache_settings():
+    conf=getattr(settings,"CHAT_SESSION_CACHE",{})
+    return conf.get("MAX_SIZE",10000),conf.get("TTL",30)
+
+#session id -> snapshot dict (None for sessions that don't exist)
+session_cache=TTLCache(*_session_cache_settings())
+
+
+def load_session(session_id):
+    #cached snapshot of the fields the consumer needs, or None if there is no such session
+    from .models import Session
+    key=str(session_id)
+    snap=session_cache.get(key,_MISSING)
+    if snap is not _MISSING:
+        return snap
+    try:
+        s=Session.objects.only("id","is_active","agent_id","customer_id").get(id=key)
+        snap={
+            "id":str(s.id),
+            "is_active":s.is_active,
+            "agent_id":s.agent_id,
+            "customer_id":s.customer_id,
+        }
+    except (Session.DoesNotExist,ValidationError):
+        #unknown or malformed id
+        snap=None
+    session_cache.set(key,snap)
+    return snap
+
+
+def _link_cache_settings():
+    conf=getattr(settings,"CHAT_LINK_CACHE",{})
+    return (
+        conf.get("MAX_SIZE",10000),conf.get("TTL",300),conf.get("NOT_FOUND_TTL",30),
+        conf.get("EXPIRED_TTL",3600),conf.get("SHARED_CACHE"),
+    )
+
+#link id -> snapshot dict (None for links that don't exist). expired links stay
+#cached as snapshots with expires_at in the past
+link_cache=TTLCache(*_link_cache_settings()[:2])
+
+
+def _shared_link_cache():
+    #optional cross-worker layer: a CACHES alias (e.g. redis / memcached), or None
+    alias=_link_cache_settings()[4]
+    if not alias:
+        return None
+    from django.core.cache import caches
+    return caches[alias]
+
+
+def _link_key(link_id):
+    return f"chat:link:{link_id}"
+
+
+def link_state(snap):
+    #"not_found", "expired" or "ok"
+    if snap is None:
+        return "not_found"
+    if snap["expires_at"] and timezone.now()>snap["expires_at"]:
+        return "expired"
+    return "ok"
+
+
+def _link_ttl(snap):
+    #positive entries never outlive the link; negative ones use their own TTLs
+    _,ttl,not_found_ttl,expired_ttl,_=_link_cache_settings()
+    if snap is None:
+        return not_found_ttl
+    if snap["expires_at"] is None:
+        return ttl
+    left=(snap["expires_at"]-timezone.now()).total_seconds()
+    return min(ttl,left) if left>0 else expired_ttl
+
+
+def _fetch_link(link_id):
+    from .models import MeetingLink
+    try:
+        m=MeetingLink.objects.only("id","session_id","room_name","expires_at").get(id=link_id)
+    except (MeetingLink.DoesNotExist,ValidationError):
+        return None
+    return {
+        "id":str(m.id),
+        "room_name":m.room_name,
+        "session_id":str(m.session_id),
+        "expires_at":m.expires_at,
+    }
+
+
+async def aload_link(link_id):
+    #cached snapshot of a MeetingLink (or None): worker LRU, then the shared cache,
+    #then the database. hits never touch the ORM
+    from channels.db import database_sync_to_async
+    key=str(link_id)
+    snap=link_cache.get(key,_MISSING)
+    if snap is not _MISSING:
+        return snap
+    shared=_shared_link_cache()
+    if shared is not None:
+        snap=await shared.aget(_link_key(key),_MISSING)
+        if snap is not _MISSING:
+            link_cache.set(key,snap,ttl=_link_ttl(snap))
+            return snap
+    snap=await database_sync_to_async(_fetch_link)(key)
+    ttl=_link_ttl(snap)
+    link_cache.set(key,snap,ttl=ttl)
+    if shared is not None:
+        await shared.aset(_link_key(key),snap,timeout=ttl)
+    return snap
+
+
+def invalidate_link(link_id):
+    #drop a link from this worker's LRU and the shared cache (other workers' LRUs
+    #catch up within their TTL)
+    key=str(link_id)
+    link_cache.invalidate(key)
+    shared=_shared_link_cache()
+    if shared is not None:
+        shared.delete(_link_key(key))
+
+
+def link_changed(sender,instance,**kwargs):
+    invalidate_link(instance.pk)
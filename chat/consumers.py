@@ -1,58 +1,105 @@
 #real-time communication logic
-import json
+import logging
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from asgiref.sync import sync_to_async
 from django.utils import timezone
+from .presence import get_presence
+from . import pipeline
+from . import replay
+from .cache import load_session, session_cache
+from .outbox import make_outbox
+from . import wire
+from .metrics import WS_ACTION_SECONDS, WS_CONNECTIONS, WS_REJECTED, OUTBOX_SLOW_DISCONNECTS
 
-#in-process tracking
-PRESENCE={}
+logger=logging.getLogger(__name__)
+
+#actions get their own latency series, anything else is recorded as "unknown"
+ACTIONS={"identify","resume","message"}
+
+#application close codes (4000-4999 range)
+CLOSE_SESSION_NOT_FOUND=4404
+CLOSE_SESSION_CLOSED=4410
+CLOSE_SLOW_CONSUMER=4008
 
 class SessionConsumer(AsyncWebsocketConsumer):
     #websocket consumer handling real-time chat.
     async def connect(self):
         self.session_id=self.scope['url_route']['kwargs']['session_id']
-        print(f"[WS DEBUG] connect attempt: session={self.session_id} scope_client={self.scope.get('client')} channel={self.channel_name}")
-        self.group_name=f"session_{self.session_id}"
-        #accept connection
-        await self.accept()
-        #add to group
-        await self.channel_layer.group_add(self.group_name,self.channel_name)
-
+        logger.debug("ws connect attempt: session=%s client=%s channel=%s",self.session_id,self.scope.get("client"),self.channel_name)
         #local identity placeholder
         self.user=None
         self.role=None
+        #highest seq already replayed to this client, live frames at or below it are skipped
+        self.replayed_seq=0
+        #outbound frames go through a bounded queue once the connection is set up
+        self.outbox=None
+        self.closing=False
+        self.counted=False
+        #session is validated once here and held for the life of the connection
+        self.session=await database_sync_to_async(load_session)(self.session_id)
+        #json text frames unless the client negotiated the binary protocol
+        self.protocol,subprotocol=wire.negotiate(self.scope)
+        #accept connection (before closing so the client sees our close code)
+        await self.accept(subprotocol=subprotocol)
+        if self.session is None:
+            WS_REJECTED.labels("not_found").inc()
+            await self.close(code=CLOSE_SESSION_NOT_FOUND)
+            return
+        if not self.session["is_active"]:
+            WS_REJECTED.labels("closed").inc()
+            await self.close(code=CLOSE_SESSION_CLOSED)
+            return
+        WS_CONNECTIONS.inc()
+        self.counted=True
+        self.outbox=make_outbox(self._send_frame)
+        self.outbox.start()
+        self.group_name=f"session_{self.session_id}"
+        #add to group
+        await self.channel_layer.group_add(self.group_name,self.channel_name)
+        replay.attach(self.group_name)
         #send ack
         await self.send_json({'type':'connected','session_id':self.session_id})
     
     async def disconnect(self, close_code):
         #remove if identified
-        print(f"[WS DEBUG] disconnect: session={getattr(self,'session_id',None)} close_code={close_code}")
-        if self.user:
+        logger.debug("ws disconnect: session=%s close_code=%s",getattr(self,"session_id",None),close_code)
+        if getattr(self,"counted",False):
+            WS_CONNECTIONS.dec()
+            self.counted=False
+        if getattr(self,"user",None):
             await self._remove_presence(self.session_id,self.user)
             #broadcast presence update
-            await self.channel_layer.group_send(
-                self.group_name,
-                {
-                    "type":"presence.update",
-                    "action":"left",
-                    "user":self.user,
-                }
-            )
+            await self._group_send(wire.with_frames({
+                "type":"presence.update",
+                "action":"left",
+                "user":self.user,
+            }))
 
-            #leave group
+        if getattr(self,"outbox",None) is not None:
+            await self.outbox.stop()
+            self.outbox=None
+        #leave group
+        if hasattr(self,"group_name"):
+            replay.detach(self.group_name)
             await self.channel_layer.group_discard(self.group_name,self.channel_name)
-            
+
     async def receive(self, text_data = None, bytes_data = None):
-        #Handle incoming Websocket json messages
-        if text_data is None:
+        #Handle incoming Websocket messages (json text or msgpack binary)
+        if not hasattr(self,"group_name"):
+            #connection was rejected in connect
             return
         try:
-            data=json.loads(text_data)
-        except Exception:
-            await self.send_json({"error":"invalid_json"})
+            data=wire.decode(text_data,bytes_data)
+        except ValueError:
+            await self.send_json({"error":"invalid_json" if text_data is not None else "invalid_frame"})
             return
         
         action=data.get("action")
+        with WS_ACTION_SECONDS.labels(action if action in ACTIONS else "unknown").time():
+            await self._dispatch(action,data)
+
+    async def _dispatch(self,action,data):
         if action =="identify":
             #client identifies with user and role
             self.user=data.get("user") or data.get("identity")
@@ -60,94 +107,135 @@ class SessionConsumer(AsyncWebsocketConsumer):
             await self._add_presence(self.session_id,self.user)
 
             #notify group of new presence
-            await self.channel_layer.group_send(
-                self.group_name,
-                {
-                    "type":"presence.update",
-                    "action":"joined",
-                    "user":self.user,
-                    "role":self.role,
-                }
-            )
+            await self._group_send(wire.with_frames({
+                "type":"presence.update",
+                "action":"joined",
+                "user":self.user,
+                "role":self.role,
+            }))
 
             #ack with current presence
             online=await self._get_presence(self.session_id)
             await self.send_json({"type":"identified","user":self.user,"online":list(online)})
+            if data.get("last_seq") is not None:
+                await self._resume(data.get("last_seq"),reconnect=True)
+            return
+        #replay frames missed since last_seq (reconnect)
+        if action=="resume":
+            await self._resume(data.get("last_seq"))
             return
         #broadcast message and persist
         if action=="message":
-            text=data.get("text","").strip()
-            if not text:
-                await self.send_json({"error":"empty_text"})
+            if not self.session["is_active"]:
+                await self.send_json({"error":"session_closed","client_id":data.get("client_id")})
                 return
-            
             sender=self.user or data.get("user") or "anonymous"
             role =self.role or data.get("role") or "customer"
 
-            #saving to DB
-            msg_obj=await self._save_message(self.session_id,sender,role,text)
-            payload={
-                "type":"chat.message",
-                "id":str(msg_obj["id"]),
-                "session_id":self.session_id,
-                "sender":msg_obj["sender"],
-                "role":msg_obj["role"],
-                "text":msg_obj["text"],
-                "created_at":msg_obj["created_at"],
-            }
-            await self.channel_layer.group_send(self.group_name,payload)
+            #validate + save (batched with other frames in this worker)
+            try:
+                msg_obj=await pipeline.persist(self.session_id,sender,role,data.get("text"))
+            except pipeline.MessageError as e:
+                await self.send_json({"error":e.code,"client_id":data.get("client_id")})
+                return
+            except Exception:
+                await self.send_json({"error":"save_failed","client_id":data.get("client_id")})
+                return
+            #ack to the sender with the assigned id, then fan out once
+            await self.send_json({"type":"ack","client_id":data.get("client_id"),"id":str(msg_obj.id),"seq":msg_obj.seq})
+            await pipeline.broadcast(msg_obj)
             return
         
         #unknown action
         await self.send_json({"error":"unknown_action","action":action})
     
+    async def chat_batch(self,event):
+        #bulk-posted messages arrive as one group event
+        for message in event["messages"]:
+            await self.chat_message(message)
     async def chat_message(self,event):
         #forward chat.message events to ws
-        await self.send_json({"type":"message",**event})
+        buf=replay.get_buffer(self.group_name)
+        if buf is not None:
+            buf.append(event)
+        if event.get("seq") is not None and event["seq"]<=self.replayed_seq:
+            return
+        await self._enqueue(wire.frame_for(event,self.protocol))
+    async def session_closed(self,event):
+        #close_session was called: stop accepting writes and drop the connection
+        self.session=dict(self.session,is_active=False)
+        session_cache.invalidate(str(self.session_id))
+        await self.send_json({"type":"session.closed","session_id":self.session_id})
+        if self.outbox is not None:
+            await self.outbox.flush()
+        self.closing=True
+        await self.close(code=CLOSE_SESSION_CLOSED)
     async def presence_update(self,event):
-        #event has action(left/joined), user,role
-        await self.send_json({"type":"presence",**event})
-    #helper functions
+        #event has action(left/joined), user,role. only the latest state per user
+        #matters, so a queued update for the same user is replaced rather than appended
+        await self._enqueue(wire.frame_for(event,self.protocol),coalesce=("presence",event.get("user")))
+    #helper functions (presence backend may do blocking IO, keep it off the event loop)
     async def _add_presence(self,session_id,user):
-        PRESENCE.setdefault(session_id,set()).add(user)
+        await sync_to_async(get_presence().join,thread_sensitive=False)(session_id,user,self.channel_name)
     async def _remove_presence(self,session_id,user):
-        s=PRESENCE.get(session_id)
-        if s and user in s:
-            s.remove(user)
-            if len(s)==0:
-                PRESENCE.pop(session_id,None)
+        await sync_to_async(get_presence().leave,thread_sensitive=False)(session_id,user,self.channel_name)
     async def _get_presence(self,session_id):
-        return PRESENCE.get(session_id,set())
-    #DB operations
-    @database_sync_to_async
-    def _save_message(self,session_id,sender,role,text):
-        from .models import Session,Message
-        session=Session.objects.get(id=session_id)
-        msg=Message.objects.create(session=session,sender=sender,role=role,text=text)
-        return{
-            "id":str(msg.id),
-            "sender":msg.sender,
-            "role":msg.role,
-            "text":msg.text,
-            "created_at":msg.sent_at.isoformat(),
-        }
+        return await sync_to_async(get_presence().online,thread_sensitive=False)(session_id)
+    async def _resume(self,last_seq,reconnect=False):
+        #replay from the ring buffer when it covers the gap, otherwise from the DB.
+        #reconnect (identify): last_seq <= 0 is a first join that has the REST history
+        #already, so nothing is replayed
+        try:
+            last_seq=int(last_seq or 0)
+        except (TypeError,ValueError):
+            await self.send_json({"error":"invalid_last_seq"})
+            return
+        if reconnect and last_seq<=0:
+            return
+        events,source,truncated=await replay.missed_events(self.group_name,self.session_id,last_seq)
+        for event in events:
+            await self._enqueue(wire.frame_for(event,self.protocol))
+        if events:
+            self.replayed_seq=max(self.replayed_seq,events[-1]["seq"])
+        await self.send_json({
+            "type":"resumed",
+            "last_seq":events[-1]["seq"] if events else last_seq,
+            "source":source,
+            "truncated":truncated,
+        })
+    async def _group_send(self,event):
+        with WS_ACTION_SECONDS.labels("group_send").time():
+            await self.channel_layer.group_send(self.group_name,event)
     #to send json
-    async def send_json(self,content):
-        await self.send(text_data=json.dumps(content))
+    async def send_json(self,content,coalesce=None):
+        await self._enqueue(wire.encode(content,self.protocol),coalesce)
+    async def _enqueue(self,frame,coalesce=None):
+        if self.closing:
+            return
+        if self.outbox is None:
+            await self._send_frame(frame)
+            return
+        #a full queue or a frame stuck for longer than MAX_LAG_SECONDS means the
+        #client can't keep up: disconnect it, it can resume from its last seq
+        if not self.outbox.put(frame,coalesce) or self.outbox.is_slow():
+            await self._drop_slow_consumer()
+    async def _send_frame(self,frame):
+        if isinstance(frame,bytes):
+            await self.send(bytes_data=frame)
+        else:
+            await self.send(text_data=frame)
+    async def _drop_slow_consumer(self):
+        OUTBOX_SLOW_DISCONNECTS.inc()
+        logger.info("ws slow consumer disconnected: session=%s lag=%.2fs queued=%d",self.session_id,self.outbox.lag(),len(self.outbox))
+        self.closing=True
+        await self.outbox.stop()
+        self.outbox=None
+        await self.close(code=CLOSE_SLOW_CONSUMER)
 
     async def meeting_started(self,event):
         #event: { "type": "meeting_started", "session_id": "...", "link_id": "..." }
-        print(
-            "[WS DEBUG] meeting_started handler called:",
-            "session=", event.get("session_id"),
-            "link=", event.get("link_id"),
-            "chan=", self.channel_name,
-        )
-        await self.send_json({
-            "type":"meeting.started",
-            "session_id":event["session_id"],
-            "link_id": event["link_id"],
-        })
+        logger.debug("ws meeting_started: session=%s link=%s channel=%s",event.get("session_id"),event.get("link_id"),self.channel_name)
+        await self._enqueue(wire.frame_for(event,self.protocol))
 
 
     
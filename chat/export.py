@@ -0,0 +1,106 @@
+#streaming transcript export (messages + meeting events) as NDJSON or CSV.
+#rows come from two chunked DB iterators merged by timestamp, so memory stays flat
+#however long the session is.
+import csv
+import heapq
+import json
+from asgiref.sync import sync_to_async
+
+FORMATS={
+    "ndjson":("application/x-ndjson","ndjson"),
+    "csv":("text/csv","csv"),
+}
+CSV_COLUMNS=["kind","at","session_id","id","seq","meeting_id","actor","role","text","event_type","metadata"]
+
+
+def _live_rows(session_id,chunk_size):
+    from .models import Message,MeetingEvent
+    messages=(
+        Message.objects.filter(session_id=session_id)
+        .order_by("sent_at","id")
+        .values_list("id","seq","sender","role","text","sent_at")
+        .iterator(chunk_size=chunk_size)
+    )
+    events=(
+        MeetingEvent.objects.filter(session_id=session_id)
+        .order_by("created_at","id")
+        .values_list("id","meeting_id","event_type","identity","role","metadata","created_at")
+        .iterator(chunk_size=chunk_size)
+    )
+    return messages,events
+
+
+def transcript_rows(session_id,chunk_size=2000):
+    #yields one dict per message / meeting event in time order
+    from .models import Session
+    from . import archive
+    #archived sessions are read from their (already bounded) blob
+    if Session.objects.filter(id=session_id,archived_at__isnull=False).exists():
+        messages=((m.id,m.seq,m.sender,m.role,m.text,m.sent_at) for m in archive.archived_messages(session_id))
+        events=(
+            (e.id,e.meeting_id,e.event_type,e.identity,e.role,e.metadata,e.created_at)
+            for e in archive.archived_events(session_id)
+        )
+    else:
+        messages,events=_live_rows(session_id,chunk_size)
+    sid=str(session_id)
+
+    def message_rows():
+        for pk,seq,sender,role,text,at in messages:
+            yield at,{"kind":"message","at":at.isoformat(),"session_id":sid,"id":pk,"seq":seq,
+                      "actor":sender,"role":role,"text":text}
+
+    def event_rows():
+        for pk,meeting_id,event_type,identity,role,metadata,at in events:
+            yield at,{"kind":"meeting_event","at":at.isoformat(),"session_id":sid,"id":str(pk),
+                      "meeting_id":str(meeting_id),"actor":identity,"role":role,
+                      "event_type":event_type,"metadata":metadata}
+
+    for _,row in heapq.merge(message_rows(),event_rows(),key=lambda item:item[0]):
+        yield row
+
+
+class _Echo:
+    #csv.writer target that hands the formatted line straight back
+    def write(self,value):
+        return value
+
+
+def encode_rows(rows,fmt):
+    #yields text lines for the chosen format
+    if fmt=="csv":
+        writer=csv.writer(_Echo())
+        yield writer.writerow(CSV_COLUMNS)
+        for row in rows:
+            row=dict(row)
+            if row.get("metadata") is not None:
+                row["metadata"]=json.dumps(row["metadata"])
+            yield writer.writerow([row.get(c) for c in CSV_COLUMNS])
+    else:
+        for row in rows:
+            yield json.dumps(row,default=str)+"\n"
+
+
+def blocks(lines,size=500):
+    #group lines so streaming costs one write (or thread hop) per block, not per row
+    buf=[]
+    for line in lines:
+        buf.append(line)
+        if len(buf)>=size:
+            yield "".join(buf)
+            buf=[]
+    if buf:
+        yield "".join(buf)
+
+
+async def aiter_blocks(lines,size=500):
+    #async view of blocks() for ASGI responses: StreamingHttpResponse would otherwise
+    #consume a sync iterator into a list first. every step runs on the same
+    #thread-sensitive executor, so the DB cursors stay on one connection
+    it=blocks(lines,size)
+    step=sync_to_async(next,thread_sensitive=True)
+    while True:
+        block=await step(it,None)
+        if block is None:
+            return
+        yield block
@@ -0,0 +1,119 @@
+#batched meeting event ingestion (POST /api/meetings/<id>/events/batch/).
+#clients queue events stamped with their own clock and a per-tab (client_id, client_seq)
+#and send them a batch at a time; a retried batch is deduplicated on that pair.
+#client times are clamped so a bad clock can't reorder a meeting's log: never in the
+#future, at most MAX_CLOCK_SKEW_SECONDS in the past, and never before the meeting's
+#last stored event (MeetingState folds events in created_at order).
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .aggregation import lock_state, fold
+from .versioning import bump_meeting, bump_session
+from . import stats
+
+
+def _ingest_settings():
+    conf=getattr(settings,"CHAT_MEETING_EVENTS",{})
+    return conf.get("MAX_BATCH",200),conf.get("MAX_CLOCK_SKEW_SECONDS",300)
+
+
+def parse_batch(data,identity=None,role=None):
+    #(client_id, items) from a request body, items ordered by client_seq with
+    #in-batch duplicates dropped. identity/role are the defaults for items without one.
+    #raises ValueError with a message for the 400 response
+    max_batch,_=_ingest_settings()
+    client_id=data.get("client_id")
+    if not client_id or not isinstance(client_id,str) or len(client_id)>64:
+        raise ValueError("client_id is required (at most 64 characters)")
+    events=data.get("events")
+    if not isinstance(events,list) or not events:
+        raise ValueError("events must be a non-empty list")
+    if len(events)>max_batch:
+        raise ValueError(f"at most {max_batch} events per batch")
+    items={}
+    for raw in events:
+        if not isinstance(raw,dict) or not raw.get("event_type"):
+            raise ValueError("every event needs an event_type")
+        seq=raw.get("client_seq")
+        if not isinstance(seq,int) or isinstance(seq,bool) or seq<0:
+            raise ValueError("every event needs a non-negative integer client_seq")
+        ts=raw.get("client_ts")
+        at=parse_datetime(ts) if isinstance(ts,str) else None
+        if ts is not None and at is None:
+            raise ValueError(f"bad client_ts: {ts!r}")
+        if at is not None and timezone.is_naive(at):
+            at=timezone.make_aware(at)
+        items.setdefault(seq,{
+            "client_seq":seq,
+            "client_ts":at,
+            "event_type":raw["event_type"],
+            "identity":raw.get("identity") or identity,
+            "role":raw.get("role") or role,
+            "metadata":raw.get("metadata") or {},
+        })
+    return client_id,[items[seq] for seq in sorted(items)]
+
+
+def save_batch(meeting,client_id,items):
+    #store a parsed batch for `meeting` (with its session loaded).
+    #returns (saved events, client_seqs already stored by an earlier attempt)
+    from .models import MeetingEvent
+    _,skew=_ingest_settings()
+    with transaction.atomic():
+        #the state row lock serialises batches (and single posts) for this meeting
+        state=lock_state(meeting.id)
+        seqs=[item["client_seq"] for item in items]
+        seen=set(
+            MeetingEvent.objects.filter(meeting=meeting,client_id=client_id,client_seq__in=seqs)
+            .values_list("client_seq",flat=True)
+        )
+        now=timezone.now()
+        floor=max(now-timedelta(seconds=skew),state.last_event_at or now-timedelta(seconds=skew))
+        objs=[]
+        for item in items:
+            if item["client_seq"] in seen:
+                continue
+            at=min(item["client_ts"] or now,now)
+            floor=max(at,floor)
+            objs.append(MeetingEvent(
+                meeting=meeting,
+                session=meeting.session,
+                event_type=item["event_type"],
+                identity=item["identity"],
+                role=item["role"],
+                metadata=item["metadata"],
+                created_at=floor,
+                client_id=client_id,
+                client_seq=item["client_seq"],
+            ))
+        if objs:
+            MeetingEvent.objects.bulk_create(objs)
+            fold(state,*objs)
+            stats.on_meeting_events(objs)
+            bump_meeting(meeting.id)
+            bump_session(meeting.session_id)
+    return objs,sorted(seen)
+
+
+def save_event(meeting,event_type,identity=None,role=None,metadata=None):
+    #store one event stamped with server time (POST /events/, and events the server logs
+    #itself such as composition_created), folded and counted like a batch
+    from .models import MeetingEvent
+    with transaction.atomic():
+        #lock the analytics row first so events are folded in created_at order
+        state=lock_state(meeting.id)
+        ev=MeetingEvent.objects.create(
+            meeting=meeting,
+            session=meeting.session,
+            event_type=event_type,
+            identity=identity,
+            role=role,
+            metadata=metadata or {},
+        )
+        fold(state,ev)
+        stats.on_meeting_event(ev)
+        bump_meeting(meeting.id)
+        bump_session(meeting.session_id)
+    return ev
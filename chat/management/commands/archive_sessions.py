@@ -0,0 +1,46 @@
+#moves sessions closed for more than --days into SessionArchive blobs.
+#each session is archived in its own transaction, so the command can be stopped at
+#any point and simply run again; already archived sessions are skipped.
+#
+#  python manage.py archive_sessions --days 30 --batch 200
+#  python manage.py archive_sessions --loop --sleep 300      (keep running)
+import time
+from django.core.management.base import BaseCommand
+from chat import archive
+
+
+class Command(BaseCommand):
+    help="Archive messages and meeting events of long-closed sessions"
+
+    def add_arguments(self,parser):
+        parser.add_argument("--days",type=int,default=None,help="closed for at least this many days (default CHAT_ARCHIVE AFTER_DAYS)")
+        parser.add_argument("--batch",type=int,default=None,help="sessions per round (default CHAT_ARCHIVE BATCH)")
+        parser.add_argument("--max-sessions",type=int,default=0,help="stop after this many sessions (0 = no limit)")
+        parser.add_argument("--loop",action="store_true",help="keep polling for newly eligible sessions")
+        parser.add_argument("--sleep",type=float,default=300,help="seconds between rounds with --loop")
+        parser.add_argument("--dry-run",action="store_true",help="only list the sessions that would be archived")
+
+    def handle(self,*args,**opts):
+        done=0
+        while True:
+            ids=archive.candidates(days=opts["days"],limit=opts["batch"])
+            if opts["max_sessions"]:
+                ids=ids[:opts["max_sessions"]-done]
+            if opts["dry_run"]:
+                for sid in ids:
+                    self.stdout.write(str(sid))
+                return
+            for sid in ids:
+                moved=archive.archive_session(sid)
+                if moved is None:
+                    continue
+                done+=1
+                if opts["verbosity"]>1:
+                    self.stdout.write(f"{sid}: {moved[0]} messages, {moved[1]} events")
+            if opts["max_sessions"] and done>=opts["max_sessions"]:
+                break
+            if not ids:
+                if not opts["loop"]:
+                    break
+                time.sleep(opts["sleep"])
+        self.stdout.write(self.style.SUCCESS(f"archived {done} sessions"))
@@ -0,0 +1,130 @@
+#issue_meeting_token throughput benchmark: a reconnect storm of R requests spread over
+#L links x I identities, C in flight at once, in-process on a throwaway test database.
+#--path full goes through the whole ASGI request stack (middleware included), --path view
+#calls the view directly. --cold empties the link and token caches before every request,
+#which is the uncached path (link lookup + JWT signing on every call).
+#
+#  python manage.py bench_tokens --requests 5000 --concurrency 50
+#  python manage.py bench_tokens --cold --path view
+import asyncio
+import json
+import platform
+import time
+from datetime import timedelta
+import django
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient, AsyncRequestFactory, override_settings
+from django.utils import timezone
+from .bench_ws import _git_commit, percentile
+
+#signing is local, so made-up credentials exercise the real JWT path
+FAKE_TWILIO={
+    "TWILIO_ACCOUNT_SID":"AC"+"0"*32,
+    "TWILIO_API_KEY_SID":"SK"+"0"*32,
+    "TWILIO_API_KEY_SECRET":"bench-"+"0"*32,
+}
+
+
+async def run_bench(links,identities,requests,concurrency,cold,path):
+    from chat import tokens, views
+    from chat.cache import link_cache
+    from chat.models import MeetingLink, Session
+
+    def setup():
+        s=Session.objects.create(title="bench-tokens")
+        expires=timezone.now()+timedelta(hours=1)
+        return [str(MeetingLink.objects.create(session=s,room_name=f"bench-{i}",expires_at=expires).id) for i in range(links)]
+
+    link_ids=await sync_to_async(setup)()
+    tokens.token_cache.clear()
+    link_cache.clear()
+    client=AsyncClient()
+    factory=AsyncRequestFactory()
+    sem=asyncio.Semaphore(concurrency)
+    latencies=[]
+    failures=0
+
+    async def one(i):
+        nonlocal failures
+        link_id=link_ids[i%links]
+        body={"identity":f"user-{i%identities}"}
+        async with sem:
+            if cold:
+                tokens.token_cache.clear()
+                link_cache.clear()
+            t0=time.perf_counter()
+            if path=="full":
+                res=await client.post(f"/api/meetings/{link_id}/issue/",body,content_type="application/json")
+            else:
+                req=factory.post(f"/api/meetings/{link_id}/issue/",body,content_type="application/json")
+                res=await views.issue_meeting_token(req,link_id=link_id)
+            latencies.append(time.perf_counter()-t0)
+            if res.status_code!=200:
+                failures+=1
+
+    t0=time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed=time.perf_counter()-t0
+    #let fire-and-forget broadcasts drain before the loop closes
+    await asyncio.gather(*list(views._background),return_exceptions=True)
+
+    latencies.sort()
+    ms=lambda v:round(v*1000,3) if v is not None else None
+    return {
+        "requests":requests,
+        "failures":failures,
+        "seconds":round(elapsed,4),
+        "tokens_per_sec":round(requests/elapsed,1) if elapsed else None,
+        "latency_ms":{
+            "p50":ms(percentile(latencies,50)),
+            "p95":ms(percentile(latencies,95)),
+            "p99":ms(percentile(latencies,99)),
+            "max":ms(latencies[-1] if latencies else None),
+        },
+        "cached_tokens":len(tokens.token_cache),
+    }
+
+
+class Command(BaseCommand):
+    help="Benchmark issue_meeting_token: tokens/sec and latency under a reconnect storm"
+
+    def add_arguments(self,parser):
+        parser.add_argument("--links",type=int,default=5)
+        parser.add_argument("--identities",type=int,default=50,help="distinct identities per run")
+        parser.add_argument("--requests",type=int,default=2000)
+        parser.add_argument("--concurrency",type=int,default=50)
+        parser.add_argument("--cold",action="store_true",help="empty the link and token caches before every request")
+        parser.add_argument("--path",choices=["full","view"],default="full")
+        parser.add_argument("--dummy",action="store_true",help="don't sign JWTs (dev-mode dummy tokens)")
+        parser.add_argument("--output",default="bench_tokens.json",help="JSON results file")
+
+    def handle(self,*args,**opts):
+        old_name=connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0,autoclobber=True,serialize=False)
+        creds={k:None for k in FAKE_TWILIO} if opts["dummy"] else FAKE_TWILIO
+        try:
+            #the test client calls itself "testserver"
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS,"testserver"],**creds):
+                results=asyncio.run(run_bench(
+                    opts["links"],opts["identities"],opts["requests"],
+                    opts["concurrency"],opts["cold"],opts["path"],
+                ))
+        finally:
+            connection.creation.destroy_test_db(old_name,verbosity=0)
+
+        report={
+            "benchmark":"bench_tokens",
+            "commit":_git_commit(),
+            "timestamp":time.strftime("%Y-%m-%dT%H:%M:%SZ",time.gmtime()),
+            "python":platform.python_version(),
+            "django":django.get_version(),
+            "params":{k:opts[k] for k in ("links","identities","requests","concurrency","cold","path","dummy")},
+            "results":results,
+        }
+        with open(opts["output"],"w") as f:
+            json.dump(report,f,indent=2)
+        self.stdout.write(json.dumps(results,indent=2))
+        self.stdout.write(self.style.SUCCESS(f"results written to {opts['output']}"))
@@ -0,0 +1,194 @@
+#websocket load generator / fan-out latency benchmark for SessionConsumer.
+#runs S sessions x C clients in-process through channels' WebsocketCommunicator
+#against chat.routing.websocket_urlpatterns, on a throwaway test database.
+#
+#  python manage.py bench_ws --sessions 20 --clients 5 --messages 50 --output bench_ws.json
+import asyncio
+import json
+import platform
+import subprocess
+import time
+import django
+import msgpack
+from asgiref.sync import sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+MARK="bench|"
+
+
+def percentile(sorted_values,p):
+    if not sorted_values:
+        return None
+    k=min(len(sorted_values)-1,max(0,int(round(p/100.0*(len(sorted_values)-1)))))
+    return sorted_values[k]
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git","rev-parse","HEAD"],stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+class Client:
+    #one simulated websocket client; a reader task records message arrival times
+    def __init__(self,app,session_id,name,protocol):
+        self.session_id=session_id
+        self.name=name
+        self.binary=protocol=="msgpack"
+        subprotocols=["chat.msgpack.v1"] if self.binary else None
+        self.comm=WebsocketCommunicator(app,f"/ws/sessions/{session_id}/",subprotocols=subprotocols)
+        self.latencies=[]
+        self.acks=0
+        self.identified=asyncio.Event()
+        self.reader=None
+
+    async def connect(self):
+        ok,_=await self.comm.connect(timeout=30)
+        if not ok:
+            raise RuntimeError(f"connect refused for session {self.session_id}")
+        self.reader=asyncio.ensure_future(self._read())
+
+    async def send(self,data):
+        if self.binary:
+            await self.comm.send_to(bytes_data=msgpack.packb(data,use_bin_type=True))
+        else:
+            await self.comm.send_to(text_data=json.dumps(data))
+
+    async def _read(self):
+        while True:
+            out=await self.comm.output_queue.get()
+            now=time.perf_counter()
+            if out.get("type")!="websocket.send":
+                return
+            if out.get("bytes") is not None:
+                data=msgpack.unpackb(out["bytes"],raw=False)
+                text=data.get("x") or data.get("text")
+                kind=data.get("t") or data.get("type")
+            else:
+                data=json.loads(out["text"])
+                text=data.get("text")
+                kind=data.get("type")
+            if kind=="identified":
+                self.identified.set()
+            elif kind=="ack":
+                self.acks+=1
+            elif text and text.startswith(MARK):
+                sent_at=float(text.rsplit("|",1)[1])
+                self.latencies.append(now-sent_at)
+
+    async def close(self):
+        if self.reader is not None:
+            self.reader.cancel()
+        try:
+            await self.comm.disconnect()
+        except Exception:
+            pass
+
+
+async def run_bench(sessions,clients,messages,interval,protocol,settle):
+    from chat.models import Session,Message
+    from chat.routing import websocket_urlpatterns
+    app=URLRouter(websocket_urlpatterns)
+
+    session_ids=await sync_to_async(
+        lambda:[str(Session.objects.create(title=f"bench-{i}").id) for i in range(sessions)]
+    )()
+    rows_before=await sync_to_async(Message.objects.count)()
+
+    pool=[Client(app,sid,f"c{sid[:8]}-{j}",protocol) for sid in session_ids for j in range(clients)]
+
+    t0=time.perf_counter()
+    await asyncio.gather(*(c.connect() for c in pool))
+    connect_elapsed=time.perf_counter()-t0
+
+    t0=time.perf_counter()
+    for c in pool:
+        await c.send({"action":"identify","user":c.name,"role":"customer"})
+    await asyncio.gather(*(asyncio.wait_for(c.identified.wait(),30) for c in pool))
+    identify_elapsed=time.perf_counter()-t0
+
+    async def burst(c):
+        for i in range(messages):
+            await c.send({"action":"message","text":f"{MARK}{c.name}|{i}|{time.perf_counter()}","client_id":i})
+            if interval:
+                await asyncio.sleep(interval)
+
+    expected=len(pool)*messages*clients
+    t0=time.perf_counter()
+    await asyncio.gather(*(burst(c) for c in pool))
+    #wait for fan-out to finish (or stall)
+    deadline=time.perf_counter()+settle
+    while time.perf_counter()<deadline:
+        if sum(c.acks for c in pool)>=len(pool)*messages and sum(len(c.latencies) for c in pool)>=expected:
+            break
+        await asyncio.sleep(0.005)
+    send_elapsed=time.perf_counter()-t0
+
+    await asyncio.gather(*(c.close() for c in pool))
+    rows_after=await sync_to_async(Message.objects.count)()
+
+    latencies=sorted(l for c in pool for l in c.latencies)
+    acked=sum(c.acks for c in pool)
+    ms=lambda v:round(v*1000,3) if v is not None else None
+    return {
+        "connections":len(pool),
+        "connect_seconds":round(connect_elapsed,4),
+        "connects_per_sec":round(len(pool)/connect_elapsed,1) if connect_elapsed else None,
+        "identify_seconds":round(identify_elapsed,4),
+        "messages_sent":len(pool)*messages,
+        "messages_acked":acked,
+        "messages_per_sec":round(acked/send_elapsed,1) if send_elapsed else None,
+        "deliveries_expected":expected,
+        "deliveries_received":len(latencies),
+        "deliveries_per_sec":round(len(latencies)/send_elapsed,1) if send_elapsed else None,
+        "fanout_latency_ms":{
+            "p50":ms(percentile(latencies,50)),
+            "p95":ms(percentile(latencies,95)),
+            "p99":ms(percentile(latencies,99)),
+            "max":ms(latencies[-1] if latencies else None),
+        },
+        "db_rows_written":rows_after-rows_before,
+    }
+
+
+class Command(BaseCommand):
+    help="Benchmark SessionConsumer: connect rate, messages/sec and fan-out latency"
+
+    def add_arguments(self,parser):
+        parser.add_argument("--sessions",type=int,default=10)
+        parser.add_argument("--clients",type=int,default=5,help="clients per session")
+        parser.add_argument("--messages",type=int,default=20,help="messages each client sends")
+        parser.add_argument("--interval",type=float,default=0.0,help="seconds between a client's messages")
+        parser.add_argument("--protocol",choices=["json","msgpack"],default="json")
+        parser.add_argument("--settle",type=float,default=30.0,help="max seconds to wait for fan-out")
+        parser.add_argument("--output",default="bench_ws.json",help="JSON results file")
+
+    def handle(self,*args,**opts):
+        #throwaway database so the numbers don't depend on (or touch) local data
+        old_name=connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0,autoclobber=True,serialize=False)
+        try:
+            results=asyncio.run(run_bench(
+                opts["sessions"],opts["clients"],opts["messages"],
+                opts["interval"],opts["protocol"],opts["settle"],
+            ))
+        finally:
+            connection.creation.destroy_test_db(old_name,verbosity=0)
+
+        report={
+            "benchmark":"bench_ws",
+            "commit":_git_commit(),
+            "timestamp":time.strftime("%Y-%m-%dT%H:%M:%SZ",time.gmtime()),
+            "python":platform.python_version(),
+            "django":django.get_version(),
+            "params":{k:opts[k] for k in ("sessions","clients","messages","interval","protocol")},
+            "results":results,
+        }
+        with open(opts["output"],"w") as f:
+            json.dump(report,f,indent=2)
+        self.stdout.write(json.dumps(results,indent=2))
+        self.stdout.write(self.style.SUCCESS(f"results written to {opts['output']}"))
@@ -0,0 +1,95 @@
+#bulk transcript export: one file per session, written by a pool of worker threads.
+#
+#  python manage.py export_transcripts --all --format csv --gzip --workers 8 --output-dir exports/
+#  python manage.py export_transcripts <session_id> <session_id> ...
+import gzip
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils.dateparse import parse_datetime
+from chat import export
+from chat.models import Session
+
+
+def export_session(session_id,output_dir,fmt,compress,chunk_size):
+    #writes one transcript file, returns (path, rows)
+    _,ext=export.FORMATS[fmt]
+    path=os.path.join(output_dir,f"{session_id}.{ext}"+(".gz" if compress else ""))
+    rows=0
+
+    def counted(it):
+        nonlocal rows
+        for row in it:
+            rows+=1
+            yield row
+
+    try:
+        opener=gzip.open if compress else open
+        with opener(path,"wt",encoding="utf-8",newline="") as fh:
+            lines=export.encode_rows(counted(export.transcript_rows(session_id,chunk_size=chunk_size)),fmt)
+            for block in export.blocks(lines):
+                fh.write(block)
+    finally:
+        #each worker thread has its own connection; don't leave them open
+        connection.close()
+    return path,rows
+
+
+class Command(BaseCommand):
+    help="Export session transcripts (messages + meeting events) to NDJSON/CSV files"
+
+    def add_arguments(self,parser):
+        parser.add_argument("session_ids",nargs="*",help="sessions to export (default: use --all/--closed)")
+        parser.add_argument("--all",action="store_true",help="export every session")
+        parser.add_argument("--closed",action="store_true",help="only sessions that are no longer active")
+        parser.add_argument("--created-after",help="ISO datetime lower bound on session created_at")
+        parser.add_argument("--created-before",help="ISO datetime upper bound on session created_at")
+        parser.add_argument("--format",choices=sorted(export.FORMATS),default="ndjson")
+        parser.add_argument("--output-dir",default="exports")
+        parser.add_argument("--gzip",action="store_true",help="gzip each file")
+        parser.add_argument("--workers",type=int,default=4)
+        parser.add_argument("--chunk-size",type=int,default=2000,help="rows fetched per DB round trip")
+
+    def _session_ids(self,opts):
+        if opts["session_ids"]:
+            return list(opts["session_ids"])
+        if not (opts["all"] or opts["closed"] or opts["created_after"] or opts["created_before"]):
+            raise CommandError("pass session ids or one of --all/--closed/--created-after/--created-before")
+        qs=Session.objects.all()
+        if opts["closed"]:
+            qs=qs.filter(is_active=False)
+        for opt,lookup in (("created_after","created_at__gte"),("created_before","created_at__lt")):
+            if opts[opt]:
+                dt=parse_datetime(opts[opt])
+                if dt is None:
+                    raise CommandError(f"invalid datetime for --{opt.replace('_','-')}")
+                qs=qs.filter(**{lookup:dt})
+        return [str(pk) for pk in qs.order_by("created_at").values_list("id",flat=True).iterator()]
+
+    def handle(self,*args,**opts):
+        ids=self._session_ids(opts)
+        os.makedirs(opts["output_dir"],exist_ok=True)
+        started=time.perf_counter()
+        failed=0
+        with ThreadPoolExecutor(max_workers=max(1,opts["workers"])) as pool:
+            futures={
+                pool.submit(export_session,sid,opts["output_dir"],opts["format"],opts["gzip"],opts["chunk_size"]):sid
+                for sid in ids
+            }
+            for future in as_completed(futures):
+                sid=futures[future]
+                try:
+                    path,rows=future.result()
+                except Exception as e:
+                    failed+=1
+                    self.stderr.write(f"{sid}: {e}")
+                    continue
+                if opts["verbosity"]>1:
+                    self.stdout.write(f"{path} ({rows} rows)")
+        self.stdout.write(self.style.SUCCESS(
+            f"exported {len(ids)-failed}/{len(ids)} sessions in {time.perf_counter()-started:.1f}s"
+        ))
+        if failed:
+            raise CommandError(f"{failed} export(s) failed")
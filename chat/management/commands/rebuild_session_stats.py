@@ -0,0 +1,22 @@
+#recomputes SessionStats and meeting call windows from the message/event tables
+#(and archives). safe to run at any time; rows are replaced a chunk at a time.
+#
+#  python manage.py rebuild_session_stats
+#  python manage.py rebuild_session_stats <session_id> ...
+import time
+from django.core.management.base import BaseCommand
+from chat import stats
+
+
+class Command(BaseCommand):
+    help="Rebuild the denormalised SessionStats rollups"
+
+    def add_arguments(self,parser):
+        parser.add_argument("session_ids",nargs="*",help="only these sessions (default: all)")
+
+    def handle(self,*args,**opts):
+        started=time.perf_counter()
+        done=stats.rebuild(session_ids=opts["session_ids"] or None)
+        self.stdout.write(self.style.SUCCESS(
+            f"rebuilt stats for {done} sessions in {time.perf_counter()-started:.1f}s"
+        ))
@@ -0,0 +1,50 @@
+#rebuilds MeetingState rows by replaying each session's event log (live or archived)
+#once, through the same accumulator meeting_event uses. --check only reports drift.
+#
+#  python manage.py recompute_meeting_state --check
+#  python manage.py recompute_meeting_state <link_id> ...
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from chat.aggregation import MeetingAccumulator, replay_session, session_event_log
+from chat.models import MeetingLink, MeetingState
+
+
+class Command(BaseCommand):
+    help="Recompute (or --check) incremental meeting analytics state from the event log"
+
+    def add_arguments(self,parser):
+        parser.add_argument("link_ids",nargs="*",help="only these meetings (default: all)")
+        parser.add_argument("--check",action="store_true",help="report drift without writing; exits 1 if any")
+
+    def handle(self,*args,**opts):
+        links=MeetingLink.objects.all()
+        if opts["link_ids"]:
+            links=links.filter(id__in=opts["link_ids"])
+        sessions=links.order_by("session_id").values_list("session_id",flat=True).distinct()
+        checked=drifted=0
+        for session_id in sessions.iterator():
+            with transaction.atomic():
+                rows={
+                    r.meeting_id:r for r in
+                    MeetingState.objects.select_for_update().filter(meeting__session_id=session_id)
+                }
+                replayed=replay_session(session_event_log(session_id))
+                for link_id in links.filter(session_id=session_id).values_list("id",flat=True):
+                    checked+=1
+                    expected=replayed.get(link_id) or MeetingAccumulator()
+                    row=rows.get(link_id)
+                    current=MeetingAccumulator.from_row(row).state() if row else None
+                    if current==expected.state() or (row is None and not expected.event_count):
+                        continue
+                    drifted+=1
+                    self.stdout.write(f"{link_id}: {'missing' if row is None else 'drifted'}")
+                    if opts["verbosity"]>1 and row is not None:
+                        for field in MeetingAccumulator.FIELDS:
+                            if current[field]!=getattr(expected,field):
+                                self.stdout.write(f"  {field}: stored={current[field]!r} replayed={getattr(expected,field)!r}")
+                    if not opts["check"]:
+                        expected.to_row(row or MeetingState(meeting_id=link_id)).save()
+        verb="found" if opts["check"] else "fixed"
+        self.stdout.write(self.style.SUCCESS(f"checked {checked} meetings, {verb} {drifted} with drift"))
+        if opts["check"] and drifted:
+            raise CommandError(f"{drifted} meeting(s) drifted")
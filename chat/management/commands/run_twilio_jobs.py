@@ -0,0 +1,35 @@
+#runs due TwilioJob rows (recording rules, compositions): retries scheduled after a
+#failure, jobs of a web process that restarted, and every job when CHAT_TWILIO_JOBS
+#INLINE is off. safe next to INLINE web workers and other copies of itself, since each
+#job is claimed before it runs.
+#
+#  python manage.py run_twilio_jobs                    (one pass)
+#  python manage.py run_twilio_jobs --loop --sleep 1   (keep running)
+import time
+from collections import Counter
+from django.core.management.base import BaseCommand
+from chat import twilio_jobs
+
+
+class Command(BaseCommand):
+    help="Run queued Twilio recording and composition jobs"
+
+    def add_arguments(self,parser):
+        parser.add_argument("--limit",type=int,default=100,help="jobs per pass")
+        parser.add_argument("--workers",type=int,default=1,help="jobs run at once")
+        parser.add_argument("--loop",action="store_true",help="keep polling for due jobs")
+        parser.add_argument("--sleep",type=float,default=1,help="seconds between idle passes with --loop")
+
+    def handle(self,*args,**opts):
+        total=Counter()
+        while True:
+            done=twilio_jobs.run_due(limit=opts["limit"],workers=opts["workers"])
+            total.update(done)
+            if opts["verbosity"]>1 and done:
+                self.stdout.write(", ".join(f"{n} {status}" for status,n in sorted(done.items())))
+            if not done:
+                if not opts["loop"]:
+                    break
+                time.sleep(opts["sleep"])
+        summary=", ".join(f"{n} {status}" for status,n in sorted(total.items())) or "no jobs due"
+        self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,204 @@
+#low overhead in-process metrics, exposed in Prometheus text format on /metrics.
+#every thread updates its own shard, so the hot path never takes a lock; shards are
+#only summed when /metrics is scraped. values are per worker process.
+import bisect
+import threading
+import time
+
+DEFAULT_BUCKETS=(0.0005,0.001,0.0025,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1.0,2.5,5.0,10.0)
+
+REGISTRY=[]
+
+
+class _Metric:
+    kind=""
+
+    def __init__(self,name,help,labelnames=()):
+        self.name=name
+        self.help=help
+        self.labelnames=tuple(labelnames)
+        self._children={}
+        self._local=threading.local()
+        self._shards=[]
+        REGISTRY.append(self)
+
+    def labels(self,*values):
+        child=self._children.get(values)
+        if child is None:
+            child=self._children.setdefault(values,self._child(values))
+        return child
+
+    def _child(self,values):
+        child=self.__class__.__new__(self.__class__)
+        child.name=self.name
+        child.labelnames=()
+        child._local=threading.local()
+        child._shards=[]
+        child._init_child(self)
+        return child
+
+    def _init_child(self,parent):
+        pass
+
+    def _shard(self):
+        shard=getattr(self._local,"shard",None)
+        if shard is None:
+            shard=self._local.shard=self._new_shard()
+            self._shards.append(shard)
+        return shard
+
+    def _series(self):
+        #[(label values, child)] including the unlabelled metric itself
+        if self.labelnames:
+            return list(self._children.items())
+        return [((),self)]
+
+    def _labelstr(self,values,extra=()):
+        pairs=list(zip(self.labelnames,values))+list(extra)
+        if not pairs:
+            return ""
+        inner=",".join('%s="%s"'%(k,str(v).replace("\\","\\\\").replace('"','\\"')) for k,v in pairs)
+        return "{%s}"%inner
+
+    def render(self):
+        lines=[f"# HELP {self.name} {self.help}",f"# TYPE {self.name} {self.kind}"]
+        for values,child in self._series():
+            lines.extend(child._render_series(self,values))
+        return lines
+
+
+class Counter(_Metric):
+    kind="counter"
+
+    def _new_shard(self):
+        return [0]
+
+    def inc(self,amount=1):
+        self._shard()[0]+=amount
+
+    def value(self):
+        return sum(s[0] for s in self._shards)
+
+    def _render_series(self,parent,values):
+        return [f"{parent.name}{parent._labelstr(values)} {self.value()}"]
+
+
+class Gauge(_Metric):
+    kind="gauge"
+
+    def __init__(self,name,help,labelnames=(),func=None):
+        super().__init__(name,help,labelnames)
+        self._func=func
+
+    def _init_child(self,parent):
+        self._func=None
+
+    def _new_shard(self):
+        return [0]
+
+    def inc(self,amount=1):
+        self._shard()[0]+=amount
+
+    def dec(self,amount=1):
+        self._shard()[0]-=amount
+
+    def set_function(self,func):
+        #value computed at scrape time instead of tracked on the hot path
+        self._func=func
+
+    def value(self):
+        if self._func is not None:
+            return self._func()
+        return sum(s[0] for s in self._shards)
+
+    def _render_series(self,parent,values):
+        return [f"{parent.name}{parent._labelstr(values)} {self.value()}"]
+
+
+class _Timer:
+    __slots__=("hist","start")
+
+    def __init__(self,hist):
+        self.hist=hist
+
+    def __enter__(self):
+        self.start=time.perf_counter()
+        return self
+
+    def __exit__(self,*exc):
+        self.hist.observe(time.perf_counter()-self.start)
+        return False
+
+
+class Histogram(_Metric):
+    kind="histogram"
+
+    def __init__(self,name,help,labelnames=(),buckets=DEFAULT_BUCKETS):
+        self.buckets=tuple(buckets)
+        super().__init__(name,help,labelnames)
+
+    def _init_child(self,parent):
+        self.buckets=parent.buckets
+
+    def _new_shard(self):
+        #bucket counts (+inf last), then sum
+        return [0]*(len(self.buckets)+1)+[0.0]
+
+    def observe(self,value):
+        shard=self._shard()
+        shard[bisect.bisect_left(self.buckets,value)]+=1
+        shard[-1]+=value
+
+    def time(self):
+        return _Timer(self)
+
+    def snapshot(self):
+        n=len(self.buckets)+1
+        counts=[0]*n
+        total=0.0
+        for s in self._shards:
+            for i in range(n):
+                counts[i]+=s[i]
+            total+=s[-1]
+        return counts,total
+
+    def _render_series(self,parent,values):
+        counts,total=self.snapshot()
+        lines=[]
+        acc=0
+        for bound,c in zip(self.buckets+(float("inf"),),counts):
+            acc+=c
+            le="+Inf" if bound==float("inf") else repr(bound)
+            lines.append(f"{parent.name}_bucket{parent._labelstr(values,[('le',le)])} {acc}")
+        lines.append(f"{parent.name}_sum{parent._labelstr(values)} {total}")
+        lines.append(f"{parent.name}_count{parent._labelstr(values)} {acc}")
+        return lines
+
+
+def render():
+    out=[]
+    for metric in REGISTRY:
+        out.extend(metric.render())
+    return "\n".join(out)+"\n"
+
+
+#consumer hot path
+WS_ACTION_SECONDS=Histogram("chat_ws_action_seconds","Time spent handling websocket actions",["action"])
+WS_CONNECTIONS=Gauge("chat_ws_connections","Open websocket connections in this worker")
+WS_SESSIONS=Gauge("chat_ws_sessions","Sessions with at least one connection in this worker")
+WS_REJECTED=Counter("chat_ws_rejected_total","Websocket connections closed during connect",["reason"])
+
+#write-behind batching
+MESSAGE_BATCH_SIZE=Histogram(
+    "chat_message_batch_size","Messages per bulk insert",buckets=(1,2,5,10,25,50,100,250,500),
+)
+
+#outbound queues
+OUTBOX_SENT=Counter("chat_ws_frames_sent_total","Frames written to websocket clients")
+OUTBOX_DROPPED=Counter("chat_ws_frames_dropped_total","Frames dropped because a client's queue was full")
+OUTBOX_COALESCED=Counter("chat_ws_frames_coalesced_total","Queued presence frames replaced by a newer one")
+OUTBOX_SLOW_DISCONNECTS=Counter("chat_ws_slow_disconnects_total","Clients disconnected for lagging")
+OUTBOX_LAG_SECONDS=Histogram("chat_ws_outbox_lag_seconds","Time frames wait in a client's queue")
+
+#http views
+HTTP_REQUEST_SECONDS=Histogram("chat_http_request_seconds","API request latency",["route","method","status"])
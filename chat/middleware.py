@@ -0,0 +1,37 @@
+#per-route request timings for the chat API (see chat.metrics)
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from .metrics import HTTP_REQUEST_SECONDS
+
+
+class RequestTimingMiddleware:
+    #works for both sync and async views so it never forces a thread hop
+    sync_capable=True
+    async_capable=True
+
+    def __init__(self,get_response):
+        self.get_response=get_response
+        self.is_async=iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self,request):
+        if self.is_async:
+            return self.__acall__(request)
+        start=time.perf_counter()
+        response=self.get_response(request)
+        self._record(request,response,time.perf_counter()-start)
+        return response
+
+    async def __acall__(self,request):
+        start=time.perf_counter()
+        response=await self.get_response(request)
+        self._record(request,response,time.perf_counter()-start)
+        return response
+
+    def _record(self,request,response,elapsed):
+        match=getattr(request,"resolver_match",None)
+        #label by route pattern (bounded cardinality), and only for the API
+        if match is None or not match.route.startswith("api/"):
+            return
+        HTTP_REQUEST_SECONDS.labels(match.route,request.method,response.status_code).observe(elapsed)
@@ -0,0 +1,47 @@
+# Generated by Django 6.0 on 2026-10-18 14:55
+
+from django.db import migrations, models
+
+
+BATCH = 1000
+
+
+def backfill_seq(apps, schema_editor):
+    # seq 1..n per session in (sent_at, id) order, written with batched bulk_update
+    Session = apps.get_model('chat', 'Session')
+    Message = apps.get_model('chat', 'Message')
+    for session_id in list(Session.objects.values_list('id', flat=True)):
+        ids = list(Message.objects.filter(session_id=session_id).order_by('sent_at', 'id').values_list('id', flat=True))
+        if not ids:
+            continue
+        Message.objects.bulk_update(
+            [Message(id=msg_id, seq=seq) for seq, msg_id in enumerate(ids, 1)],
+            ['seq'],
+            batch_size=BATCH,
+        )
+        Session.objects.filter(id=session_id).update(last_seq=len(ids))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_remove_meetinglink_allowed_count_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='seq',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='last_seq',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_seq, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='message',
+            constraint=models.UniqueConstraint(fields=('session', 'seq'), name='chat_message_session_seq'),
+        ),
+    ]
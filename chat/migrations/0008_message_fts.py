@@ -0,0 +1,60 @@
+# Generated by Django 6.0 on 2026-10-18 15:40
+
+from django.db import migrations
+
+# frozen copy of the chat.search DDL as of this migration
+
+FTS_TABLE = 'chat_message_fts'
+PG_INDEX = 'chat_message_text_tsv'
+
+SQLITE_TABLE = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "text, sender, content='chat_message', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+)
+SQLITE_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON chat_message BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, text, sender) VALUES (new.id, new.text, new.sender);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON chat_message BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text, sender) VALUES ('delete', old.id, old.text, old.sender);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF text, sender ON chat_message BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text, sender) VALUES ('delete', old.id, old.text, old.sender);
+        INSERT INTO {FTS_TABLE}(rowid, text, sender) VALUES (new.id, new.text, new.sender);
+    END""",
+]
+PG_VECTOR = "to_tsvector('english'::regconfig, COALESCE(text, ''))"
+
+
+def install_fts(apps, schema_editor):
+    conn = schema_editor.connection
+    with conn.cursor() as cur:
+        if conn.vendor == 'sqlite':
+            cur.execute(SQLITE_TABLE)
+            for sql in SQLITE_TRIGGERS:
+                cur.execute(sql)
+            cur.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        elif conn.vendor == 'postgresql':
+            cur.execute(f"CREATE INDEX IF NOT EXISTS {PG_INDEX} ON chat_message USING gin ({PG_VECTOR})")
+
+
+def uninstall_fts(apps, schema_editor):
+    conn = schema_editor.connection
+    with conn.cursor() as cur:
+        if conn.vendor == 'sqlite':
+            for suffix in ('ai', 'ad', 'au'):
+                cur.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+            cur.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+        elif conn.vendor == 'postgresql':
+            cur.execute(f"DROP INDEX IF EXISTS {PG_INDEX}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0007_message_session_sent_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_fts, uninstall_fts),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 6.0 on 2026-10-18 16:30
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0009_session_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meetinglink',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='meetinglink',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,134 @@
+# Generated by Django 6.0 on 2026-10-18 16:55
+
+import json
+import zlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Min
+from django.utils.dateparse import parse_datetime
+
+CHUNK = 500
+
+
+# frozen copy of chat.stats.rebuild as of this migration, against historical models only
+
+def _call_seconds(start, end):
+    if start is None or end is None or end < start:
+        return 0.0
+    return (end - start).total_seconds()
+
+
+def _archived_rollups(SessionArchive, ids):
+    # {session_id: (message_count, last_message_at, {meeting_id: (first join, last leave)}, last event)}
+    out = {}
+    for session_id, data in SessionArchive.objects.filter(session_id__in=ids).values_list('session_id', 'data'):
+        payload = json.loads(zlib.decompress(bytes(data)))
+        msgs = payload['messages']
+        calls = {}
+        last_event = None
+        for e in payload['meeting_events']:
+            at = parse_datetime(e['created_at'])
+            last_event = at
+            start, end = calls.get(e['meeting_id'], (None, None))
+            if e['identity'] and e['event_type'] == 'joined' and start is None:
+                start = at
+            elif e['identity'] and e['event_type'] == 'left':
+                end = at
+            calls[e['meeting_id']] = (start, end)
+        out[session_id] = (len(msgs), parse_datetime(msgs[-1]['sent_at']) if msgs else None, calls, last_event)
+    return out
+
+
+def _backfill_chunk(apps, rows):
+    Message = apps.get_model('chat', 'Message')
+    MeetingLink = apps.get_model('chat', 'MeetingLink')
+    MeetingEvent = apps.get_model('chat', 'MeetingEvent')
+    SessionStats = apps.get_model('chat', 'SessionStats')
+    SessionArchive = apps.get_model('chat', 'SessionArchive')
+    ids = [sid for sid, _ in rows]
+    archived = [sid for sid, archived_at in rows if archived_at]
+    messages = {
+        r['session_id']: (r['n'], r['last'])
+        for r in Message.objects.filter(session_id__in=ids).values('session_id')
+        .annotate(n=Count('id'), last=Max('sent_at')).order_by()
+    }
+    meetings = dict(
+        MeetingLink.objects.filter(session_id__in=ids).values('session_id')
+        .annotate(n=Count('id')).order_by().values_list('session_id', 'n')
+    )
+    last_event = dict(
+        MeetingEvent.objects.filter(session_id__in=ids).values('session_id')
+        .annotate(last=Max('created_at')).order_by().values_list('session_id', 'last')
+    )
+    events = MeetingEvent.objects.filter(session_id__in=ids, identity__isnull=False).exclude(identity='')
+    joins = dict(events.filter(event_type='joined').values('meeting_id').annotate(t=Min('created_at')).order_by().values_list('meeting_id', 't'))
+    leaves = dict(events.filter(event_type='left').values('meeting_id').annotate(t=Max('created_at')).order_by().values_list('meeting_id', 't'))
+    cold = _archived_rollups(SessionArchive, archived) if archived else {}
+
+    links = list(MeetingLink.objects.filter(session_id__in=ids).only('id', 'session_id'))
+    call_seconds = {}
+    for link in links:
+        if link.session_id in cold:
+            start, end = cold[link.session_id][2].get(str(link.id), (None, None))
+        else:
+            start, end = joins.get(link.id), leaves.get(link.id)
+        link.call_started_at, link.call_ended_at = start, end
+        call_seconds[link.session_id] = call_seconds.get(link.session_id, 0.0) + _call_seconds(start, end)
+    MeetingLink.objects.bulk_update(links, ['call_started_at', 'call_ended_at'], batch_size=CHUNK)
+
+    out = []
+    for sid in ids:
+        if sid in cold:
+            n, last_msg, _, last_meet = cold[sid]
+        else:
+            n, last_msg = messages.get(sid, (0, None))
+            last_meet = last_event.get(sid)
+        out.append(SessionStats(
+            session_id=sid,
+            message_count=n,
+            last_message_at=last_msg,
+            meeting_count=meetings.get(sid, 0),
+            last_meeting_at=last_meet,
+            call_seconds=call_seconds.get(sid, 0.0),
+        ))
+    SessionStats.objects.bulk_create(out)
+
+
+def backfill_stats(apps, schema_editor):
+    Session = apps.get_model('chat', 'Session')
+    rows = list(Session.objects.order_by('id').values_list('id', 'archived_at'))
+    for i in range(0, len(rows), CHUNK):
+        _backfill_chunk(apps, rows[i:i + CHUNK])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0010_versions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessionStats',
+            fields=[
+                ('session', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='chat.session')),
+                ('message_count', models.PositiveIntegerField(default=0)),
+                ('last_message_at', models.DateTimeField(blank=True, null=True)),
+                ('meeting_count', models.PositiveIntegerField(default=0)),
+                ('last_meeting_at', models.DateTimeField(blank=True, null=True)),
+                ('call_seconds', models.FloatField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='meetinglink',
+            name='call_ended_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='meetinglink',
+            name='call_started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
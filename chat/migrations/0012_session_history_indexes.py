@@ -0,0 +1,29 @@
+# Generated by Django 6.0 on 2026-10-18 17:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0011_sessionstats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(fields=['created_at', 'id'], name='chat_session_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(fields=['is_active', 'created_at', 'id'], name='chat_session_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(fields=['agent_id', 'created_at', 'id'], name='chat_session_agent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(fields=['customer_id', 'created_at', 'id'], name='chat_session_customer_idx'),
+        ),
+    ]
@@ -0,0 +1,117 @@
+# Generated by Django 6.0 on 2026-10-18 17:45
+
+import json
+import zlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils.dateparse import parse_datetime
+
+BATCH = 500
+
+
+# frozen copy of chat.aggregation.MeetingAccumulator as of this migration
+
+def _fold(events):
+    # state fields for one meeting's (event_type, identity, created_at iso) in created_at order
+    count, first, last = 0, None, None
+    participants, first_join, last_leave, open_shares, share_intervals = [], {}, {}, [], []
+    for event_type, identity, at in events:
+        count += 1
+        if first is None:
+            first = at
+        last = at
+        if identity and identity not in participants:
+            participants.append(identity)
+            participants.sort()
+        if event_type == 'joined':
+            if identity and identity not in first_join:
+                first_join[identity] = at
+        elif event_type == 'left':
+            if identity:
+                last_leave[identity] = at
+        elif event_type == 'screen_share_started':
+            for share in open_shares:
+                if share[0] == identity:
+                    share[1] = at
+                    break
+            else:
+                open_shares.append([identity, at])
+        elif event_type == 'screen_share_stopped':
+            for i, (who, start) in enumerate(open_shares):
+                if who == identity:
+                    del open_shares[i]
+                    share_intervals.append([identity, start, at])
+                    break
+    return {
+        'event_count': count,
+        'first_event_at': parse_datetime(first) if first else None,
+        'last_event_at': parse_datetime(last) if last else None,
+        'participants': participants,
+        'first_join': first_join,
+        'last_leave': last_leave,
+        'open_shares': open_shares,
+        'share_intervals': share_intervals,
+    }
+
+
+def _session_events(apps, session_id, archived_at):
+    # {meeting_id str: [(event_type, identity, created_at iso)]} from the live table or the archive
+    MeetingEvent = apps.get_model('chat', 'MeetingEvent')
+    SessionArchive = apps.get_model('chat', 'SessionArchive')
+    out = {}
+    if archived_at is None:
+        rows = (
+            MeetingEvent.objects.filter(session_id=session_id).order_by('created_at', 'id')
+            .values_list('meeting_id', 'event_type', 'identity', 'created_at')
+        )
+        for meeting_id, event_type, identity, created_at in rows:
+            out.setdefault(str(meeting_id), []).append((event_type, identity, created_at.isoformat()))
+        return out
+    data = SessionArchive.objects.filter(session_id=session_id).values_list('data', flat=True).first()
+    for e in json.loads(zlib.decompress(bytes(data)))['meeting_events'] if data else []:
+        out.setdefault(e['meeting_id'], []).append((e['event_type'], e['identity'], e['created_at']))
+    return out
+
+
+def backfill_state(apps, schema_editor):
+    Session = apps.get_model('chat', 'Session')
+    MeetingLink = apps.get_model('chat', 'MeetingLink')
+    MeetingState = apps.get_model('chat', 'MeetingState')
+    links = {}
+    for link_id, session_id in MeetingLink.objects.values_list('id', 'session_id'):
+        links.setdefault(session_id, []).append(link_id)
+    rows = []
+    for session_id, archived_at in Session.objects.filter(id__in=list(links)).values_list('id', 'archived_at'):
+        events = _session_events(apps, session_id, archived_at)
+        for link_id in links[session_id]:
+            rows.append(MeetingState(meeting_id=link_id, **_fold(events.get(str(link_id), []))))
+        if len(rows) >= BATCH:
+            MeetingState.objects.bulk_create(rows)
+            rows = []
+    MeetingState.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0012_session_history_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MeetingState',
+            fields=[
+                ('meeting', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='state', serialize=False, to='chat.meetinglink')),
+                ('event_count', models.PositiveIntegerField(default=0)),
+                ('first_event_at', models.DateTimeField(blank=True, null=True)),
+                ('last_event_at', models.DateTimeField(blank=True, null=True)),
+                ('participants', models.JSONField(default=list)),
+                ('first_join', models.JSONField(default=dict)),
+                ('last_leave', models.JSONField(default=dict)),
+                ('open_shares', models.JSONField(default=list)),
+                ('share_intervals', models.JSONField(default=list)),
+            ],
+        ),
+        migrations.RunPython(backfill_state, migrations.RunPython.noop),
+    ]
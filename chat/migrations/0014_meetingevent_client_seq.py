@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-18 18:30
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0013_meetingstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meetingevent',
+            name='client_id',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='meetingevent',
+            name='client_seq',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='meetingevent',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddConstraint(
+            model_name='meetingevent',
+            constraint=models.UniqueConstraint(fields=('meeting', 'client_id', 'client_seq'), name='chat_meetingevent_client_seq'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-18 19:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0014_meetingevent_client_seq'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConcurrencyBucket',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('resolution', models.CharField(choices=[('minute', 'Minute'), ('hour', 'Hour')], max_length=8)),
+                ('start', models.DateTimeField()),
+                ('meetings_peak', models.PositiveIntegerField(default=0)),
+                ('meetings_avg', models.FloatField(default=0)),
+                ('participants_peak', models.PositiveIntegerField(default=0)),
+                ('participants_avg', models.FloatField(default=0)),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('resolution', 'start'), name='chat_concurrencybucket_start')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 6.0 on 2026-10-18 21:40
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0015_concurrencybucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TwilioJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('recording_start', 'Start recording'), ('recording_stop', 'Stop recording'), ('composition', 'Create composition')], max_length=32)),
+                ('room_sid', models.CharField(max_length=64)),
+                ('identity', models.CharField(blank=True, max_length=150, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='pending', max_length=16)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('result', models.JSONField(blank=True, default=dict)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('meeting', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='twilio_jobs', to='chat.meetinglink')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='chat_twiliojob_due_idx')],
+            },
+        ),
+    ]
@@ -19,6 +19,25 @@ class Session(models.Model):
 
     meeting_link=models.CharField(max_length=1024,null=True,blank=True)
     is_active=models.BooleanField(default=True)
+    #last message sequence number handed out in this session
+    last_seq=models.PositiveBigIntegerField(default=0)
+    closed_at=models.DateTimeField(null=True,blank=True)
+    #set once messages/meeting events were moved into SessionArchive
+    archived_at=models.DateTimeField(null=True,blank=True)
+    #bumped on every message, meeting change or close (see chat/versioning.py)
+    version=models.PositiveBigIntegerField(default=0)
+    updated_at=models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        #every list walks (created_at, id) newest first, optionally within one of
+        #these prefixes; see history_queryset in views.py and the plan tests
+        indexes=[
+            models.Index(fields=['created_at','id'],name='chat_session_created_idx'),
+            models.Index(fields=['is_active','created_at','id'],name='chat_session_active_idx'),
+            models.Index(fields=['agent_id','created_at','id'],name='chat_session_agent_idx'),
+            models.Index(fields=['customer_id','created_at','id'],name='chat_session_customer_idx'),
+        ]
+
     def __str__(self):
         return f"Session {self.id} - {self.title or 'untitled'}"
 
@@ -28,9 +47,18 @@ class Message(models.Model):
     role=models.CharField(max_length=20,choices=ROLES,default='customer')
     text=models.TextField()
     sent_at=models.DateTimeField(auto_now_add=True)
+    #per-session, monotonically increasing (see batching.save_messages)
+    seq=models.PositiveBigIntegerField(null=True,blank=True)
 
     class Meta:
         ordering=['sent_at']
+        constraints=[
+            models.UniqueConstraint(fields=['session','seq'],name='chat_message_session_seq'),
+        ]
+        indexes=[
+            #keyset pagination in list_messages walks (sent_at, id) within a session
+            models.Index(fields=['session','sent_at','id'],name='chat_msg_session_sent_idx'),
+        ]
     
     def __str__(self):
         return f"[{self.sent_at}] {self.role}:{self.sender} - {self.text[:40]}"
@@ -43,6 +71,12 @@ class MeetingLink(models.Model):
     room_sid=models.CharField(max_length=64,null=True,blank=True)
     expires_at=models.DateTimeField(null=True,blank=True)
     created_at=models.DateTimeField(auto_now_add=True)
+    #bumped on every meeting event (see chat/versioning.py)
+    version=models.PositiveBigIntegerField(default=0)
+    updated_at=models.DateTimeField(default=timezone.now)
+    #first "joined" / last "left" event, maintained by chat/stats.py
+    call_started_at=models.DateTimeField(null=True,blank=True)
+    call_ended_at=models.DateTimeField(null=True,blank=True)
 
     class Meta:
         ordering=['-created_at']
@@ -83,10 +117,135 @@ class MeetingEvent(models.Model):
     identity = models.CharField(max_length=150, blank=True, null=True)
     role = models.CharField(max_length=50, blank=True, null=True)
     metadata = models.JSONField(blank=True, null=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    #server time for single posts, the (clamped) client time for batched ones
+    created_at = models.DateTimeField(default=timezone.now)
+    #batched events: the sending tab and its per-tab sequence number, so retried
+    #batches are deduplicated
+    client_id = models.CharField(max_length=64, blank=True, null=True)
+    client_seq = models.PositiveIntegerField(blank=True, null=True)
 
     class Meta:
         ordering = ["created_at"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["meeting", "client_id", "client_seq"],
+                name="chat_meetingevent_client_seq",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} for {self.meeting_id} at {self.created_at}"
+
+class SessionArchive(models.Model):
+    #cold storage for a closed session: its messages and meeting events as one
+    #zlib-compressed JSON blob (see chat/archive.py)
+    session=models.OneToOneField(Session,primary_key=True,related_name='archive',on_delete=models.CASCADE)
+    format=models.PositiveSmallIntegerField(default=1)
+    data=models.BinaryField()
+    message_count=models.PositiveIntegerField(default=0)
+    event_count=models.PositiveIntegerField(default=0)
+    last_event_at=models.DateTimeField(null=True,blank=True)
+    created_at=models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Archive of Session {self.session_id}"
+
+
+class SessionStats(models.Model):
+    #denormalised per-session rollup for the session lists (see chat/stats.py)
+    session=models.OneToOneField(Session,primary_key=True,related_name='stats',on_delete=models.CASCADE)
+    message_count=models.PositiveIntegerField(default=0)
+    last_message_at=models.DateTimeField(null=True,blank=True)
+    meeting_count=models.PositiveIntegerField(default=0)
+    last_meeting_at=models.DateTimeField(null=True,blank=True)
+    call_seconds=models.FloatField(default=0)
+
+    def __str__(self):
+        return f"Stats for Session {self.session_id}"
+
+
+class MeetingState(models.Model):
+    #running analytics for a meeting, folded in as events arrive (see chat/aggregation.py)
+    meeting=models.OneToOneField(MeetingLink,primary_key=True,related_name='state',on_delete=models.CASCADE)
+    event_count=models.PositiveIntegerField(default=0)
+    first_event_at=models.DateTimeField(null=True,blank=True)
+    last_event_at=models.DateTimeField(null=True,blank=True)
+    participants=models.JSONField(default=list)
+    first_join=models.JSONField(default=dict)
+    last_leave=models.JSONField(default=dict)
+    open_shares=models.JSONField(default=list)
+    share_intervals=models.JSONField(default=list)
+
+    def __str__(self):
+        return f"State for MeetingLink {self.meeting_id}"
+
+
+class ChangeStamp(models.Model):
+    #global change counters for views that cover many rows, e.g. "sessions" for the
+    #active sessions list (see chat/versioning.py)
+    name=models.CharField(max_length=32,primary_key=True)
+    value=models.PositiveBigIntegerField(default=0)
+    updated_at=models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+
+class ConcurrencyBucket(models.Model):
+    #settled buckets of the concurrency timeline, cached so repeated queries over past
+    #ranges only compute what is missing (see chat/timeline.py)
+    RESOLUTIONS=[("minute","Minute"),("hour","Hour")]
+
+    id=models.BigAutoField(primary_key=True)
+    resolution=models.CharField(max_length=8,choices=RESOLUTIONS)
+    start=models.DateTimeField()
+    meetings_peak=models.PositiveIntegerField(default=0)
+    meetings_avg=models.FloatField(default=0)
+    participants_peak=models.PositiveIntegerField(default=0)
+    participants_avg=models.FloatField(default=0)
+    computed_at=models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints=[
+            models.UniqueConstraint(fields=['resolution','start'],name='chat_concurrencybucket_start'),
+        ]
+
+    def __str__(self):
+        return f"{self.resolution} bucket at {self.start}"
+
+
+class TwilioJob(models.Model):
+    #a Twilio REST call (recording rules, composition) run off the request thread, with
+    #its status for GET /api/twilio-jobs/<id>/ (see chat/twilio_jobs.py)
+    KINDS=[
+        ("recording_start","Start recording"),
+        ("recording_stop","Stop recording"),
+        ("composition","Create composition"),
+    ]
+    STATUSES=[
+        ("pending","Pending"),
+        ("running","Running"),
+        ("succeeded","Succeeded"),
+        ("failed","Failed"),
+    ]
+
+    id=models.UUIDField(primary_key=True,default=uuid.uuid4,editable=False)
+    meeting=models.ForeignKey(MeetingLink,related_name='twilio_jobs',on_delete=models.CASCADE)
+    kind=models.CharField(max_length=32,choices=KINDS)
+    room_sid=models.CharField(max_length=64)
+    identity=models.CharField(max_length=150,null=True,blank=True)
+    status=models.CharField(max_length=16,choices=STATUSES,default='pending')
+    attempts=models.PositiveIntegerField(default=0)
+    next_attempt_at=models.DateTimeField(default=timezone.now)
+    result=models.JSONField(default=dict,blank=True)
+    error=models.TextField(blank=True,default='')
+    created_at=models.DateTimeField(auto_now_add=True)
+    updated_at=models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes=[
+            models.Index(fields=['status','next_attempt_at'],name='chat_twiliojob_due_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.event_type} for {self.meeting_id} at {self.created_at}"
\ No newline at end of file
+        return f"{self.kind} for MeetingLink {self.meeting_id}: {self.status}"
@@ -0,0 +1,100 @@
+#per-connection bounded send queue drained by a dedicated writer task.
+#group handlers only enqueue, so one stalled browser can't hold up the consumer's
+#channel-layer receive loop (and with it group fan-out for everyone else).
+import asyncio
+import time
+from collections import deque
+from django.conf import settings
+from .metrics import OUTBOX_SENT, OUTBOX_DROPPED, OUTBOX_COALESCED, OUTBOX_LAG_SECONDS
+
+
+def _outbox_settings():
+    conf=getattr(settings,"CHAT_OUTBOX",{})
+    return conf.get("MAX_SIZE",500),conf.get("MAX_LAG_SECONDS",10.0)
+
+
+class Outbox:
+    def __init__(self,send,max_size=500,max_lag=10.0):
+        #send: coroutine function taking one encoded frame
+        self._send=send
+        self.max_size=max_size
+        self.max_lag=max_lag
+        #entries are [frame, coalesce_key, enqueued_at]
+        self._queue=deque()
+        self._keyed={}
+        self._wake=asyncio.Event()
+        self._idle=asyncio.Event()
+        self._idle.set()
+        self._task=None
+
+    def start(self):
+        self._task=asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError,Exception):
+                pass
+            self._task=None
+        self._queue.clear()
+        self._keyed.clear()
+
+    def put(self,frame,key=None):
+        #queue a frame; a frame with the same key still waiting is replaced in place.
+        #returns False when the queue is full (frame dropped)
+        if key is not None:
+            entry=self._keyed.get(key)
+            if entry is not None:
+                entry[0]=frame
+                OUTBOX_COALESCED.inc()
+                return True
+        if len(self._queue)>=self.max_size:
+            OUTBOX_DROPPED.inc()
+            return False
+        entry=[frame,key,time.monotonic()]
+        self._queue.append(entry)
+        if key is not None:
+            self._keyed[key]=entry
+        self._idle.clear()
+        self._wake.set()
+        return True
+
+    async def flush(self,timeout=1.0):
+        #wait (bounded) until everything queued so far has been sent
+        try:
+            await asyncio.wait_for(self._idle.wait(),timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def lag(self):
+        #age of the oldest frame still waiting to be sent
+        if not self._queue:
+            return 0.0
+        return time.monotonic()-self._queue[0][2]
+
+    def is_slow(self):
+        return self.lag()>self.max_lag
+
+    def __len__(self):
+        return len(self._queue)
+
+    async def _run(self):
+        while True:
+            if not self._queue:
+                self._idle.set()
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            frame,key,enqueued=self._queue.popleft()
+            if key is not None:
+                self._keyed.pop(key,None)
+            await self._send(frame)
+            OUTBOX_SENT.inc()
+            OUTBOX_LAG_SECONDS.observe(time.monotonic()-enqueued)
+
+
+def make_outbox(send):
+    max_size,max_lag=_outbox_settings()
+    return Outbox(send,max_size=max_size,max_lag=max_lag)
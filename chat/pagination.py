@@ -0,0 +1,66 @@
+#keyset (cursor) pagination helpers. a cursor is an opaque token for a
+#(timestamp, pk) position, so every page is an index range scan no matter how deep.
+import base64
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+def encode_cursor(ts,pk):
+    raw=f"{ts.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor,pk_type=str):
+    #-> (datetime, pk_type(pk)). raises ValueError for anything malformed, the pk
+    #included, so a crafted cursor never reaches the query
+    try:
+        raw=base64.urlsafe_b64decode(cursor+"="*(-len(cursor)%4)).decode()
+        ts,pk=raw.rsplit("|",1)
+        pk=pk_type(pk) if pk else None
+    except Exception:
+        raise ValueError("invalid cursor")
+    dt=parse_datetime(ts)
+    if dt is None or pk is None:
+        raise ValueError("invalid cursor")
+    return dt,pk
+
+
+def keyset_page(qs,field,limit,before=None,after=None,descending=True):
+    #one page of qs ordered by (field, pk).
+    #before/after are decoded cursors; without either the page starts at the newest
+    #row (descending=True) or the oldest. returns (rows in fetch order, has_more)
+    if before is not None:
+        ts,pk=before
+        qs=qs.filter(Q(**{f"{field}__lt":ts})|Q(**{field:ts,"pk__lt":pk}))
+        descending=True
+    elif after is not None:
+        ts,pk=after
+        qs=qs.filter(Q(**{f"{field}__gt":ts})|Q(**{field:ts,"pk__gt":pk}))
+        descending=False
+    order=(f"-{field}","-pk") if descending else (field,"pk")
+    rows=list(qs.order_by(*order)[:limit+1])
+    return rows[:limit],len(rows)>limit
+
+
+def keyset_slice(rows,field,limit,before=None,after=None,descending=True):
+    #keyset_page over an in-memory list sorted by (field, pk), e.g. archived rows
+    key=lambda r:(getattr(r,field),r.pk)
+    if before is not None:
+        ts,pk=before
+        rows=[r for r in rows if key(r)<(ts,type(r.pk)(pk))]
+        descending=True
+    elif after is not None:
+        ts,pk=after
+        rows=[r for r in rows if key(r)>(ts,type(r.pk)(pk))]
+        descending=False
+    page=rows[::-1][:limit+1] if descending else rows[:limit+1]
+    return page[:limit],len(page)>limit
+
+
+def int_param(params,name,default,lo,hi):
+    #clamped integer query param, default when missing or garbage
+    try:
+        value=int(params.get(name,default))
+    except (TypeError,ValueError):
+        return default
+    return max(lo,min(hi,value))
@@ -0,0 +1,76 @@
+#single message pipeline shared by SessionConsumer and the REST views:
+#validate -> persist (batched, assigns seq) -> broadcast once to session_{id}.
+from channels.layers import get_channel_layer
+from .batching import get_writer, save_messages, message_event
+from .metrics import WS_ACTION_SECONDS
+from .models import ROLES
+from . import wire
+
+ALLOWED_ROLES={r[0] for r in ROLES}
+#most messages one bulk call may carry (keeps the batch event under channel-layer limits)
+MAX_BULK=500
+
+
+class MessageError(ValueError):
+    def __init__(self,code):
+        super().__init__(code)
+        self.code=code
+
+
+def clean(sender,role,text):
+    #normalised (sender, role, text); raises MessageError("empty_text")
+    text=(text or "").strip()
+    if not text:
+        raise MessageError("empty_text")
+    if role not in ALLOWED_ROLES:
+        role="customer"
+    return sender or "anonymous",role,text
+
+
+async def persist(session_id,sender,role,text):
+    #validate and save through the worker's batching writer; returns the Message
+    sender,role,text=clean(sender,role,text)
+    with WS_ACTION_SECONDS.labels("db_save").time():
+        return await get_writer().write(str(session_id),sender,role,text)
+
+
+async def broadcast(msg):
+    with WS_ACTION_SECONDS.labels("group_send").time():
+        await get_channel_layer().group_send(f"session_{msg.session_id}",wire.with_frames(message_event(msg)))
+
+
+async def submit(session_id,sender,role,text):
+    msg=await persist(session_id,sender,role,text)
+    await broadcast(msg)
+    return msg
+
+
+def persist_many(session_id,items):
+    #sync bulk path for bots/importers: one bulk_create for the whole array.
+    #items: [{"text", "sender"?, "role"?}]. raises MessageError on bad input
+    if not items:
+        raise MessageError("empty_batch")
+    if len(items)>MAX_BULK:
+        raise MessageError("batch_too_large")
+    rows=[]
+    for item in items:
+        if not isinstance(item,dict):
+            raise MessageError("invalid_item")
+        sender,role,text=clean(item.get("sender"),item.get("role"),item.get("text"))
+        rows.append({"session_id":str(session_id),"sender":sender,"role":role,"text":text})
+    saved=save_messages(rows)
+    for res in saved:
+        if isinstance(res,Exception):
+            raise res
+    return saved
+
+
+async def broadcast_many(msgs):
+    #one group send for the whole batch; each message is still pre-encoded
+    if not msgs:
+        return
+    with WS_ACTION_SECONDS.labels("group_send").time():
+        await get_channel_layer().group_send(
+            f"session_{msgs[0].session_id}",
+            {"type":"chat.batch","messages":[wire.with_frames(message_event(m)) for m in msgs]},
+        )
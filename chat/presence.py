@@ -0,0 +1,164 @@
+#presence registry shared by consumers and views.
+#every connection is tracked by channel name so a user with two tabs open stays
+#online until the last one leaves. backend is picked from settings.CHAT_PRESENCE.
+import os
+import sqlite3
+import threading
+import time
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+DEFAULT_BACKEND="chat.presence.SQLitePresence"
+
+
+class BasePresence:
+    #interface every presence backend implements (all methods are sync)
+    def join(self,session_id,user,channel):
+        raise NotImplementedError
+
+    def leave(self,session_id,user,channel):
+        raise NotImplementedError
+
+    def online(self,session_id):
+        #users online in a single session
+        raise NotImplementedError
+
+    def online_many(self,session_ids):
+        #{session_id: [users]} for every requested session (empty list if nobody)
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class MemoryPresence(BasePresence):
+    #process-local backend, used by tests and single-worker dev servers
+    def __init__(self,**options):
+        self._lock=threading.Lock()
+        #session_id -> user -> set(channel)
+        self._sessions={}
+
+    def join(self,session_id,user,channel):
+        with self._lock:
+            self._sessions.setdefault(str(session_id),{}).setdefault(user,set()).add(channel)
+
+    def leave(self,session_id,user,channel):
+        session_id=str(session_id)
+        with self._lock:
+            users=self._sessions.get(session_id)
+            if not users or user not in users:
+                return
+            users[user].discard(channel)
+            if not users[user]:
+                users.pop(user)
+            if not users:
+                self._sessions.pop(session_id,None)
+
+    def online(self,session_id):
+        with self._lock:
+            return list(self._sessions.get(str(session_id),{}))
+
+    def online_many(self,session_ids):
+        with self._lock:
+            return {str(s):list(self._sessions.get(str(s),{})) for s in session_ids}
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+
+class SQLitePresence(BasePresence):
+    #shared backend: every worker on the host points at the same sqlite file (WAL mode),
+    #so presence_view sees connections held by any Daphne/uvicorn process.
+    #rows are keyed by channel name; rows left behind by dead workers are pruned on startup.
+    BATCH=500
+
+    def __init__(self,path=None,timeout=5.0,**options):
+        self.path=str(path or os.path.join(settings.BASE_DIR,"presence.sqlite3"))
+        self.timeout=timeout
+        self._local=threading.local()
+        conn=self._conn()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS presence ("
+                "channel TEXT PRIMARY KEY, session_id TEXT NOT NULL, user TEXT NOT NULL,"
+                "pid INTEGER NOT NULL, joined_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS presence_session ON presence (session_id, user)")
+        self.prune()
+
+    def _conn(self):
+        #sqlite connections can't be shared between threads, keep one per thread
+        conn=getattr(self._local,"conn",None)
+        if conn is None:
+            conn=sqlite3.connect(self.path,timeout=self.timeout,isolation_level=None,check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn=conn
+        return conn
+
+    def join(self,session_id,user,channel):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO presence (channel, session_id, user, pid, joined_at) VALUES (?,?,?,?,?)",
+            (channel,str(session_id),user,os.getpid(),time.time()),
+        )
+
+    def leave(self,session_id,user,channel):
+        self._conn().execute("DELETE FROM presence WHERE channel=?",(channel,))
+
+    def online(self,session_id):
+        rows=self._conn().execute(
+            "SELECT DISTINCT user FROM presence WHERE session_id=?",(str(session_id),)
+        ).fetchall()
+        return [r[0] for r in rows]
+
+    def online_many(self,session_ids):
+        ids=[str(s) for s in session_ids]
+        out={s:[] for s in ids}
+        conn=self._conn()
+        for i in range(0,len(ids),self.BATCH):
+            chunk=ids[i:i+self.BATCH]
+            marks=",".join("?"*len(chunk))
+            rows=conn.execute(
+                f"SELECT DISTINCT session_id, user FROM presence WHERE session_id IN ({marks})",chunk
+            ).fetchall()
+            for session_id,user in rows:
+                out[session_id].append(user)
+        return out
+
+    def prune(self):
+        #drop rows owned by processes that no longer exist on this host
+        conn=self._conn()
+        pids=[r[0] for r in conn.execute("SELECT DISTINCT pid FROM presence").fetchall()]
+        dead=[p for p in pids if p!=os.getpid() and not _pid_alive(p)]
+        for p in dead:
+            conn.execute("DELETE FROM presence WHERE pid=?",(p,))
+        return len(dead)
+
+    def clear(self):
+        self._conn().execute("DELETE FROM presence")
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid,0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+_backend=None
+_backend_lock=threading.Lock()
+
+def get_presence():
+    #return the configured backend (created once per process)
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                conf=getattr(settings,"CHAT_PRESENCE",{})
+                cls=import_string(conf.get("BACKEND",DEFAULT_BACKEND))
+                _backend=cls(**conf.get("OPTIONS",{}))
+    return _backend
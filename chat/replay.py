@@ -0,0 +1,91 @@
+#bounded per-group ring buffer of recent chat.message payloads, used to resume a
+#reconnecting client from its last seen sequence without a full history fetch.
+#a buffer only exists while at least one local consumer is in the group, which is
+#what guarantees it has seen every message broadcast since it was created.
+from collections import deque
+from channels.db import database_sync_to_async
+from django.conf import settings
+from .metrics import WS_SESSIONS
+
+
+def _replay_settings():
+    conf=getattr(settings,"CHAT_REPLAY",{})
+    return conf.get("BUFFER_SIZE",256),conf.get("DB_LIMIT",500)
+
+
+class ReplayBuffer:
+    def __init__(self,size):
+        self.frames=deque(maxlen=size)
+        self.refs=0
+
+    @property
+    def last_seq(self):
+        return self.frames[-1]["seq"] if self.frames else 0
+
+    def append(self,event):
+        #every local consumer in the group sees the same event, only keep it once
+        seq=event.get("seq")
+        if seq is None or seq<=self.last_seq:
+            return
+        self.frames.append(event)
+
+    def since(self,after_seq):
+        #frames with seq > after_seq, or None if the buffer can't prove it has all of them
+        if not self.frames:
+            return None
+        if self.frames[0]["seq"]>after_seq+1:
+            return None
+        out=[f for f in self.frames if f["seq"]>after_seq]
+        expected=after_seq+1
+        for f in out:
+            if f["seq"]!=expected:
+                return None
+            expected+=1
+        return out
+
+
+_buffers={}
+
+def attach(group):
+    buf=_buffers.get(group)
+    if buf is None:
+        buf=_buffers[group]=ReplayBuffer(_replay_settings()[0])
+    buf.refs+=1
+    return buf
+
+def detach(group):
+    buf=_buffers.get(group)
+    if buf is None:
+        return
+    buf.refs-=1
+    if buf.refs<=0:
+        _buffers.pop(group,None)
+
+def get_buffer(group):
+    return _buffers.get(group)
+
+#a buffer exists exactly while the group has a local consumer
+WS_SESSIONS.set_function(lambda:len(_buffers))
+
+
+def load_from_db(session_id,after_seq,limit=None):
+    #DB fallback when the gap is bigger than the buffer. returns (events, truncated)
+    if limit is None:
+        limit=_replay_settings()[1]
+    from .models import Message
+    from .batching import message_event
+    rows=list(
+        Message.objects.filter(session_id=session_id,seq__gt=after_seq)
+        .order_by("seq")[:limit+1]
+    )
+    return [message_event(m) for m in rows[:limit]],len(rows)>limit
+
+
+async def missed_events(group,session_id,after_seq):
+    #frames after after_seq for a resuming subscriber: (events, source, truncated)
+    buf=get_buffer(group)
+    events=buf.since(after_seq) if buf is not None else None
+    if events is not None:
+        return events,"buffer",False
+    events,truncated=await database_sync_to_async(load_from_db)(session_id,after_seq)
+    return events,"db",truncated
@@ -0,0 +1,262 @@
+#cross-meeting reports (GET /api/reports/, manage.py meeting_report).
+#meetings created in [since, until) are loaded once as flat numpy columns (meeting code,
+#event code, identity code, microsecond timestamp) and reduced with sorts and grouped
+#sums instead of per-event python loops. rows are per agent per UTC day of the
+#meeting's creation. the interval rules match MeetingAccumulator:
+#  talk time:    a meeting's first identified join to its last identified leave, falling
+#                back to its first / last event
+#  participant:  each identity's joined -> left, from the first of repeated joins
+#  screen share: started -> stopped per identity, a restart replaces the start
+#intervals still open are closed at the meeting's last event.
+import datetime
+import numpy as np
+from django.conf import settings
+from .aggregation import session_event_log
+
+JOINED,LEFT,SHARE_STARTED,SHARE_STOPPED,MEETING_STARTED,MEETING_ENDED=1,2,3,4,5,6
+EVENT_CODES={
+    "joined":JOINED,"left":LEFT,
+    "screen_share_started":SHARE_STARTED,"screen_share_stopped":SHARE_STOPPED,
+    "meeting_started":MEETING_STARTED,"meeting_ended":MEETING_ENDED,
+}
+COLUMNS=("agent_id","day","meetings","talk_seconds","participant_seconds","screen_share_seconds","screen_shares")
+_EPOCH=datetime.datetime(1970,1,1,tzinfo=datetime.timezone.utc)
+_US=datetime.timedelta(microseconds=1)
+_DAY_US=86_400_000_000
+CHUNK_SIZE=5000
+
+
+def _report_settings():
+    conf=getattr(settings,"CHAT_REPORTS",{})
+    return conf.get("MAX_DAYS",366)
+
+
+def _micros(dt):
+    return (dt-_EPOCH)//_US
+
+
+class _Codes(dict):
+    #dense int codes for arbitrary keys, in first-seen order
+    def code(self,key):
+        c=self.get(key)
+        if c is None:
+            c=self[key]=len(self)
+        return c
+
+
+class EventColumns:
+    #events of the selected meetings as parallel arrays, plus per-meeting columns
+
+    def __init__(self,meetings,agents,meeting_agent,meeting_day,m,code,ident,ts):
+        self.meetings=meetings            #meeting id -> code
+        self.agents=agents                #agent id -> code
+        self.meeting_agent=meeting_agent  #[M] agent code
+        self.meeting_day=meeting_day      #[M] days since epoch (UTC)
+        self.m=m                          #[N] meeting code
+        self.code=code                    #[N] EVENT_CODES value, 0 for other events
+        self.ident=ident                  #[N] identity code, -1 for no identity
+        self.ts=ts                        #[N] microseconds since epoch
+
+    @classmethod
+    def load(cls,since,until,agent_id=None):
+        from .models import MeetingEvent, MeetingLink
+        links=MeetingLink.objects.filter(created_at__gte=since,created_at__lt=until)
+        if agent_id:
+            links=links.filter(session__agent_id=agent_id)
+        meetings=_Codes()
+        agents=_Codes()
+        meeting_agent=[]
+        meeting_day=[]
+        archived=set()
+        rows=links.order_by().values_list("id","session_id","session__agent_id","created_at","session__archived_at")
+        for link_id,session_id,agent,created_at,archived_at in rows.iterator(chunk_size=CHUNK_SIZE):
+            meetings.code(link_id)
+            meeting_agent.append(agents.code(agent))
+            meeting_day.append(_micros(created_at)//_DAY_US)
+            if archived_at:
+                archived.add(session_id)
+
+        identities=_Codes()
+        m,code,ident,ts=[],[],[],[]
+
+        def add(meeting_id,event_type,identity,created_at):
+            m.append(meetings[meeting_id])
+            code.append(EVENT_CODES.get(event_type,0))
+            ident.append(identities.code(identity) if identity else -1)
+            ts.append(_micros(created_at))
+
+        live=(
+            MeetingEvent.objects.filter(meeting_id__in=links.values("id"))
+            .order_by("created_at","id").values_list("meeting_id","event_type","identity","created_at")
+        )
+        for row in live.iterator(chunk_size=CHUNK_SIZE):
+            add(*row)
+        #archived sessions keep their events in the archive blob
+        for session_id in archived:
+            for e in session_event_log(session_id):
+                if e.meeting_id in meetings:
+                    add(e.meeting_id,e.event_type,e.identity,e.created_at)
+
+        return cls(
+            meetings,agents,
+            np.array(meeting_agent,dtype=np.int64),np.array(meeting_day,dtype=np.int64),
+            np.array(m,dtype=np.int64),np.array(code,dtype=np.int8),
+            np.array(ident,dtype=np.int64),np.array(ts,dtype=np.int64),
+        )
+
+    def meeting_ends(self):
+        #[M] last event time per meeting (0 for meetings without events)
+        end=np.zeros(len(self.meetings),dtype=np.int64)
+        np.maximum.at(end,self.m,self.ts)
+        return end
+
+    def talk_micros(self):
+        #[M] call window as in MeetingAccumulator.call_window: first identified join (else
+        #the first event) to last identified leave (else the last event), 0 without events
+        M=len(self.meetings)
+        big,small=np.iinfo(np.int64).max,np.iinfo(np.int64).min
+        named=self.ident>=0
+        first=np.full(M,big)
+        np.minimum.at(first,self.m,self.ts)
+        start=np.full(M,big)
+        end=np.full(M,small)
+        joins=named&(self.code==JOINED)
+        leaves=named&(self.code==LEFT)
+        np.minimum.at(start,self.m[joins],self.ts[joins])
+        np.maximum.at(end,self.m[leaves],self.ts[leaves])
+        start=np.where(start==big,first,start)
+        end=np.where(end==small,self.meeting_ends(),end)
+        return np.where(first==big,0,np.maximum(end-start,0))
+
+    def interval_rows(self,open_code,close_code,first_open,named_only):
+        #(meeting, start, end) arrays of open/close event pairs per (meeting, identity).
+        #first_open: repeated opens keep the first, else the last
+        rows=(self.code==open_code)|(self.code==close_code)
+        if named_only:
+            rows&=self.ident>=0
+        m,ident,ts=self.m[rows],self.ident[rows],self.ts[rows]
+        opens=self.code[rows]==open_code
+        #stable: ties keep load (created_at, id) order
+        order=np.lexsort((ts,ident,m))
+        m,ident,ts,opens=m[order],ident[order],ts[order],opens[order]
+        n=len(m)
+        same=np.zeros(n,dtype=bool)
+        same[1:]=(m[1:]==m[:-1])&(ident[1:]==ident[:-1])
+        #index of the open each row's interval starts from
+        prev_open=np.zeros(n,dtype=bool)
+        prev_open[1:]=opens[:-1]&same[1:]
+        starts=opens&~prev_open if first_open else opens
+        start_at=np.maximum.accumulate(np.where(starts,np.arange(n),0)) if n else np.zeros(0,dtype=np.int64)
+        #a close directly after an open closes it
+        closed_idx=np.flatnonzero(~opens&prev_open)
+        #an open that is the last row of its group is closed at the meeting's end
+        last=np.ones(n,dtype=bool)
+        last[:-1]=~same[1:]
+        open_idx=np.flatnonzero(opens&last)
+        ends=self.meeting_ends()
+        return (
+            np.concatenate([m[closed_idx],m[open_idx]]),
+            np.concatenate([ts[start_at[closed_idx-1]],ts[start_at[open_idx]]]),
+            np.concatenate([ts[closed_idx],ends[m[open_idx]]]),
+        )
+
+    def intervals(self,open_code,close_code,first_open,named_only):
+        #([M] summed interval micros, [M] interval count), see interval_rows
+        m,start,end=self.interval_rows(open_code,close_code,first_open,named_only)
+        M=len(self.meetings)
+        return np.bincount(m,weights=end-start,minlength=M),np.bincount(m,minlength=M)
+
+    def meeting_spans(self):
+        #(meeting, start, end) per meeting with events: meeting_started or the first
+        #identified join, to meeting_ended or the last identified leave. a meeting with
+        #no end (or an end before its start) runs until its last event
+        M=len(self.meetings)
+        big,small=np.iinfo(np.int64).max,np.iinfo(np.int64).min
+        named=self.ident>=0
+        opens=(self.code==MEETING_STARTED)|(named&(self.code==JOINED))
+        closes=(self.code==MEETING_ENDED)|(named&(self.code==LEFT))
+        start=np.full(M,big)
+        end=np.full(M,small)
+        np.minimum.at(start,self.m[opens],self.ts[opens])
+        np.maximum.at(end,self.m[closes],self.ts[closes])
+        last=self.meeting_ends()
+        end=np.where((end==small)|(end<start),last,end)
+        live=np.flatnonzero(start!=big)
+        return live,start[live],end[live]
+
+
+def agent_day_rows(cols):
+    #one dict per (agent, day) with COLUMNS, ordered by agent id then day
+    M=len(cols.meetings)
+    if not M:
+        return []
+    talk=cols.talk_micros()
+    presence,_=cols.intervals(JOINED,LEFT,first_open=True,named_only=True)
+    share,shares=cols.intervals(SHARE_STARTED,SHARE_STOPPED,first_open=False,named_only=False)
+
+    keys=np.stack([cols.meeting_agent,cols.meeting_day],axis=1)
+    groups,inverse=np.unique(keys,axis=0,return_inverse=True)
+    inverse=inverse.reshape(-1)
+    G=len(groups)
+
+    def per_group(values):
+        return np.bincount(inverse,weights=values,minlength=G)
+
+    meetings=np.bincount(inverse,minlength=G)
+    sums=[per_group(talk)/1e6,per_group(presence)/1e6,per_group(share)/1e6,per_group(shares)]
+    agent_ids=list(cols.agents)
+    out=[]
+    for g,(agent,day) in enumerate(groups):
+        out.append({
+            "agent_id":agent_ids[agent],
+            "day":(_EPOCH+datetime.timedelta(days=int(day))).date().isoformat(),
+            "meetings":int(meetings[g]),
+            "talk_seconds":round(float(sums[0][g]),3),
+            "participant_seconds":round(float(sums[1][g]),3),
+            "screen_share_seconds":round(float(sums[2][g]),3),
+            "screen_shares":int(sums[3][g]),
+        })
+    out.sort(key=lambda r:(r["agent_id"] or "",r["day"]))
+    return out
+
+
+def report(since,until,agent_id=None):
+    #{"rows": [...], "totals": {...}} for meetings created in [since, until)
+    if until<=since:
+        raise ValueError("the range is empty")
+    if until-since>datetime.timedelta(days=_report_settings()):
+        raise ValueError(f"the range is longer than {_report_settings()} days")
+    rows=agent_day_rows(EventColumns.load(since,until,agent_id))
+    totals={c:0 for c in COLUMNS[2:]}
+    for r in rows:
+        for c in totals:
+            totals[c]+=r[c]
+    for c in ("talk_seconds","participant_seconds","screen_share_seconds"):
+        totals[c]=round(totals[c],3)
+    return {"since":since,"until":until,"agent_id":agent_id,"rows":rows,"totals":totals}
+
+
+def parse_range(since,until,default_days=30,today=None):
+    #[since, until) from "from"/"to" query values: dates (to is inclusive) or datetimes.
+    #raises ValueError naming the bad parameter
+    from django.utils import timezone
+    from django.utils.dateparse import parse_date, parse_datetime
+
+    def bound(name,value,inclusive):
+        #dates first: parse_datetime also accepts a bare date (as midnight)
+        try:
+            d=parse_date(value)
+            if d is not None:
+                dt=datetime.datetime.combine(d+datetime.timedelta(days=1 if inclusive else 0),datetime.time())
+            else:
+                dt=parse_datetime(value)
+                if dt is None:
+                    raise ValueError
+        except ValueError:
+            raise ValueError(f"invalid {name}")
+        return timezone.make_aware(dt) if timezone.is_naive(dt) else dt
+
+    today=today or timezone.now().date()
+    end=bound("to",until,True) if until else timezone.make_aware(datetime.datetime.combine(today+datetime.timedelta(days=1),datetime.time()))
+    start=bound("from",since,False) if since else end-datetime.timedelta(days=default_days)
+    return start,end
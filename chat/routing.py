@@ -1,6 +1,4 @@
 # chat/routing.py
-print("[ROUTING] loading chat.routing")
-
 from django.urls import re_path
 from . import consumers
 
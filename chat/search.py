@@ -0,0 +1,161 @@
+#full-text search over chat messages.
+#sqlite: an FTS5 external-content table over chat_message, kept in sync by triggers,
+#so every insert path (bulk writer, admin, migrations) is indexed without app code.
+#postgres: a GIN index on to_tsvector(text), queried with websearch_to_tsquery.
+#other backends fall back to icontains.
+import re
+from django.db import connection
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE="chat_message_fts"
+PG_CONFIG="english"
+PG_INDEX="chat_message_text_tsv"
+
+SQLITE_TABLE=(
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "text, sender, content='chat_message', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+)
+SQLITE_TRIGGERS=[
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON chat_message BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, text, sender) VALUES (new.id, new.text, new.sender);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON chat_message BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text, sender) VALUES ('delete', old.id, old.text, old.sender);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF text, sender ON chat_message BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text, sender) VALUES ('delete', old.id, old.text, old.sender);
+        INSERT INTO {FTS_TABLE}(rowid, text, sender) VALUES (new.id, new.text, new.sender);
+    END""",
+]
+PG_VECTOR=f"to_tsvector('{PG_CONFIG}'::regconfig, COALESCE(text, ''))"
+_PG_DOC=f"to_tsvector('{PG_CONFIG}'::regconfig, COALESCE(chat_message.text, ''))"
+_PG_QUERY=f"websearch_to_tsquery('{PG_CONFIG}', %s)"
+PG_MATCH=f"{_PG_DOC} @@ {_PG_QUERY}"
+PG_RANK=f"ts_rank({_PG_DOC}, {_PG_QUERY})"
+
+_TOKEN=re.compile(r"\w+\*?",re.UNICODE)
+
+
+def install(conn,rebuild=True):
+    #create the index for this backend; safe to run repeatedly
+    with conn.cursor() as cur:
+        if conn.vendor=="sqlite":
+            cur.execute(SQLITE_TABLE)
+            for sql in SQLITE_TRIGGERS:
+                cur.execute(sql)
+            if rebuild:
+                cur.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        elif conn.vendor=="postgresql":
+            cur.execute(f"CREATE INDEX IF NOT EXISTS {PG_INDEX} ON chat_message USING gin ({PG_VECTOR})")
+
+
+def uninstall(conn):
+    with conn.cursor() as cur:
+        if conn.vendor=="sqlite":
+            for suffix in ("ai","ad","au"):
+                cur.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+            cur.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+        elif conn.vendor=="postgresql":
+            cur.execute(f"DROP INDEX IF EXISTS {PG_INDEX}")
+
+
+def ensure_triggers(sender=None,using="default",**kwargs):
+    #post_migrate hook: sqlite migrations that rebuild chat_message drop its triggers
+    from django.db import connections
+    conn=connections[using]
+    if conn.vendor!="sqlite" or FTS_TABLE not in conn.introspection.table_names():
+        return
+    with conn.cursor() as cur:
+        for sql in SQLITE_TRIGGERS:
+            cur.execute(sql)
+
+
+def fts_query(q):
+    #user text -> safe FTS5 MATCH expression: every word must appear, "word*" is a
+    #prefix match. None when there is nothing searchable
+    terms=[]
+    for tok in _TOKEN.findall(q or ""):
+        word=tok.rstrip("*")
+        if word:
+            terms.append(f'"{word}"'+("*" if tok.endswith("*") else ""))
+    return " ".join(terms) or None
+
+
+def _enabled():
+    if connection.vendor=="sqlite":
+        return FTS_TABLE in connection.introspection.table_names()
+    return connection.vendor=="postgresql"
+
+
+def match(qs,q):
+    #narrow a Message queryset to rows matching q (no ranking); used by the admin
+    if not _enabled():
+        return qs.filter(text__icontains=q)
+    if connection.vendor=="sqlite":
+        expr=fts_query(q)
+        if expr is None:
+            return qs.none()
+        return qs.filter(id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",[expr]))
+    return qs.alias(fts_match=RawSQL(PG_MATCH,[q],output_field=BooleanField())).filter(fts_match=True)
+
+
+def _filtered(qs,session_id=None,role=None,since=None,until=None):
+    if session_id is not None:
+        qs=qs.filter(session_id=session_id)
+    if role:
+        qs=qs.filter(role=role)
+    if since is not None:
+        qs=qs.filter(sent_at__gte=since)
+    if until is not None:
+        qs=qs.filter(sent_at__lt=until)
+    return qs
+
+
+def _sqlite_ranked(expr,session_id,role,since,until,limit,offset):
+    #one pass over the FTS match joined to chat_message; bm25() only exists inside
+    #the MATCH query, so filters and ordering have to live in the same statement
+    from .models import Message
+    where=[f"{FTS_TABLE} MATCH %s"]
+    params=[expr]
+    if session_id is not None:
+        where.append("m.session_id = %s")
+        params.append(Message._meta.get_field("session").target_field.get_db_prep_value(session_id,connection))
+    if role:
+        where.append("m.role = %s")
+        params.append(role)
+    if since is not None:
+        where.append("m.sent_at >= %s")
+        params.append(connection.ops.adapt_datetimefield_value(since))
+    if until is not None:
+        where.append("m.sent_at < %s")
+        params.append(connection.ops.adapt_datetimefield_value(until))
+    sql=(
+        f"SELECT m.id, -bm25({FTS_TABLE}) FROM {FTS_TABLE} JOIN chat_message m ON m.id = {FTS_TABLE}.rowid "
+        f"WHERE {' AND '.join(where)} ORDER BY bm25({FTS_TABLE}), m.id DESC LIMIT %s OFFSET %s"
+    )
+    with connection.cursor() as cur:
+        cur.execute(sql,params+[limit,offset])
+        return cur.fetchall()
+
+
+def search(q,session_id=None,role=None,since=None,until=None,limit=20,offset=0):
+    #ranked page of messages matching q -> ([(message, score)], has_more).
+    #higher score is better; score is None on the icontains fallback
+    from .models import Message
+    if not _enabled():
+        qs=_filtered(Message.objects.filter(text__icontains=q),session_id,role,since,until)
+        rows=list(qs.order_by("-sent_at","-id")[offset:offset+limit+1])
+        return [(m,None) for m in rows[:limit]],len(rows)>limit
+    if connection.vendor=="sqlite":
+        expr=fts_query(q)
+        if expr is None:
+            return [],False
+        hits=_sqlite_ranked(expr,session_id,role,since,until,limit+1,offset)
+        found=Message.objects.in_bulk([pk for pk,_ in hits[:limit]])
+        return [(found[pk],score) for pk,score in hits[:limit] if pk in found],len(hits)>limit
+    qs=_filtered(match(Message.objects.all(),q),session_id,role,since,until).annotate(
+        score=RawSQL(PG_RANK,[q],output_field=FloatField()),
+    )
+    rows=list(qs.order_by("-score","-id")[offset:offset+limit+1])
+    return [(m,m.score) for m in rows[:limit]],len(rows)>limit
@@ -10,8 +10,8 @@ class SessionSeralizer(serializers.ModelSerializer):
 class MessageSeralizer(serializers.ModelSerializer):
     class Meta:
         model=Message
-        fields=['id','session','sender','role','text','sent_at']
-        read_only_fields=['id','sent_at']
+        fields=['id','session','seq','sender','role','text','sent_at']
+        read_only_fields=['id','seq','sent_at']
 
 class MeetingLinkSerializer(serializers.ModelSerializer):
     session=serializers.PrimaryKeyRelatedField(read_only=True)
@@ -0,0 +1,165 @@
+#SessionStats rollups, maintained incrementally by the write paths so the session
+#lists never aggregate over messages or meeting events.
+#  messages:        save_messages -> on_messages
+#  meeting links:   create_meeting_link -> on_meeting_created
+#  meeting events:  meeting_event / meeting_events_batch -> on_meeting_event(s)
+#a call runs from a meeting's first "joined" to its last "left" event.
+#rebuild() recomputes everything from the tables (and archives).
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Min, Value
+from django.db.models.functions import Coalesce, Greatest
+
+REBUILD_CHUNK=500
+
+
+def _bump(session_id,**changes):
+    from .models import SessionStats
+    if SessionStats.objects.filter(session_id=session_id).update(**changes):
+        return
+    #first write for this session
+    try:
+        with transaction.atomic():
+            SessionStats.objects.create(session_id=session_id)
+    except IntegrityError:
+        pass
+    SessionStats.objects.filter(session_id=session_id).update(**changes)
+
+
+def _latest(field,value):
+    #the later of the stored timestamp and value, so a late batch never moves it back.
+    #Coalesce because sqlite's GREATEST is NULL when either side is
+    return Coalesce(Greatest(F(field),Value(value)),Value(value))
+
+
+def on_messages(session_id,count,last_at):
+    _bump(session_id,message_count=F("message_count")+count,last_message_at=_latest("last_message_at",last_at))
+
+
+def on_meeting_created(session_id):
+    _bump(session_id,meeting_count=F("meeting_count")+1)
+
+
+def _call_seconds(start,end):
+    if start is None or end is None or end<start:
+        return 0.0
+    return (end-start).total_seconds()
+
+
+def on_meeting_event(event):
+    on_meeting_events([event])
+
+
+def on_meeting_events(events):
+    #events: one meeting's new events. call inside the transaction that saved them;
+    #the link row lock keeps concurrent events for one meeting from racing on its call window
+    from .models import MeetingLink
+    first=events[0]
+    link=MeetingLink.objects.select_for_update().only("call_started_at","call_ended_at").get(id=first.meeting_id)
+    start,end=link.call_started_at,link.call_ended_at
+    for event in events:
+        if event.identity and event.event_type=="joined" and (start is None or event.created_at<start):
+            start=event.created_at
+        elif event.identity and event.event_type=="left" and (end is None or event.created_at>end):
+            end=event.created_at
+    if (start,end)!=(link.call_started_at,link.call_ended_at):
+        MeetingLink.objects.filter(id=link.id).update(call_started_at=start,call_ended_at=end)
+    delta=_call_seconds(start,end)-_call_seconds(link.call_started_at,link.call_ended_at)
+    changes={"last_meeting_at":_latest("last_meeting_at",max(e.created_at for e in events))}
+    if delta:
+        changes["call_seconds"]=F("call_seconds")+delta
+    _bump(first.session_id,**changes)
+
+
+def _archived_rollups(SessionArchive,ids):
+    #{session_id: (message_count, last_message_at, {meeting_id: (first join, last leave)}, last event)}
+    from .archive import unpack
+    from django.utils.dateparse import parse_datetime
+    out={}
+    for session_id,data in SessionArchive.objects.filter(session_id__in=ids).values_list("session_id","data"):
+        payload=unpack(data)
+        msgs=payload["messages"]
+        calls={}
+        last_event=None
+        for e in payload["meeting_events"]:
+            at=parse_datetime(e["created_at"])
+            last_event=at
+            start,end=calls.get(e["meeting_id"],(None,None))
+            if e["identity"] and e["event_type"]=="joined" and start is None:
+                start=at
+            elif e["identity"] and e["event_type"]=="left":
+                end=at
+            calls[e["meeting_id"]]=(start,end)
+        out[session_id]=(len(msgs),parse_datetime(msgs[-1]["sent_at"]) if msgs else None,calls,last_event)
+    return out
+
+
+def rebuild(session_ids=None):
+    #recompute SessionStats and meeting call windows from scratch; returns sessions done
+    from .models import MeetingEvent, MeetingLink, Message, Session, SessionArchive, SessionStats
+    qs=Session.objects.order_by("id").values_list("id","archived_at")
+    if session_ids is not None:
+        qs=qs.filter(id__in=list(session_ids))
+    done=0
+    chunk=[]
+    for row in qs.iterator(chunk_size=REBUILD_CHUNK):
+        chunk.append(row)
+        if len(chunk)>=REBUILD_CHUNK:
+            done+=_rebuild_chunk(chunk,Message,MeetingLink,MeetingEvent,SessionStats,SessionArchive)
+            chunk=[]
+    if chunk:
+        done+=_rebuild_chunk(chunk,Message,MeetingLink,MeetingEvent,SessionStats,SessionArchive)
+    return done
+
+
+def _rebuild_chunk(rows,Message,MeetingLink,MeetingEvent,SessionStats,SessionArchive):
+    ids=[sid for sid,_ in rows]
+    archived={sid for sid,archived_at in rows if archived_at}
+    messages={
+        r["session_id"]:(r["n"],r["last"])
+        for r in Message.objects.filter(session_id__in=ids).values("session_id")
+        .annotate(n=Count("id"),last=Max("sent_at")).order_by()
+    }
+    meetings={
+        r["session_id"]:r["n"]
+        for r in MeetingLink.objects.filter(session_id__in=ids).values("session_id").annotate(n=Count("id")).order_by()
+    }
+    last_event={
+        r["session_id"]:r["last"]
+        for r in MeetingEvent.objects.filter(session_id__in=ids).values("session_id")
+        .annotate(last=Max("created_at")).order_by()
+    }
+    events=MeetingEvent.objects.filter(session_id__in=ids,identity__isnull=False).exclude(identity="")
+    joins=dict(events.filter(event_type="joined").values("meeting_id").annotate(t=Min("created_at")).order_by().values_list("meeting_id","t"))
+    leaves=dict(events.filter(event_type="left").values("meeting_id").annotate(t=Max("created_at")).order_by().values_list("meeting_id","t"))
+    cold=_archived_rollups(SessionArchive,archived) if archived else {}
+
+    windows=[]
+    with transaction.atomic():
+        for link_id,session_id in MeetingLink.objects.filter(session_id__in=ids).values_list("id","session_id"):
+            if session_id in cold:
+                start,end=cold[session_id][2].get(str(link_id),(None,None))
+            else:
+                start,end=joins.get(link_id),leaves.get(link_id)
+            MeetingLink.objects.filter(id=link_id).update(call_started_at=start,call_ended_at=end)
+            windows.append((session_id,_call_seconds(start,end)))
+        call_seconds={}
+        for session_id,secs in windows:
+            call_seconds[session_id]=call_seconds.get(session_id,0.0)+secs
+        SessionStats.objects.filter(session_id__in=ids).delete()
+        out=[]
+        for sid in ids:
+            if sid in cold:
+                n,last_msg,_,last_meet=cold[sid]
+            else:
+                n,last_msg=messages.get(sid,(0,None))
+                last_meet=last_event.get(sid)
+            out.append(SessionStats(
+                session_id=sid,
+                message_count=n,
+                last_message_at=last_msg,
+                meeting_count=meetings.get(sid,0),
+                last_meeting_at=last_meet,
+                call_seconds=call_seconds.get(sid,0.0),
+            ))
+        SessionStats.objects.bulk_create(out)
+    return len(ids)
@@ -1,3 +1,1448 @@
-from django.test import TestCase
+import asyncio
+import base64
+import csv
+import datetime
+import gzip
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock, skipUnless
+from urllib.parse import parse_qs
+import msgpack
+import numpy as np
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from . import archive, batching, cache, export, metrics, pipeline, presence, replay, reports, stats, timeline, tokens, twilio_jobs, wire
+from .aggregation import session_report
+from .outbox import Outbox
+from .routing import websocket_urlpatterns
+from .models import ConcurrencyBucket, MeetingEvent, MeetingLink, MeetingState, Message, Session, SessionStats, TwilioJob
 
-# Create your tests here.
+#sqlite_stat1 rows describing a 10M-session table: (index, stat after the row count).
+#the numbers are average rows per distinct prefix value, e.g. ~2000 sessions per agent
+SESSION_STATS_10M={
+    "chat_session_created_idx":"1 1",
+    "chat_session_active_idx":"5000000 1 1",
+    "chat_session_agent_idx":"2000 1 1",
+    "chat_session_customer_idx":"5 1 1",
+}
+
+
+@skipUnless(connection.vendor=="sqlite","query plans are checked against sqlite")
+class SessionHistoryPlanTests(TestCase):
+    #every history filter must walk an index in (created_at, id) order at 10M rows,
+    #never scan chat_session or sort in a temp b-tree
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(6):
+            Session.objects.create(title=f"s{i}",agent_id=f"agent{i%2}",customer_id=f"cust{i%3}",is_active=i%2==0)
+
+    def setUp(self):
+        rows=10_000_000
+        with connection.cursor() as cur:
+            cur.execute("ANALYZE")
+            cur.execute("DELETE FROM sqlite_stat1 WHERE tbl='chat_session'")
+            indexes=[r[1] for r in cur.execute("PRAGMA index_list('chat_session')").fetchall()]
+            for name in indexes:
+                stat=SESSION_STATS_10M.get(name,"1")
+                cur.execute("INSERT INTO sqlite_stat1(tbl, idx, stat) VALUES ('chat_session', %s, %s)",[name,f"{rows} {stat}"])
+            cur.execute("ANALYZE sqlite_master")
+
+    def plan_for(self,query):
+        with CaptureQueriesContext(connection) as ctx:
+            res=self.client.get("/api/sessions/history/"+query)
+        self.assertEqual(res.status_code,200,res.content)
+        sql=next(q["sql"] for q in ctx.captured_queries if 'FROM "chat_session"' in q["sql"])
+        with connection.cursor() as cur:
+            return "\n".join(r[-1] for r in cur.execute("EXPLAIN QUERY PLAN "+sql).fetchall())
+
+    def assertUsesIndex(self,query,*indexes):
+        plan=self.plan_for(query)
+        self.assertTrue(any(f"INDEX {i}" in plan for i in indexes),plan)
+        self.assertNotIn("TEMP B-TREE",plan,plan)
+        self.assertIsNone(re.search(r"SCAN chat_session(?! USING)",plan),plan)
+
+    def test_unfiltered(self):
+        self.assertUsesIndex("",'chat_session_created_idx')
+
+    def test_active(self):
+        #stat1 only knows is_active has two values, so walking created_idx and
+        #filtering is as cheap as the active index; either is fine, a sort is not
+        self.assertUsesIndex("?active=true",'chat_session_active_idx','chat_session_created_idx')
+
+    def test_agent(self):
+        self.assertUsesIndex("?agent=agent1",'chat_session_agent_idx')
+
+    def test_agent_and_active(self):
+        self.assertUsesIndex("?agent=agent1&active=false",'chat_session_agent_idx')
+
+    def test_customer(self):
+        self.assertUsesIndex("?customer=cust2",'chat_session_customer_idx')
+
+    def test_created_range(self):
+        self.assertUsesIndex(
+            "?created_after=2020-01-01T00:00:00Z&created_before=2030-01-01T00:00:00Z",'chat_session_created_idx',
+        )
+
+    def test_next_page(self):
+        first=self.client.get("/api/sessions/history/?agent=agent0&limit=1").json()
+        self.assertTrue(first["has_more"])
+        self.assertUsesIndex(f"?agent=agent0&limit=1&cursor={first['next_cursor']}",'chat_session_agent_idx')
+
+    def test_pages_cover_filter(self):
+        seen=[]
+        cursor=""
+        while True:
+            page=self.client.get(f"/api/sessions/history/?agent=agent0&limit=2{cursor}").json()
+            seen.extend(r["id"] for r in page["results"])
+            if not page["has_more"]:
+                break
+            cursor=f"&cursor={page['next_cursor']}"
+        expected=Session.objects.filter(agent_id="agent0").order_by("-created_at","-id").values_list("id",flat=True)
+        self.assertEqual(seen,[str(i) for i in expected])
+
+    def test_malformed_cursor(self):
+        for raw in ("2020-01-01T00:00:00+00:00|abc","2020-01-01T00:00:00+00:00|","nope|"+str(Session.objects.first().id)):
+            cursor=base64.urlsafe_b64encode(raw.encode()).decode()
+            res=self.client.get("/api/sessions/history/",{"cursor":cursor})
+            self.assertEqual((res.status_code,res.json()),(400,{"error":"invalid cursor"}),raw)
+
+
+class MeetingAggregationQueryTests(TestCase):
+    #session_summary and meeting_analytics read folded MeetingState rows, so their
+    #query count must not depend on how many meetings or events a session has
+
+    def setUp(self):
+        self.session=Session.objects.create(title="s")
+
+    def add_meeting(self,*events):
+        link=MeetingLink.objects.create(session=self.session,room_name=f"room-{MeetingLink.objects.count()}")
+        for event_type,identity in events:
+            res=self.client.post(f"/api/meetings/{link.id}/events/",{"event_type":event_type,"identity":identity},content_type="application/json")
+            self.assertEqual(res.status_code,201,res.content)
+        return link
+
+    def count_queries(self,url):
+        with CaptureQueriesContext(connection) as ctx:
+            res=self.client.get(url)
+        self.assertEqual(res.status_code,200,res.content)
+        return len(ctx.captured_queries),res.json()
+
+    def test_summary_queries_constant(self):
+        self.add_meeting(("joined","a"),("left","a"))
+        url=f"/api/sessions/{self.session.id}/summary/"
+        one,_=self.count_queries(url)
+        for _ in range(5):
+            self.add_meeting(("joined","a"),("screen_share_started","a"),("joined","b"),("left","a"),("left","b"))
+        six,data=self.count_queries(url)
+        self.assertEqual(one,six)
+        self.assertEqual(data["session"]["meeting_count"],6)
+
+    def test_analytics_queries_constant(self):
+        link=self.add_meeting(("joined","a"))
+        url=f"/api/meetings/{link.id}/analytics/"
+        few,_=self.count_queries(url)
+        for _ in range(10):
+            self.client.post(f"/api/meetings/{link.id}/events/",{"event_type":"muted","identity":"a"},content_type="application/json")
+        many,_=self.count_queries(url)
+        self.assertEqual(few,many)
+
+    def test_analytics_event_log(self):
+        #the log is part of the response unless asked to leave it out
+        link=self.add_meeting(("joined","a"),("left","a"))
+        _,data=self.count_queries(f"/api/meetings/{link.id}/analytics/")
+        self.assertEqual([e["event_type"] for e in data["events"]],["joined","left"])
+        _,data=self.count_queries(f"/api/meetings/{link.id}/analytics/?include_events=0")
+        self.assertNotIn("events",data)
+        self.assertEqual(data["summary"]["participants"],["a"])
+
+    def test_summary_metrics(self):
+        self.add_meeting(
+            ("joined","a"),("screen_share_started","a"),("joined","b"),
+            ("screen_share_stopped","a"),("screen_share_started","b"),("left","a"),
+        )
+        self.add_meeting()
+        _,data=self.count_queries(f"/api/sessions/{self.session.id}/summary/")
+        empty,meeting=data["meetings"]
+        self.assertIsNone(empty["started_at"])
+        self.assertEqual(empty["screen_share_sessions"],[])
+        self.assertEqual(meeting["participants"],["a","b"])
+        self.assertEqual([s["identity"] for s in meeting["screen_share_sessions"]],["a","b"])
+        #b's share is still open, so it ends with the call (a's leave)
+        self.assertEqual(meeting["screen_share_sessions"][1]["end"],meeting["ended_at"])
+        self.assertEqual(data["session"]["first_meeting_at"],meeting["started_at"])
+        self.assertEqual(data["session"]["last_meeting_at"],meeting["ended_at"])
+
+
+class FakeTwilio(ThreadingHTTPServer):
+    #local stand-in for video.twilio.com. answers are popped from `script` per path
+    #(default 200 with a minimal resource); requests are kept with the client's address
+    daemon_threads=True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1",0),FakeTwilioHandler)
+        self.script={}
+        self.requests=[]
+        self.url=f"http://127.0.0.1:{self.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever,daemon=True).start()
+        return self
+
+    def __exit__(self,*exc):
+        self.shutdown()
+        self.server_close()
+
+
+class FakeTwilioHandler(BaseHTTPRequestHandler):
+    protocol_version="HTTP/1.1"
+
+    def do_POST(self):
+        body=self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode()
+        self.server.requests.append((self.path,parse_qs(body),self.client_address))
+        queued=self.server.script.get(self.path) or []
+        status,payload=queued.pop(0) if queued else (200,None)
+        if payload is None:
+            payload={"sid":"CJ123","status":"enqueued"} if self.path=="/v1/Compositions" else {"room_sid":"RM123","rules":[]}
+        data=json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type","application/json")
+        self.send_header("Content-Length",str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self,*args):
+        pass
+
+
+class TwilioJobTests(TestCase):
+    #recording and composition calls are queued as TwilioJob rows and run against a
+    #local fake Twilio through the pooled client
+
+    def setUp(self):
+        self.fake=FakeTwilio().__enter__()
+        self.addCleanup(self.fake.__exit__)
+        settings=override_settings(
+            TWILIO_ACCOUNT_SID="AC"+"0"*32,
+            TWILIO_AUTH_TOKEN="secret",
+            CHAT_TWILIO_JOBS={"API_BASE":self.fake.url,"INLINE":False,"BACKOFF_SECONDS":0,"MAX_ATTEMPTS":3},
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        session=Session.objects.create(title="s")
+        self.link=MeetingLink.objects.create(session=session,room_name="room",room_sid="RM123")
+
+    def post(self,action):
+        res=self.client.post(f"/api/meetings/{self.link.id}/{action}/",{"identity":"agent1"},content_type="application/json")
+        self.assertEqual(res.status_code,202,res.content)
+        self.assertEqual(res.json()["status"],"pending")
+        return res.json()
+
+    def test_recording_retried_after_server_error(self):
+        self.fake.script["/v1/Rooms/RM123/RecordingRules"]=[(503,{"code":20500,"message":"try again"})]
+        job=self.post("start-recording")
+        self.assertEqual(twilio_jobs.run_due(),{"pending":1})
+        self.assertIn("503",TwilioJob.objects.get(id=job["id"]).error)
+        self.assertEqual(twilio_jobs.run_due(),{"succeeded":1})
+        row=TwilioJob.objects.get(id=job["id"])
+        self.assertEqual((row.attempts,row.result["status"],row.error),(2,"recording_started",""))
+        path,form,_=self.fake.requests[-1]
+        self.assertEqual(path,"/v1/Rooms/RM123/RecordingRules")
+        self.assertEqual(json.loads(form["Rules"][0]),[{"type":"include","all":True}])
+
+    def test_client_error_fails_without_retry(self):
+        self.fake.script["/v1/Rooms/RM123/RecordingRules"]=[(404,{"code":20404,"message":"not found"})]
+        job=self.post("stop-recording")
+        self.assertEqual(twilio_jobs.run_due(),{"failed":1})
+        self.assertEqual(twilio_jobs.run_due(),{})
+        res=self.client.get(f"/api/twilio-jobs/{job['id']}/?wait=5")
+        self.assertEqual((res.json()["status"],res.json()["attempts"]),("failed",1))
+
+    def test_composition_logged_and_connection_reused(self):
+        first=self.post("create-composition")
+        second=self.post("create-composition")
+        self.assertEqual(twilio_jobs.run_due(),{"succeeded":2})
+        self.assertEqual(len({addr for _,_,addr in self.fake.requests}),1)
+        res=self.client.get(first["poll"])
+        self.assertEqual(res.json()["result"]["composition_sid"],"CJ123")
+        events=MeetingEvent.objects.filter(meeting=self.link,event_type="composition_created")
+        self.assertEqual(sorted(e.metadata["job_id"] for e in events),sorted([first["id"],second["id"]]))
+        self.assertEqual(MeetingState.objects.get(meeting=self.link).event_count,2)
+
+
+class ListMessagesSinceTests(TestCase):
+    #?since= without an offset is read as UTC, for live and archived sessions alike
+
+    def setUp(self):
+        self.session=Session.objects.create(title="s")
+        utc=datetime.timezone.utc
+        for seq,at in ((1,datetime.datetime(2024,12,31,12,tzinfo=utc)),(2,datetime.datetime(2025,1,1,12,tzinfo=utc))):
+            m=Message.objects.create(session=self.session,sender="a",text=f"m{seq}",seq=seq)
+            Message.objects.filter(id=m.id).update(sent_at=at)
+
+    def since(self):
+        res=self.client.get(f"/api/sessions/{self.session.id}/messages/?since=2025-01-01T00:00:00")
+        self.assertEqual(res.status_code,200,res.content)
+        return [m["text"] for m in res.json()["results"]]
+
+    def test_live(self):
+        self.assertEqual(self.since(),["m2"])
+
+    def test_archived(self):
+        Session.objects.filter(id=self.session.id).update(is_active=False)
+        self.assertEqual(archive.archive_session(self.session.id),(2,0))
+        self.assertEqual(self.since(),["m2"])
+
+
+class MessageCursorTests(TestCase):
+    #before/after cursors page through live and archived messages; a malformed one is a 400
+
+    def setUp(self):
+        self.session=Session.objects.create(title="s")
+        batching.save_messages([
+            {"session_id":str(self.session.id),"sender":"u","role":"customer","text":f"m{i}"} for i in range(1,6)
+        ])
+        self.url=f"/api/sessions/{self.session.id}/messages/"
+
+    def page(self,**params):
+        res=self.client.get(self.url,params)
+        self.assertEqual(res.status_code,200,res.content)
+        data=res.json()
+        return [m["text"] for m in data["results"]],data
+
+    def walk(self):
+        texts,data=self.page(limit=2)
+        self.assertEqual((texts,data["has_more"]),(["m4","m5"],True))
+        texts,older=self.page(limit=2,before=data["before_cursor"])
+        self.assertEqual(texts,["m2","m3"])
+        texts,_=self.page(limit=2,after=older["after_cursor"])
+        self.assertEqual(texts,["m4","m5"])
+
+    def assertRejected(self):
+        stamp="2020-01-01T00:00:00+00:00"
+        for raw in (f"{stamp}|abc",f"{stamp}|","not a date|1","nonsense"):
+            cursor=base64.urlsafe_b64encode(raw.encode()).decode()
+            for name in ("before","after"):
+                res=self.client.get(self.url,{name:cursor})
+                self.assertEqual((res.status_code,res.json()),(400,{"error":"invalid cursor"}),raw)
+
+    def test_live(self):
+        self.walk()
+        self.assertRejected()
+
+    def test_archived(self):
+        Session.objects.filter(id=self.session.id).update(is_active=False)
+        archive.archive_session(self.session.id)
+        self.walk()
+        self.assertRejected()
+
+
+class ResumeTests(TransactionTestCase):
+    #messages get per-session seqs (returned in the ack); identify with a positive
+    #last_seq replays what was missed, from the ring buffer or the DB, and a first
+    #join (no last_seq, or 0) gets nothing replayed
+
+    def setUp(self):
+        self.session=Session.objects.create(title="s")
+        self.url=f"/ws/sessions/{self.session.id}/"
+
+    async def connect(self):
+        ws=WebsocketCommunicator(URLRouter(websocket_urlpatterns),self.url)
+        ok,_=await ws.connect()
+        self.assertTrue(ok)
+        self.assertEqual((await ws.receive_json_from())["type"],"connected")
+        return ws
+
+    async def identify(self,ws,**extra):
+        await ws.send_json_to({"action":"identify","user":"u","role":"customer",**extra})
+        frames=[]
+        while not await ws.receive_nothing(0.2):
+            frames.append(await ws.receive_json_from())
+        return [f.get("type") for f in frames],frames
+
+    async def test_first_join_and_reconnect(self):
+        sender=await self.connect()
+        for text in ("one","two","three"):
+            await sender.send_json_to({"action":"message","text":text})
+            while not await sender.receive_nothing(0.2):
+                await sender.receive_json_from()
+        for extra in ({},{"last_seq":0}):
+            ws=await self.connect()
+            types,_=await self.identify(ws,**extra)
+            self.assertNotIn("resumed",types)
+            self.assertNotIn("chat.message",types)
+            await ws.disconnect()
+        ws=await self.connect()
+        types,frames=await self.identify(ws,last_seq=1)
+        self.assertEqual([f["seq"] for f in frames if f.get("type")=="chat.message"],[2,3])
+        self.assertIn("resumed",types)
+        await ws.disconnect()
+        await sender.disconnect()
+
+    async def test_ack_carries_seq(self):
+        ws=await self.connect()
+        await self.identify(ws)
+        seqs=[]
+        for text in ("one","two"):
+            await ws.send_json_to({"action":"message","text":text,"client_id":text})
+            frames=[]
+            while not await ws.receive_nothing(0.2):
+                frames.append(await ws.receive_json_from())
+            ack=next(f for f in frames if f.get("type")=="ack")
+            self.assertEqual(ack["client_id"],text)
+            seqs.append(ack["seq"])
+        self.assertEqual(seqs,[1,2])
+        await ws.disconnect()
+
+    async def test_db_fallback_truncated(self):
+        #nothing in the ring buffer: the gap is read from the DB, at most DB_LIMIT frames
+        await database_sync_to_async(batching.save_messages)([
+            {"session_id":str(self.session.id),"sender":"u","role":"customer","text":f"m{i}"} for i in range(5)
+        ])
+        with override_settings(CHAT_REPLAY={"BUFFER_SIZE":256,"DB_LIMIT":2}):
+            ws=await self.connect()
+            await self.identify(ws)
+            await ws.send_json_to({"action":"resume","last_seq":1})
+            frames=[]
+            while not await ws.receive_nothing(0.2):
+                frames.append(await ws.receive_json_from())
+        self.assertEqual([f["seq"] for f in frames if f.get("type")=="chat.message"],[2,3])
+        resumed=frames[-1]
+        self.assertEqual((resumed["type"],resumed["source"],resumed["truncated"],resumed["last_seq"]),("resumed","db",True,3))
+        await ws.disconnect()
+
+    def test_buffer_only_answers_without_gaps(self):
+        buf=replay.ReplayBuffer(3)
+        self.assertIsNone(buf.since(0))
+        for seq in range(1,6):
+            buf.append({"seq":seq})
+        buf.append({"seq":4})
+        self.assertEqual([f["seq"] for f in buf.since(2)],[3,4,5])
+        self.assertEqual(buf.since(5),[])
+        #seq 2 has been evicted, so the buffer can't prove it has everything after 1
+        self.assertIsNone(buf.since(1))
+
+
+class SessionListETagTests(TestCase):
+    #list_sessions validates against the global sessions stamp: a 304 costs one
+    #query, and any write to an active session changes the ETag
+
+    def get(self,etag=None):
+        headers={"HTTP_IF_NONE_MATCH":etag} if etag else {}
+        with CaptureQueriesContext(connection) as ctx:
+            res=self.client.get("/api/sessions/list/",**headers)
+        return res,len(ctx.captured_queries)
+
+    def assertChanges(self,write):
+        res,_=self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            write()
+        again,_=self.get(res["ETag"])
+        self.assertEqual(again.status_code,200)
+        self.assertNotEqual(again["ETag"],res["ETag"])
+
+    def test_not_modified(self):
+        Session.objects.create(title="s")
+        res,_=self.get()
+        self.assertEqual(res.status_code,200)
+        res,queries=self.get(res["ETag"])
+        self.assertEqual((res.status_code,queries),(304,1))
+
+    def test_writes_change_etag(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            sid=self.client.post("/api/sessions/",{"title":"s"},content_type="application/json").json()["id"]
+        self.assertEqual(len(self.get()[0].json()),1)
+        self.assertChanges(lambda:batching.save_messages([{"session_id":sid,"sender":"a","role":"customer","text":"hi"}]))
+        self.assertChanges(lambda:self.client.post(f"/api/sessions/{sid}/close/"))
+        self.assertChanges(lambda:self.client.post("/api/sessions/",{"title":"t"},content_type="application/json"))
+
+
+class MeetingReportTests(TestCase):
+    #the vectorized report must agree with the per-meeting fold (MeetingState)
+
+    def setUp(self):
+        self.session=Session.objects.create(title="s",agent_id="agent1")
+        self.now=datetime.datetime.now(datetime.timezone.utc)
+        self.seq=0
+
+    def add_meeting(self,*events):
+        #events are (seconds ago, event_type, identity), oldest first
+        link=MeetingLink.objects.create(session=self.session,room_name=f"room-{MeetingLink.objects.count()}")
+        batch=[]
+        for ago,event_type,identity in events:
+            self.seq+=1
+            at=self.now-datetime.timedelta(seconds=ago)
+            batch.append({"client_seq":self.seq,"client_ts":at.isoformat(),"event_type":event_type,"identity":identity})
+        if batch:
+            res=self.client.post(f"/api/meetings/{link.id}/events/batch/",{"client_id":"t","events":batch},content_type="application/json")
+            self.assertEqual(res.status_code,201,res.content)
+        return link
+
+    def report(self):
+        data=reports.report(self.now-datetime.timedelta(days=1),self.now+datetime.timedelta(days=1))
+        self.assertEqual(len(data["rows"]),1)
+        return data["rows"][0]
+
+    def test_matches_meeting_state(self):
+        self.add_meeting((200,"joined","a"),(190,"joined","b"),(150,"left","b"),(100,"left","a"))
+        #joins without a leave: the call runs to the last event
+        self.add_meeting((180,"joined","a"),(170,"screen_share_started","a"),(120,"muted","a"))
+        #no identified join at all: the first event starts the call
+        self.add_meeting((160,"meeting_started",None),(140,"left","c"))
+        self.add_meeting()
+        meetings,_=session_report(self.session.id)
+        row=self.report()
+        self.assertEqual(row["meetings"],4)
+        self.assertAlmostEqual(row["talk_seconds"],sum(m["duration_seconds"] or 0 for m in meetings),places=3)
+        self.assertAlmostEqual(row["talk_seconds"],100+60+20,places=3)
+        self.assertAlmostEqual(row["screen_share_seconds"],sum(m["total_screen_share_seconds"] for m in meetings),places=3)
+        #a: 100s + 60s (open until the last event), b: 40s
+        self.assertAlmostEqual(row["participant_seconds"],200,places=3)
+        self.assertEqual(row["screen_shares"],1)
+
+    def test_archived_sessions_included(self):
+        self.add_meeting((200,"joined","a"),(100,"left","a"))
+        Session.objects.filter(id=self.session.id).update(is_active=False)
+        archive.archive_session(self.session.id)
+        self.assertAlmostEqual(self.report()["talk_seconds"],100,places=3)
+
+    def test_parse_range(self):
+        utc=datetime.timezone.utc
+        day=datetime.date(2026,10,18)
+        self.assertEqual(
+            reports.parse_range("2026-10-01","2026-10-31"),
+            (datetime.datetime(2026,10,1,tzinfo=utc),datetime.datetime(2026,11,1,tzinfo=utc)),
+        )
+        self.assertEqual(
+            reports.parse_range(None,None,default_days=7,today=day),
+            (datetime.datetime(2026,10,12,tzinfo=utc),datetime.datetime(2026,10,19,tzinfo=utc)),
+        )
+        self.assertEqual(reports.parse_range("2026-10-01T12:00:00",None,today=day)[0],datetime.datetime(2026,10,1,12,tzinfo=utc))
+        for since,until,name in (("soon",None,"from"),(None,"2026-13-01","to")):
+            with self.assertRaisesMessage(ValueError,f"invalid {name}"):
+                reports.parse_range(since,until)
+
+    def test_endpoint(self):
+        self.add_meeting((200,"joined","a"),(100,"left","a"))
+        self.assertEqual(len(self.client.get("/api/reports/",{"agent":"agent1"}).json()["rows"]),1)
+        self.assertEqual(self.client.get("/api/reports/",{"agent":"other"}).json()["rows"],[])
+        self.assertEqual(self.client.get("/api/reports/",{"from":"2020-01-01","to":"2026-10-31"}).status_code,400)
+        self.assertEqual(self.client.get("/api/reports/",{"from":"nope"}).status_code,400)
+
+
+class MessageBatchingTests(TransactionTestCase):
+    #write-behind: concurrent writes share one transaction per batch, each message
+    #still gets its own result and a gap-free per-session seq
+
+    def test_concurrent_writes_batched(self):
+        a=Session.objects.create(title="a")
+        b=Session.objects.create(title="b")
+        writer=batching.MessageWriter(max_size=10,max_delay=0.05)
+
+        async def run():
+            return await asyncio.gather(*(
+                writer.write(str((a,b)[i%2].id),"u","customer",f"m{i}") for i in range(25)
+            ))
+
+        with mock.patch.object(batching,"save_messages",wraps=batching.save_messages) as save:
+            saved=asyncio.run(run())
+        self.assertEqual(save.call_count,3)
+        self.assertEqual([m.text for m in saved],[f"m{i}" for i in range(25)])
+        for session,n in ((a,13),(b,12)):
+            seqs=list(Message.objects.filter(session=session).order_by("seq").values_list("seq",flat=True))
+            self.assertEqual(seqs,list(range(1,n+1)))
+            session.refresh_from_db()
+            self.assertEqual(session.last_seq,n)
+
+    def test_bad_row_does_not_sink_batch(self):
+        s=Session.objects.create(title="s")
+        items=[
+            {"session_id":str(s.id),"sender":"u","role":"customer","text":"ok"},
+            {"session_id":"00000000-0000-0000-0000-000000000000","sender":"u","role":"customer","text":"lost"},
+            {"session_id":str(s.id),"sender":"u","role":"customer","text":"ok too"},
+        ]
+        results=batching.save_messages(items)
+        self.assertIsInstance(results[1],Session.DoesNotExist)
+        self.assertEqual([(r.text,r.seq) for r in (results[0],results[2])],[("ok",1),("ok too",2)])
+
+
+class OutboxTests(TestCase):
+    #frames wait in a bounded queue for the writer task: a full queue drops, a frame
+    #with the same coalesce key replaces the one still waiting
+
+    def test_overflow_and_coalescing(self):
+        sent=[]
+        gate=asyncio.Event()
+
+        async def send(frame):
+            await gate.wait()
+            sent.append(frame)
+
+        async def run():
+            box=Outbox(send,max_size=3,max_lag=60)
+            box.start()
+            self.assertTrue(box.put("a"))
+            await asyncio.sleep(0)
+            #"a" is being sent, the writer is blocked on it
+            self.assertTrue(box.put("p1",key="presence"))
+            self.assertTrue(box.put("b"))
+            self.assertTrue(box.put("p2",key="presence"))
+            self.assertTrue(box.put("c"))
+            self.assertEqual(len(box),3)
+            self.assertFalse(box.put("d"))
+            self.assertFalse(box.is_slow())
+            gate.set()
+            await box.flush()
+            await box.stop()
+
+        asyncio.run(run())
+        #p2 took p1's place in the queue, d was dropped
+        self.assertEqual(sent,["a","p2","b","c"])
+
+    def test_slow_consumer(self):
+        async def send(frame):
+            await asyncio.Event().wait()
+
+        async def run():
+            box=Outbox(send,max_size=10,max_lag=0.05)
+            box.start()
+            box.put("a")
+            box.put("b")
+            await asyncio.sleep(0.1)
+            slow=box.is_slow()
+            await box.stop()
+            return slow,len(box)
+
+        self.assertEqual(asyncio.run(run()),(True,0))
+
+
+class WireProtocolTests(TransactionTestCase):
+    #msgpack is negotiated per connection; one group event reaches json and msgpack
+    #clients in their own encoding
+
+    def test_negotiate(self):
+        self.assertEqual(wire.negotiate({"subprotocols":["x","chat.msgpack.v1"]}),("msgpack","chat.msgpack.v1"))
+        self.assertEqual(wire.negotiate({"query_string":b"proto=msgpack"}),("msgpack",None))
+        self.assertEqual(wire.negotiate({"subprotocols":["chat.json.v1"],"query_string":b"proto=msgpack"}),("json","chat.json.v1"))
+        self.assertEqual(wire.negotiate({}),("json",None))
+
+    def test_decode(self):
+        self.assertEqual(wire.decode(bytes_data=msgpack.packb({"a":"message","x":"hi","k":"c1"})),
+                         {"action":"message","text":"hi","client_id":"c1"})
+        for bad in ({"bytes_data":b"\xc1"},{"bytes_data":msgpack.packb([1])},{"text_data":"[1]"}):
+            with self.assertRaises(ValueError):
+                wire.decode(**bad)
+
+    async def test_mixed_clients(self):
+        session=await database_sync_to_async(Session.objects.create)(title="s")
+        app=URLRouter(websocket_urlpatterns)
+        binary=WebsocketCommunicator(app,f"/ws/sessions/{session.id}/",subprotocols=["chat.msgpack.v1"])
+        text=WebsocketCommunicator(app,f"/ws/sessions/{session.id}/")
+        ok,sub=await binary.connect()
+        self.assertEqual((ok,sub),(True,"chat.msgpack.v1"))
+        self.assertTrue((await text.connect())[0])
+        self.assertEqual(msgpack.unpackb((await binary.receive_output())["bytes"])["type"],"connected")
+        await text.receive_json_from()
+
+        await binary.send_to(bytes_data=msgpack.packb({"a":"message","x":"hi","k":"c1"}))
+        frames=[]
+        while not await binary.receive_nothing(0.2):
+            frames.append(msgpack.unpackb((await binary.receive_output())["bytes"]))
+        ack=next(f for f in frames if f.get("type")=="ack")
+        self.assertEqual((ack["client_id"],ack["seq"]),("c1",1))
+        message=next(f for f in frames if f.get("t")=="m")
+        self.assertEqual((message["x"],message["q"]),("hi",1))
+        received=await text.receive_json_from()
+        self.assertEqual((received["type"],received["text"],received["seq"]),("chat.message","hi",1))
+        await binary.disconnect()
+        await text.disconnect()
+
+
+class MessageStreamTests(TransactionTestCase):
+    #SSE and long-poll read the session group like a websocket, resuming after a seq
+
+    def setUp(self):
+        self.session=Session.objects.create(title="s")
+        self.url=f"/api/sessions/{self.session.id}/messages/stream/"
+        batching.save_messages([
+            {"session_id":str(self.session.id),"sender":"u","role":"customer","text":f"m{i}"} for i in range(1,4)
+        ])
+
+    async def test_long_poll_resumes(self):
+        res=await AsyncClient().get(self.url,{"mode":"poll","after_seq":1,"timeout":0})
+        data=res.json()
+        self.assertEqual([e["text"] for e in data["events"]],["m2","m3"])
+        self.assertEqual((data["last_seq"],data["truncated"]),(3,False))
+
+    async def test_long_poll_waits_for_next_message(self):
+        poll=asyncio.ensure_future(AsyncClient().get(self.url,{"mode":"poll","after_seq":3,"timeout":5}))
+        await asyncio.sleep(0.2)
+        self.assertFalse(poll.done())
+        await pipeline.submit(self.session.id,"u","customer","m4")
+        data=(await asyncio.wait_for(poll,5)).json()
+        self.assertEqual(([e["text"] for e in data["events"]],data["last_seq"]),(["m4"],4))
+
+    async def test_sse_replays_after_last_event_id(self):
+        res=await AsyncClient().get(self.url,headers={"Last-Event-ID":"2"})
+        self.assertEqual(res["Content-Type"],"text/event-stream")
+        chunks=aiter(res.streaming_content)
+        self.assertEqual(await anext(chunks),b"retry: 3000\n\n")
+        frame=(await anext(chunks)).decode()
+        self.assertTrue(frame.startswith("id: 3\nevent: message\n"),frame)
+        self.assertEqual(json.loads(frame.split("data: ",1)[1])["text"],"m3")
+        await chunks.aclose()
+
+    async def test_unknown_session(self):
+        res=await AsyncClient().get("/api/sessions/00000000-0000-0000-0000-000000000000/messages/stream/")
+        self.assertEqual(res.status_code,404)
+
+
+class MessageSearchTests(TestCase):
+    #the FTS index follows every insert and delete; results are ranked, filtered and paged
+
+    def setUp(self):
+        self.a=Session.objects.create(title="a")
+        self.b=Session.objects.create(title="b")
+        batching.save_messages([
+            {"session_id":str(self.a.id),"sender":"ann","role":"customer","text":"I want a refund"},
+            {"session_id":str(self.a.id),"sender":"bob","role":"agent","text":"refund approved, refund sent"},
+            {"session_id":str(self.b.id),"sender":"cat","role":"customer","text":"refunds take a week?"},
+            {"session_id":str(self.b.id),"sender":"cat","role":"customer","text":"thanks"},
+        ])
+
+    def search(self,**params):
+        res=self.client.get("/api/messages/search/",params)
+        self.assertEqual(res.status_code,200,res.content)
+        return res.json()
+
+    def texts(self,**params):
+        return [r["text"] for r in self.search(**params)["results"]]
+
+    def test_ranked(self):
+        data=self.search(q="refund")
+        self.assertEqual([r["text"] for r in data["results"]],["refund approved, refund sent","I want a refund"])
+        self.assertGreater(data["results"][0]["score"],data["results"][1]["score"])
+        self.assertEqual(len(self.texts(q="refund*")),3)
+        self.assertEqual(self.texts(q="cat thanks"),["thanks"])
+
+    def test_filters_and_pages(self):
+        self.assertEqual(self.texts(q="refund*",session=str(self.b.id)),["refunds take a week?"])
+        self.assertEqual(self.texts(q="refund*",role="agent"),["refund approved, refund sent"])
+        future=(datetime.datetime.now(datetime.timezone.utc)+datetime.timedelta(hours=1)).isoformat()
+        self.assertEqual(self.texts(q="refund*",**{"from":future}),[])
+        self.assertEqual(len(self.texts(q="refund*",to=future)),3)
+        first=self.search(q="refund*",limit=2)
+        second=self.search(q="refund*",limit=2,page=2)
+        self.assertEqual((len(first["results"]),first["has_more"]),(2,True))
+        self.assertEqual((len(second["results"]),second["has_more"]),(1,False))
+
+    def test_archived_and_deleted_drop_out(self):
+        Session.objects.filter(id=self.a.id).update(is_active=False)
+        archive.archive_session(self.a.id)
+        self.assertEqual(self.texts(q="refund*"),["refunds take a week?"])
+        Message.objects.filter(session=self.b).delete()
+        self.assertEqual(self.texts(q="refund*"),[])
+
+    def test_bad_params(self):
+        for params in ({},{"q":" "},{"q":"x","session":"nope"},{"q":"x","role":"admin"},{"q":"x","from":"soon"}):
+            self.assertEqual(self.client.get("/api/messages/search/",params).status_code,400,params)
+
+
+class MeetingEventBatchTests(TestCase):
+    #retried batches are deduplicated on (client_id, client_seq); client clocks are clamped
+
+    def setUp(self):
+        self.session=Session.objects.create(title="s")
+        self.link=MeetingLink.objects.create(session=self.session,room_name="room")
+        self.url=f"/api/meetings/{self.link.id}/events/batch/"
+
+    def post(self,*events,client_id="tab1",status=201):
+        #events are (client_seq, client_ts or None)
+        batch=[{"client_seq":seq,"client_ts":ts and ts.isoformat(),"event_type":"joined","identity":"a"} for seq,ts in events]
+        res=self.client.post(self.url,{"client_id":client_id,"events":batch},content_type="application/json")
+        self.assertEqual(res.status_code,status,res.content)
+        return res.json()
+
+    def created(self,seq):
+        return MeetingEvent.objects.get(meeting=self.link,client_seq=seq).created_at
+
+    def test_retry_deduplicated(self):
+        data=self.post((1,None),(2,None),(2,None))
+        self.assertEqual([a["client_seq"] for a in data["accepted"]],[1,2])
+        data=self.post((2,None),(3,None))
+        self.assertEqual(([a["client_seq"] for a in data["accepted"]],data["duplicates"]),([3],[2]))
+        data=self.post((1,None),(2,None),(3,None),status=200)
+        self.assertEqual((data["accepted"],data["duplicates"]),([],[1,2,3]))
+        self.post((1,None),client_id="tab2")
+        self.assertEqual(MeetingEvent.objects.filter(meeting=self.link).count(),4)
+        self.assertEqual(MeetingState.objects.get(meeting=self.link).event_count,4)
+
+    def test_future_clamped_to_now(self):
+        now=datetime.datetime.now(datetime.timezone.utc)
+        self.post((1,now+datetime.timedelta(hours=1)))
+        self.assertGreaterEqual(self.created(1),now)
+        self.assertLessEqual(self.created(1),datetime.datetime.now(datetime.timezone.utc))
+
+    def test_past_clamped_to_skew(self):
+        now=datetime.datetime.now(datetime.timezone.utc)
+        with override_settings(CHAT_MEETING_EVENTS={"MAX_CLOCK_SKEW_SECONDS":60}):
+            self.post((1,now-datetime.timedelta(hours=1)),(2,now-datetime.timedelta(seconds=30)))
+        self.assertGreaterEqual(self.created(1),now-datetime.timedelta(seconds=60))
+        self.assertLess(self.created(1),now-datetime.timedelta(seconds=50))
+        self.assertEqual(self.created(2),now-datetime.timedelta(seconds=30))
+
+    def test_never_before_last_event(self):
+        now=datetime.datetime.now(datetime.timezone.utc)
+        self.post((1,now-datetime.timedelta(seconds=10)),(2,now-datetime.timedelta(seconds=100)))
+        self.assertEqual(self.created(2),self.created(1))
+        self.post((3,now-datetime.timedelta(seconds=50)))
+        self.assertEqual(self.created(3),self.created(1))
+
+    def test_invalid(self):
+        for body in (
+            {"events":[{"client_seq":1,"event_type":"joined"}]},
+            {"client_id":"t","events":[]},
+            {"client_id":"t","events":[{"client_seq":1}]},
+            {"client_id":"t","events":[{"client_seq":-1,"event_type":"joined"}]},
+            {"client_id":"t","events":[{"client_seq":True,"event_type":"joined"}]},
+            {"client_id":"t","events":[{"client_seq":1,"event_type":"joined","client_ts":"yesterday"}]},
+        ):
+            res=self.client.post(self.url,body,content_type="application/json")
+            self.assertEqual(res.status_code,400,body)
+        with override_settings(CHAT_MEETING_EVENTS={"MAX_BATCH":1}):
+            self.post((1,None),(2,None),status=400)
+        self.assertFalse(MeetingEvent.objects.exists())
+
+
+class ConcurrencyTimelineTests(TestCase):
+    #peak / time-weighted average per bucket; settled buckets are cached and not recomputed
+
+    def setUp(self):
+        utc=datetime.timezone.utc
+        self.day=datetime.datetime(2026,10,7,tzinfo=utc)
+        self.now=datetime.datetime(2026,10,10,12,tzinfo=utc)
+        session=Session.objects.create(title="s")
+        link=MeetingLink.objects.create(session=session,room_name="room")
+        #meetings are found by when their link was created
+        MeetingLink.objects.filter(id=link.id).update(created_at=self.day+datetime.timedelta(hours=9))
+        MeetingEvent.objects.bulk_create([
+            MeetingEvent(meeting=link,session=session,event_type=event_type,identity=identity,
+                         created_at=self.day+datetime.timedelta(hours=hours))
+            for hours,event_type,identity in (
+                (10,"meeting_started",None),(10,"joined","a"),(10.5,"joined","b"),
+                (11,"left","b"),(11.5,"left","a"),(11.5,"meeting_ended",None),
+            )
+        ])
+
+    def hours(self,now=None):
+        rows=timeline.timeline(self.day+datetime.timedelta(hours=10),self.day+datetime.timedelta(hours=13),"hour",now or self.now)
+        return [tuple(r[f] for f in timeline.FIELDS) for r in rows]
+
+    def test_sweep(self):
+        starts=np.array([-5,0,5,10],dtype=np.int64)
+        ends=np.array([3,10,25,20],dtype=np.int64)
+        peak,avg=timeline.sweep(starts,ends,0,10,3)
+        self.assertEqual(peak.tolist(),[2,2,1])
+        self.assertEqual(avg.tolist(),[1.8,2.0,0.5])
+
+    def test_buckets(self):
+        self.assertEqual(self.hours(),[(1,1.0,2,1.5),(1,0.5,1,0.5),(0,0.0,0,0.0)])
+        rows=list(timeline.timeline(self.day+datetime.timedelta(minutes=10*60+20),self.day+datetime.timedelta(hours=10,minutes=40),"minute",self.now))
+        self.assertEqual(rows[0]["start"],(self.day+datetime.timedelta(hours=10,minutes=20)).isoformat())
+        self.assertEqual([r["participants_peak"] for r in rows],[1]*10+[2]*10)
+
+    def test_settled_buckets_cached(self):
+        expected=self.hours()
+        self.assertEqual(ConcurrencyBucket.objects.filter(resolution="hour").count(),3)
+        MeetingEvent.objects.all().delete()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.hours(),expected)
+
+    def test_recent_buckets_not_cached(self):
+        #with meetings lasting up to 24h, only buckets ending a day before now are settled
+        self.hours(now=self.day+datetime.timedelta(hours=36))
+        self.assertEqual(ConcurrencyBucket.objects.count(),2)
+        MeetingEvent.objects.filter(event_type="meeting_ended").delete()
+        MeetingEvent.objects.filter(event_type="left").update(created_at=self.day+datetime.timedelta(hours=12,minutes=30))
+        self.assertEqual(self.hours(now=self.day+datetime.timedelta(hours=36))[2],(1,0.5,2,1.0))
+
+    def test_bad_arguments(self):
+        with self.assertRaisesMessage(ValueError,"resolution"):
+            timeline.timeline(self.day,self.now,"second")
+        with self.assertRaisesMessage(ValueError,"empty"):
+            timeline.timeline(self.now,self.day)
+        with override_settings(CHAT_TIMELINE={"MAX_BUCKETS":10}):
+            with self.assertRaisesMessage(ValueError,"at most 10"):
+                timeline.timeline(self.day,self.now,"hour")
+
+    async def test_endpoint(self):
+        res=await AsyncClient().get("/api/reports/concurrency/",{"from":"2026-10-07","to":"2026-10-07"})
+        self.assertEqual(res["Content-Type"],"application/x-ndjson")
+        body=b"".join([chunk async for chunk in res.streaming_content])
+        rows=[json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual(len(rows),24)
+        self.assertEqual(rows[10]["participants_peak"],2)
+        res=await AsyncClient().get("/api/reports/concurrency/",{"resolution":"day"})
+        self.assertEqual(res.status_code,400)
+
+
+class MeetingTokenTests(TestCase):
+    #a token is reused per (link, identity) until it, or the link, is about to expire
+
+    def setUp(self):
+        tokens.token_cache.clear()
+        cache.link_cache.clear()
+        self.session=Session.objects.create(title="s")
+        self.link=MeetingLink.objects.create(session=self.session,room_name="room")
+        self.mint=mock.patch.object(tokens,"mint",wraps=tokens.mint).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def snapshot(self,**fields):
+        for name,value in fields.items():
+            setattr(self.link,name,value)
+        self.link.save()
+        return cache._fetch_link(self.link.id)
+
+    def test_reused_per_identity(self):
+        link=self.snapshot()
+        first=tokens.issue(link,"a")
+        self.assertIs(tokens.issue(link,"a"),first)
+        self.assertNotEqual(tokens.issue(link,"b")["token"],first["token"])
+        self.assertEqual(self.mint.call_count,2)
+
+    def test_anonymous_not_cached(self):
+        link=self.snapshot()
+        first,second=tokens.issue(link),tokens.issue(link)
+        self.assertNotEqual(first["identity"],second["identity"])
+        self.assertTrue(first["identity"].startswith("user-"))
+        self.assertEqual((self.mint.call_count,len(tokens.token_cache)),(2,0))
+
+    def test_link_expiry_caps_reuse(self):
+        link=self.snapshot(expires_at=timezone.now()+datetime.timedelta(seconds=60))
+        tokens.issue(link,"a")
+        later=cache.time.monotonic()+61
+        with mock.patch.object(cache.time,"monotonic",return_value=later):
+            tokens.issue(link,"a")
+        self.assertEqual(self.mint.call_count,2)
+        tokens.token_cache.clear()
+        tokens.issue(self.snapshot(expires_at=timezone.now()-datetime.timedelta(seconds=1)),"a")
+        self.assertEqual(len(tokens.token_cache),0)
+
+    async def test_endpoint(self):
+        url=f"/api/meetings/{self.link.id}/issue/"
+        first=(await AsyncClient().post(url,{"identity":"a"},content_type="application/json")).json()
+        again=(await AsyncClient().post(url,headers={"X-User":"a"})).json()
+        self.assertEqual((first["identity"],first["room_name"],again["token"]),("a","room",first["token"]))
+        res=await AsyncClient().post("/api/meetings/00000000-0000-0000-0000-000000000000/issue/")
+        self.assertEqual(res.status_code,404)
+        await database_sync_to_async(self.snapshot)(expires_at=timezone.now()-datetime.timedelta(seconds=1))
+        res=await AsyncClient().post(url,{"identity":"a"},content_type="application/json")
+        self.assertEqual((res.status_code,res.json()),(410,{"error":"expired"}))
+
+
+class MeetingLinkCacheTests(TestCase):
+    #validate answers from the link cache, misses and expired links included; saving or
+    #deleting a link drops its entry
+
+    def setUp(self):
+        cache.link_cache.clear()
+        self.link=MeetingLink.objects.create(session=Session.objects.create(title="s"),room_name="room")
+        #delete() clears the instance pk
+        self.link_id=self.link.id
+        self.fetch=mock.patch.object(cache,"_fetch_link",wraps=cache._fetch_link).start()
+        self.addCleanup(mock.patch.stopall)
+
+    async def validate(self,link_id=None):
+        res=await AsyncClient().get(f"/api/meetings/{link_id or self.link_id}/validate/")
+        return res.status_code,res.json()
+
+    async def test_hits_skip_database(self):
+        self.assertEqual(await self.validate(),(200,{"valid":True,"room_name":"room","session_id":str(self.link.session_id)}))
+        await self.validate()
+        self.assertEqual(self.fetch.call_count,1)
+
+    async def test_not_found_cached_briefly(self):
+        missing="00000000-0000-0000-0000-000000000000"
+        for _ in range(2):
+            self.assertEqual(await self.validate(missing),(404,{"valid":False,"reason":"not_found"}))
+        self.assertEqual(self.fetch.call_count,1)
+        later=cache.time.monotonic()+31
+        with mock.patch.object(cache.time,"monotonic",return_value=later):
+            await self.validate(missing)
+        self.assertEqual(self.fetch.call_count,2)
+
+    def test_ttls(self):
+        now=timezone.now()
+        self.assertEqual(cache._link_ttl(None),30)
+        self.assertEqual(cache._link_ttl({"expires_at":None}),300)
+        self.assertEqual(cache._link_ttl({"expires_at":now-datetime.timedelta(seconds=1)}),3600)
+        self.assertAlmostEqual(cache._link_ttl({"expires_at":now+datetime.timedelta(seconds=10)}),10,delta=1)
+        self.assertEqual(cache.link_state({"expires_at":now-datetime.timedelta(seconds=1)}),"expired")
+
+    async def test_save_and_delete_invalidate(self):
+        await self.validate()
+        self.link.expires_at=timezone.now()-datetime.timedelta(seconds=1)
+        await database_sync_to_async(self.link.save)()
+        self.assertEqual(await self.validate(),(410,{"valid":False,"reason":"expired"}))
+        await database_sync_to_async(self.link.delete)()
+        self.assertEqual((await self.validate(self.link_id))[0],404)
+        self.assertEqual(self.fetch.call_count,3)
+
+    async def test_shared_cache(self):
+        from django.core.cache import caches
+        self.addCleanup(caches["default"].clear)
+        with override_settings(CHAT_LINK_CACHE={**cache.settings.CHAT_LINK_CACHE,"SHARED_CACHE":"default"}):
+            await self.validate()
+            cache.link_cache.clear()
+            self.assertEqual((await self.validate())[0],200)
+            self.assertEqual(self.fetch.call_count,1)
+            await database_sync_to_async(self.link.delete)()
+            self.assertEqual((await self.validate(self.link_id))[0],404)
+
+
+class PresenceTests(TestCase):
+    #a user stays online until their last channel leaves; SQLitePresence is shared by
+    #every worker using the same file and drops rows of dead workers
+
+    def setUp(self):
+        tmp=tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path=os.path.join(tmp.name,"presence.sqlite3")
+
+    def check_backend(self,p):
+        p.join("s1","ann","c1")
+        p.join("s1","ann","c2")
+        p.join("s1","bob","c3")
+        p.join("s2","bob","c4")
+        self.assertEqual(sorted(p.online("s1")),["ann","bob"])
+        p.leave("s1","ann","c1")
+        self.assertEqual(sorted(p.online("s1")),["ann","bob"])
+        p.leave("s1","ann","c2")
+        p.leave("s1","ann","c2")
+        self.assertEqual(p.online("s1"),["bob"])
+        self.assertEqual(p.online_many(["s1","s2","s3"]),{"s1":["bob"],"s2":["bob"],"s3":[]})
+        p.clear()
+        self.assertEqual(p.online("s1"),[])
+
+    def test_memory(self):
+        self.check_backend(presence.MemoryPresence())
+
+    def test_sqlite(self):
+        self.check_backend(presence.SQLitePresence(path=self.path))
+
+    def test_sqlite_shared_and_batched(self):
+        a=presence.SQLitePresence(path=self.path)
+        b=presence.SQLitePresence(path=self.path)
+        ids=[f"s{i}" for i in range(a.BATCH+10)]
+        for i,s in enumerate(ids):
+            a.join(s,f"u{i}",f"c{i}")
+        online=b.online_many(ids)
+        self.assertEqual((len(online),online[ids[-1]]),(len(ids),[f"u{len(ids)-1}"]))
+
+    def test_dead_workers_pruned(self):
+        p=presence.SQLitePresence(path=self.path)
+        p.join("s1","ann","c1")
+        #above the largest pid linux hands out, so never a live process
+        p._conn().execute("UPDATE presence SET pid=? WHERE channel='c1'",(2**22+1,))
+        p.join("s1","bob","c2")
+        self.assertEqual(presence.SQLitePresence(path=self.path).online("s1"),["bob"])
+        self.assertEqual(p.prune(),0)
+
+    def test_views(self):
+        self.assertIsInstance(presence.get_presence(),presence.MemoryPresence)
+        presence.get_presence().clear()
+        self.addCleanup(presence.get_presence().clear)
+        presence.get_presence().join("s1","ann","c1")
+        self.assertEqual(self.client.get("/api/sessions/00000000-0000-0000-0000-000000000001/presence/").json()["online"],[])
+        self.assertEqual(self.client.get("/api/sessions/presence/?ids=s1,s2").json(),{"online":{"s1":["ann"],"s2":[]}})
+
+
+class SessionConnectTests(TransactionTestCase):
+    #unknown and closed sessions are refused with their close codes; closing a session
+    #tells connected clients, drops them and blocks further writes
+
+    def setUp(self):
+        cache.session_cache.clear()
+        self.session=Session.objects.create(title="s")
+
+    async def open(self,session_id=None):
+        ws=WebsocketCommunicator(URLRouter(websocket_urlpatterns),f"/ws/sessions/{session_id or self.session.id}/")
+        ok,_=await ws.connect()
+        self.assertTrue(ok)
+        return ws
+
+    async def assertRefused(self,session_id,code):
+        ws=await self.open(session_id)
+        self.assertEqual(await ws.receive_output(1),{"type":"websocket.close","code":code})
+        await ws.disconnect()
+
+    async def test_unknown_session(self):
+        await self.assertRefused("00000000-0000-0000-0000-000000000000",4404)
+
+    async def test_closed_session(self):
+        await database_sync_to_async(Session.objects.filter(id=self.session.id).update)(is_active=False)
+        await self.assertRefused(None,4410)
+
+    async def test_close_endpoint(self):
+        ws=await self.open()
+        self.assertEqual((await ws.receive_json_from())["type"],"connected")
+        res=await database_sync_to_async(self.client.post)(f"/api/sessions/{self.session.id}/close/")
+        self.assertEqual(res.status_code,200)
+        self.assertEqual(await ws.receive_json_from(),{"type":"session.closed","session_id":str(self.session.id)})
+        self.assertEqual(await ws.receive_output(1),{"type":"websocket.close","code":4410})
+        await ws.disconnect()
+        await self.assertRefused(None,4410)
+        res=await database_sync_to_async(self.client.post)(
+            f"/api/sessions/{self.session.id}/messages/post/",{"text":"late"},content_type="application/json",
+        )
+        self.assertEqual(res.status_code,409)
+        self.assertFalse(await database_sync_to_async(Message.objects.exists)())
+
+
+class MetricsTests(TransactionTestCase):
+    #per-thread shards are summed at scrape time; API requests, websocket connections and
+    #outbox frames move their series
+
+    def metric(self,cls,*args,**kwargs):
+        m=cls(*args,**kwargs)
+        self.addCleanup(metrics.REGISTRY.remove,m)
+        return m
+
+    def test_shards_summed(self):
+        hits=self.metric(metrics.Counter,"test_hits_total","hits",["kind"])
+        level=self.metric(metrics.Gauge,"test_level","level")
+        took=self.metric(metrics.Histogram,"test_seconds","took",buckets=(0.1,1))
+
+        def work():
+            for _ in range(100):
+                hits.labels("a").inc()
+            level.inc(2)
+            took.observe(0.5)
+
+        threads=[threading.Thread(target=work) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        level.dec()
+        text=metrics.render()
+        self.assertIn('test_hits_total{kind="a"} 400\n',text)
+        self.assertIn("# TYPE test_level gauge\ntest_level 7\n",text)
+        self.assertIn('test_seconds_bucket{le="0.1"} 0\ntest_seconds_bucket{le="1"} 4\ntest_seconds_bucket{le="+Inf"} 4\n',text)
+        self.assertIn("test_seconds_sum 2.0\ntest_seconds_count 4\n",text)
+        level.set_function(lambda:42)
+        self.assertEqual(level.value(),42)
+
+    def test_requests_timed(self):
+        series=metrics.HTTP_REQUEST_SECONDS.labels("api/sessions/list/","GET",200)
+        before=sum(series.snapshot()[0])
+        self.client.get("/api/sessions/list/")
+        res=self.client.get("/metrics")
+        self.assertTrue(res["Content-Type"].startswith("text/plain; version=0.0.4"))
+        self.assertEqual(sum(series.snapshot()[0]),before+1)
+        self.assertIn('chat_http_request_seconds_count{route="api/sessions/list/",method="GET",status="200"}',res.content.decode())
+        self.assertNotIn('route="metrics"',res.content.decode())
+
+    async def test_websocket_series(self):
+        session=await database_sync_to_async(Session.objects.create)(title="s")
+        connections=metrics.WS_CONNECTIONS.value()
+        rejected=metrics.WS_REJECTED.labels("not_found").value()
+        identify=sum(metrics.WS_ACTION_SECONDS.labels("identify").snapshot()[0])
+        sent=metrics.OUTBOX_SENT.value()
+        ws=WebsocketCommunicator(URLRouter(websocket_urlpatterns),f"/ws/sessions/{session.id}/")
+        await ws.connect()
+        await ws.receive_json_from()
+        self.assertEqual(metrics.WS_CONNECTIONS.value(),connections+1)
+        await ws.send_json_to({"action":"identify","user":"u"})
+        while not await ws.receive_nothing(0.2):
+            await ws.receive_output()
+        self.assertEqual(sum(metrics.WS_ACTION_SECONDS.labels("identify").snapshot()[0]),identify+1)
+        self.assertGreater(metrics.OUTBOX_SENT.value(),sent)
+        await ws.disconnect()
+        self.assertEqual(metrics.WS_CONNECTIONS.value(),connections)
+        ws=WebsocketCommunicator(URLRouter(websocket_urlpatterns),"/ws/sessions/00000000-0000-0000-0000-000000000000/")
+        await ws.connect()
+        await ws.receive_output(1)
+        await ws.disconnect()
+        self.assertEqual(metrics.WS_REJECTED.labels("not_found").value(),rejected+1)
+
+
+class BulkMessageTests(TransactionTestCase):
+    #a bulk post is one insert with consecutive seqs and one chat.batch group event that
+    #connected clients see as ordinary chat.message frames
+
+    def setUp(self):
+        self.session=Session.objects.create(title="s")
+        self.url=f"/api/sessions/{self.session.id}/messages/bulk/"
+
+    def post(self,body,**headers):
+        return self.client.post(self.url,body,content_type="application/json",headers=headers)
+
+    def test_invalid(self):
+        for body,error in (
+            ({"messages":[]},"empty_batch"),
+            ({"messages":[{"text":"ok"},"nope"]},"invalid_item"),
+            ({"messages":[{"text":"ok"},{"text":"  "}]},"empty_text"),
+            ({"messages":[{"text":"x"}]*(pipeline.MAX_BULK+1)},"batch_too_large"),
+            ({"messages":"hi"},"messages must be a list"),
+        ):
+            res=self.post(body)
+            self.assertEqual((res.status_code,res.json()),(400,{"error":error}))
+        self.assertFalse(Message.objects.exists())
+        Session.objects.filter(id=self.session.id).update(is_active=False)
+        self.assertEqual(self.post({"messages":[{"text":"ok"}]}).status_code,409)
+
+    async def test_saved_and_broadcast_once(self):
+        ws=WebsocketCommunicator(URLRouter(websocket_urlpatterns),f"/ws/sessions/{self.session.id}/")
+        await ws.connect()
+        await ws.receive_json_from()
+        await pipeline.submit(self.session.id,"u","customer","first")
+        self.assertEqual((await ws.receive_json_from())["seq"],1)
+        layer=get_channel_layer()
+        with mock.patch.object(layer,"group_send",wraps=layer.group_send) as group_send:
+            res=await database_sync_to_async(self.post)(
+                {"messages":[{"text":"a"},{"text":"b","role":"system","sender":"bot"},{"text":"c"}]},X_User="agent1",X_Role="agent",
+            )
+        self.assertEqual(res.status_code,201,res.content)
+        saved=res.json()["messages"]
+        self.assertEqual([(m["text"],m["sender"],m["role"]) for m in saved],[("a","agent1","agent"),("b","bot","system"),("c","agent1","agent")])
+        self.assertEqual([m["seq"] for m in saved],[2,3,4])
+        self.assertEqual(group_send.call_count,1)
+        self.assertEqual(group_send.call_args.args[1]["type"],"chat.batch")
+        frames=[await ws.receive_json_from() for _ in saved]
+        self.assertEqual([(f["type"],f["seq"],f["text"]) for f in frames],[("chat.message",2,"a"),("chat.message",3,"b"),("chat.message",4,"c")])
+        await ws.disconnect()
+
+
+class TranscriptExportTests(TransactionTestCase):
+    #messages and meeting events merged in time order, streamed a block at a time, and
+    #written one file per session by the export_transcripts command
+
+    ROWS=1200
+
+    def setUp(self):
+        self.session=Session.objects.create(title="s")
+        batching.save_messages([
+            {"session_id":str(self.session.id),"sender":"u","role":"customer","text":f"m{i}"} for i in range(self.ROWS)
+        ])
+        base=datetime.datetime(2026,10,1,tzinfo=datetime.timezone.utc)
+        msgs=list(Message.objects.filter(session=self.session).order_by("seq"))
+        for i,m in enumerate(msgs):
+            m.sent_at=base+datetime.timedelta(seconds=i)
+        Message.objects.bulk_update(msgs,["sent_at"])
+        link=MeetingLink.objects.create(session=self.session,room_name="room")
+        #after m10 and after m600
+        MeetingEvent.objects.bulk_create([
+            MeetingEvent(meeting=link,session=self.session,event_type=t,identity="a",metadata={"n":1},
+                         created_at=base+datetime.timedelta(seconds=s+0.5))
+            for s,t in ((10,"joined"),(600,"left"))
+        ])
+
+    def check_rows(self,rows):
+        self.assertEqual(len(rows),self.ROWS+2)
+        self.assertEqual([r["kind"] for r in rows[10:13]],["message","meeting_event","message"])
+        self.assertEqual((rows[11]["event_type"],rows[12]["text"]),("joined","m11"))
+        self.assertEqual(rows[602]["event_type"],"left")
+        self.assertEqual(rows[-1]["text"],f"m{self.ROWS-1}")
+
+    def test_rows_across_db_chunks(self):
+        self.check_rows(list(export.transcript_rows(self.session.id,chunk_size=100)))
+
+    async def stream(self,fmt):
+        res=await AsyncClient().get(f"/api/sessions/{self.session.id}/export/",{"format":fmt})
+        self.assertEqual(res.status_code,200)
+        self.assertIn(f"transcript-{self.session.id}.",res["Content-Disposition"])
+        chunks=[chunk async for chunk in res.streaming_content]
+        self.assertGreater(len(chunks),2)
+        return res,b"".join(chunks).decode()
+
+    async def test_ndjson(self):
+        res,body=await self.stream("ndjson")
+        self.assertEqual(res["Content-Type"],"application/x-ndjson")
+        self.check_rows([json.loads(line) for line in body.splitlines()])
+
+    async def test_csv(self):
+        res,body=await self.stream("csv")
+        self.assertEqual(res["Content-Type"],"text/csv")
+        rows=list(csv.DictReader(io.StringIO(body)))
+        self.check_rows(rows)
+        self.assertEqual(json.loads(rows[11]["metadata"]),{"n":1})
+
+    async def test_bad_request(self):
+        res=await AsyncClient().get(f"/api/sessions/{self.session.id}/export/",{"format":"xml"})
+        self.assertEqual(res.status_code,400)
+        res=await AsyncClient().get("/api/sessions/00000000-0000-0000-0000-000000000000/export/")
+        self.assertEqual(res.status_code,404)
+
+    def test_command(self):
+        other=Session.objects.create(title="empty",is_active=False)
+        with tempfile.TemporaryDirectory() as tmp:
+            out=io.StringIO()
+            call_command("export_transcripts","--all","--format","csv","--gzip","--workers","2","--output-dir",tmp,stdout=out)
+            self.assertIn("exported 2/2 sessions",out.getvalue())
+            with gzip.open(os.path.join(tmp,f"{self.session.id}.csv.gz"),"rt",encoding="utf-8") as fh:
+                self.check_rows(list(csv.DictReader(fh)))
+            with gzip.open(os.path.join(tmp,f"{other.id}.csv.gz"),"rt",encoding="utf-8") as fh:
+                self.assertEqual(fh.read().strip(),",".join(export.CSV_COLUMNS))
+            call_command("export_transcripts","--closed","--output-dir",tmp,stdout=io.StringIO())
+            self.assertEqual(sorted(os.listdir(tmp)),sorted([f"{self.session.id}.csv.gz",f"{other.id}.csv.gz",f"{other.id}.ndjson"]))
+        with self.assertRaises(CommandError):
+            call_command("export_transcripts",stdout=io.StringIO())
+
+
+class ArchiveSessionsTests(TestCase):
+    #sessions closed longer than the cutoff are archived oldest first; without closed_at
+    #(closed before the field existed) their last change decides
+
+    def setUp(self):
+        archive.archive_cache.clear()
+        self.now=timezone.now()
+
+    def session(self,days_closed=None,days_updated=0,active=False):
+        s=Session.objects.create(title="s",is_active=active)
+        Session.objects.filter(id=s.id).update(
+            closed_at=None if days_closed is None else self.now-datetime.timedelta(days=days_closed),
+            updated_at=self.now-datetime.timedelta(days=days_updated),
+        )
+        return s.id
+
+    def test_candidates(self):
+        old=self.session(days_closed=40)
+        older=self.session(days_closed=50)
+        self.session(days_closed=1,days_updated=40)
+        legacy_old=self.session(days_updated=45)
+        self.session(days_updated=1)
+        self.session(days_closed=None,days_updated=60,active=True)
+        self.assertEqual(archive.candidates(days=30),[older,legacy_old,old])
+        self.assertEqual(archive.candidates(days=30,limit=1),[older])
+
+    def test_command(self):
+        sid=self.session(days_closed=40)
+        batching.save_messages([
+            {"session_id":str(sid),"sender":"u","role":"customer","text":f"m{i}"} for i in range(3)
+        ])
+        recent=self.session(days_closed=1)
+        out=io.StringIO()
+        call_command("archive_sessions","--days","30","--dry-run",stdout=out)
+        self.assertEqual(out.getvalue().split(),[str(sid)])
+        self.assertIsNone(Session.objects.get(id=sid).archived_at)
+        out=io.StringIO()
+        call_command("archive_sessions","--days","30",stdout=out)
+        self.assertIn("archived 1 sessions",out.getvalue())
+        self.assertFalse(Message.objects.filter(session_id=sid).exists())
+        self.assertIsNone(Session.objects.get(id=recent).archived_at)
+        res=self.client.get(f"/api/sessions/{sid}/messages/",{"order":"oldest"})
+        self.assertEqual([(m["seq"],m["text"]) for m in res.json()["results"]],[(1,"m0"),(2,"m1"),(3,"m2")])
+        out=io.StringIO()
+        call_command("archive_sessions","--days","30",stdout=out)
+        self.assertIn("archived 0 sessions",out.getvalue())
+
+
+class SessionStatsTests(TestCase):
+    #the write paths keep SessionStats equal to what rebuild_session_stats computes, and
+    #a late batch never moves the last-activity times backwards
+
+    def setUp(self):
+        self.session=Session.objects.create(title="s")
+        self.now=timezone.now()
+        self.seq=0
+
+    def meeting(self,*events):
+        #events are (seconds ago, event_type, identity)
+        res=self.client.post(f"/api/sessions/{self.session.id}/meetings/create/",{},content_type="application/json")
+        self.assertEqual(res.status_code,201,res.content)
+        batch=[]
+        for ago,event_type,identity in events:
+            self.seq+=1
+            at=self.now-datetime.timedelta(seconds=ago)
+            batch.append({"client_seq":self.seq,"client_ts":at.isoformat(),"event_type":event_type,"identity":identity})
+        if not batch:
+            return
+        res=self.client.post(f"/api/meetings/{res.json()['id']}/events/batch/",{"client_id":"t","events":batch},content_type="application/json")
+        self.assertEqual(res.status_code,201,res.content)
+
+    def snapshot(self):
+        st=SessionStats.objects.get(session=self.session)
+        windows=sorted(MeetingLink.objects.filter(session=self.session).values_list("call_started_at","call_ended_at"),key=str)
+        return st.message_count,st.last_message_at,st.meeting_count,st.last_meeting_at,round(st.call_seconds,6),windows
+
+    def test_incremental_matches_rebuild(self):
+        for n in (2,3):
+            batching.save_messages([
+                {"session_id":str(self.session.id),"sender":"u","role":"customer","text":f"m{i}"} for i in range(n)
+            ])
+        self.meeting((50,"joined","a"),(40,"joined","b"),(20,"left","b"),(10,"left","a"))
+        #a later batch for another meeting that happened earlier
+        self.meeting((120,"joined","c"),(90,"left","c"),(80,"muted",None))
+        self.meeting()
+        incremental=self.snapshot()
+        self.assertEqual(incremental[0],5)
+        self.assertEqual(incremental[2:5],(3,self.now-datetime.timedelta(seconds=10),70.0))
+        SessionStats.objects.update(message_count=0,last_message_at=None,meeting_count=0,last_meeting_at=None,call_seconds=0)
+        MeetingLink.objects.update(call_started_at=None,call_ended_at=None)
+        out=io.StringIO()
+        call_command("rebuild_session_stats",str(self.session.id),stdout=out)
+        self.assertIn("rebuilt stats for 1 sessions",out.getvalue())
+        self.assertEqual(self.snapshot(),incremental)
+
+    def test_late_messages_keep_latest(self):
+        stats.on_messages(self.session.id,1,self.now)
+        stats.on_messages(self.session.id,1,self.now-datetime.timedelta(minutes=5))
+        st=SessionStats.objects.get(session=self.session)
+        self.assertEqual((st.message_count,st.last_message_at),(2,self.now))
+
+
+class RecomputeMeetingStateTests(TestCase):
+    #--check reports drift between MeetingState and the event log without writing;
+    #without it the drifted rows are rebuilt
+
+    def setUp(self):
+        session=Session.objects.create(title="s")
+        self.links=[MeetingLink.objects.create(session=session,room_name=f"room-{i}") for i in range(3)]
+        now=timezone.now()
+        for i,link in enumerate(self.links[:2]):
+            events=[
+                {"client_seq":1,"client_ts":(now-datetime.timedelta(seconds=60)).isoformat(),"event_type":"joined","identity":"a"},
+                {"client_seq":2,"client_ts":(now-datetime.timedelta(seconds=30)).isoformat(),"event_type":"left","identity":"a"},
+            ]
+            res=self.client.post(f"/api/meetings/{link.id}/events/batch/",{"client_id":"t","events":events},content_type="application/json")
+            self.assertEqual(res.status_code,201,res.content)
+
+    def run_check(self,*args):
+        out=io.StringIO()
+        call_command("recompute_meeting_state",*args,stdout=out)
+        return out.getvalue()
+
+    def test_check_and_fix(self):
+        self.assertIn("checked 3 meetings, found 0 with drift",self.run_check("--check"))
+        MeetingState.objects.filter(meeting=self.links[0]).update(event_count=7,participants=["a","x"])
+        MeetingState.objects.filter(meeting=self.links[1]).delete()
+        out=io.StringIO()
+        with self.assertRaisesMessage(CommandError,"2 meeting(s) drifted"):
+            call_command("recompute_meeting_state","--check","-v","2",stdout=out)
+        self.assertEqual(MeetingState.objects.get(meeting=self.links[0]).event_count,7)
+        self.assertIn(f"{self.links[0].id}: drifted\n  event_count: stored=7 replayed=2",out.getvalue())
+        self.assertIn(f"{self.links[1].id}: missing",out.getvalue())
+        self.assertIn("fixed 2 with drift",self.run_check())
+        self.assertEqual(MeetingState.objects.get(meeting=self.links[0]).event_count,2)
+        self.assertEqual(MeetingState.objects.get(meeting=self.links[1]).participants,["a"])
+        self.assertIn("found 0 with drift",self.run_check("--check"))
+
+    def test_archived_log(self):
+        Session.objects.filter(id=self.links[0].session_id).update(is_active=False)
+        archive.archive_session(self.links[0].session_id)
+        MeetingState.objects.filter(meeting=self.links[0]).update(event_count=0)
+        self.assertIn("checked 1 meetings, fixed 1 with drift",self.run_check(str(self.links[0].id)))
+        self.assertEqual(MeetingState.objects.get(meeting=self.links[0]).event_count,2)
@@ -0,0 +1,139 @@
+#concurrency timeline (GET /api/reports/concurrency/): how many meetings and participants
+#were live at once, per minute or hour bucket. a sweep line over interval starts (+1)
+#and ends (-1) gives the level between changes; each bucket reports its peak level and
+#the time-weighted average.
+#  meeting:     meeting_started / first identified join -> meeting_ended / last leave
+#  participant: each identity's joined -> left (reports.EventColumns.interval_rows)
+#meetings are assumed to last at most MAX_MEETING_HOURS, so buckets that ended longer
+#ago than that can no longer change. those are cached in ConcurrencyBucket and repeated
+#queries only compute the buckets that are missing.
+import datetime
+import json
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+from . import reports
+
+RESOLUTIONS={"minute":60_000_000,"hour":3_600_000_000}
+FIELDS=("meetings_peak","meetings_avg","participants_peak","participants_avg")
+_EPOCH=datetime.datetime(1970,1,1,tzinfo=datetime.timezone.utc)
+_US=datetime.timedelta(microseconds=1)
+
+
+def _timeline_settings():
+    conf=getattr(settings,"CHAT_TIMELINE",{})
+    return conf.get("MAX_MEETING_HOURS",24),conf.get("MAX_BUCKETS",50_000),conf.get("SPAN_BUCKETS",1440)
+
+
+def _at(micros):
+    return _EPOCH+datetime.timedelta(microseconds=int(micros))
+
+
+def _micros(dt):
+    return (dt-_EPOCH)//_US
+
+
+def sweep(starts,ends,since,size,n):
+    #([n] peak, [n] average) concurrency of [start, end) intervals (micros) over n
+    #buckets of `size` micros from `since`
+    until=since+size*n
+    keep=(ends>since)&(starts<until)&(ends>starts)
+    starts,ends=starts[keep],ends[keep]
+    base=np.count_nonzero(starts<=since)
+    opened=starts[starts>since]
+    closed=ends[ends<until]
+    t=np.concatenate([opened,closed])
+    d=np.concatenate([np.ones(len(opened),dtype=np.int64),-np.ones(len(closed),dtype=np.int64)])
+    #ends sort before starts at the same instant, so back-to-back intervals don't stack
+    order=np.lexsort((d,t))
+    t=t[order]
+    level=np.concatenate([[base],base+np.cumsum(d[order])])
+    #bucket boundaries as extra points (after any change at the same instant), so no
+    #constant segment crosses a boundary
+    bounds=since+size*np.arange(n,dtype=np.int64)
+    points=np.concatenate([t,bounds])
+    levels=np.concatenate([level[1:],level[np.searchsorted(t,bounds,side="right")]])
+    order=np.lexsort((np.concatenate([np.zeros(len(t)),np.ones(n)]),points))
+    points,levels=points[order],levels[order]
+    widths=np.diff(np.append(points,until))
+    bucket=(points-since)//size
+    avg=np.bincount(bucket,weights=levels*widths,minlength=n)/size
+    peak=np.zeros(n,dtype=np.int64)
+    np.maximum.at(peak,bucket,levels)
+    return peak,avg
+
+
+def compute(first,n,size):
+    #{bucket start micros: row} for n buckets from `first`
+    max_hours,_,_=_timeline_settings()
+    lookback=datetime.timedelta(hours=max_hours)
+    cols=reports.EventColumns.load(_at(first)-lookback,_at(first+n*size))
+    _,m_start,m_end=cols.meeting_spans()
+    _,p_start,p_end=cols.interval_rows(reports.JOINED,reports.LEFT,first_open=True,named_only=True)
+    m_peak,m_avg=sweep(m_start,m_end,first,size,n)
+    p_peak,p_avg=sweep(p_start,p_end,first,size,n)
+    return {
+        first+i*size:{
+            "meetings_peak":int(m_peak[i]),
+            "meetings_avg":round(float(m_avg[i]),4),
+            "participants_peak":int(p_peak[i]),
+            "participants_avg":round(float(p_avg[i]),4),
+        }
+        for i in range(n)
+    }
+
+
+def _span_rows(resolution,first,n,size,settled_before):
+    #rows for one span of buckets: cached ones as stored, the rest computed in one
+    #pass (and cached when settled)
+    from .models import ConcurrencyBucket
+    cached={
+        _micros(b.start):{f:getattr(b,f) for f in FIELDS}
+        for b in ConcurrencyBucket.objects.filter(
+            resolution=resolution,start__gte=_at(first),start__lt=_at(first+n*size),
+        )
+    }
+    missing=[first+i*size for i in range(n) if first+i*size not in cached]
+    if missing:
+        lo,hi=missing[0],missing[-1]+size
+        fresh=compute(lo,(hi-lo)//size,size)
+        ConcurrencyBucket.objects.bulk_create(
+            [
+                ConcurrencyBucket(resolution=resolution,start=_at(start),**fresh[start])
+                for start in missing if start+size<=settled_before
+            ],
+            ignore_conflicts=True,
+        )
+        for start in missing:
+            cached[start]=fresh[start]
+    for i in range(n):
+        start=first+i*size
+        yield {"start":_at(start).isoformat(),**cached[start]}
+
+
+def timeline(since,until,resolution="hour",now=None):
+    #rows (dicts) for every bucket overlapping [since, until), oldest first, produced a
+    #span at a time. arguments are checked up front (ValueError), rows are lazy
+    if resolution not in RESOLUTIONS:
+        raise ValueError("resolution must be minute or hour")
+    if until<=since:
+        raise ValueError("the range is empty")
+    max_hours,max_buckets,span=_timeline_settings()
+    size=RESOLUTIONS[resolution]
+    first=_micros(since)//size*size
+    last=-(-_micros(until)//size)*size
+    total=(last-first)//size
+    if total>max_buckets:
+        raise ValueError(f"at most {max_buckets} {resolution} buckets per request")
+    settled_before=_micros(now or timezone.now())-max_hours*3_600_000_000
+
+    def rows():
+        for lo in range(first,last,span*size):
+            yield from _span_rows(resolution,lo,min(span,(last-lo)//size),size,settled_before)
+
+    return rows()
+
+
+def ndjson(rows):
+    for row in rows:
+        yield json.dumps(row)+"\n"
@@ -0,0 +1,62 @@
+#meeting access tokens for issue_meeting_token. reconnect storms at the start of a
+#meeting ask for the same (link, identity) token over and over; a signed token is reused
+#until REUSE_MARGIN seconds before it expires, or until the link expires, whichever
+#comes first. requests without an identity get a fresh random one and are never cached.
+import uuid
+from django.conf import settings
+from django.utils import timezone
+from twilio.jwt.access_token import AccessToken
+from twilio.jwt.access_token.grants import VideoGrant
+from .cache import TTLCache
+
+
+def _token_settings():
+    conf=getattr(settings,"CHAT_MEETING_TOKENS",{})
+    return conf.get("MAX_SIZE",10000),conf.get("TTL",3600),conf.get("REUSE_MARGIN",300)
+
+
+_max_size,_ttl,_margin=_token_settings()
+#(link id, identity) -> issue_meeting_token response body
+token_cache=TTLCache(max_size=_max_size,ttl=_ttl-_margin)
+
+
+def mint(room_name,identity):
+    #(token, mode); a dummy token when Twilio isn't configured (dev mode)
+    account_sid=getattr(settings,"TWILIO_ACCOUNT_SID",None)
+    api_key_sid=getattr(settings,"TWILIO_API_KEY_SID",None)
+    api_key_secret=getattr(settings,"TWILIO_API_KEY_SECRET",None)
+    if not (account_sid and api_key_sid and api_key_secret):
+        return f"DUMMY-TOKEN-{uuid.uuid4().hex[:12]}","dummy"
+    _,ttl,_=_token_settings()
+    token=AccessToken(account_sid,api_key_sid,api_key_secret,identity=identity,ttl=ttl)
+    token.add_grant(VideoGrant(room=room_name))
+    jwt=token.to_jwt()
+    if isinstance(jwt,bytes):
+        jwt=jwt.decode("utf-8")
+    return jwt,"twilio"
+
+
+def cached(link_id,identity):
+    if not identity:
+        return None
+    return token_cache.get((str(link_id),identity))
+
+
+def issue(link,identity=None):
+    #response body for a live link snapshot (cache.aload_link); cached per
+    #(link, identity) when identity is given
+    body=cached(link["id"],identity)
+    if body is not None:
+        return body
+    given=bool(identity)
+    identity=identity or f"user-{uuid.uuid4().hex[:6]}"
+    token,mode=mint(link["room_name"],identity)
+    body={"token":token,"room_name":link["room_name"],"identity":identity,"mode":mode}
+    if given:
+        _,ttl,margin=_token_settings()
+        keep=ttl-margin
+        if link["expires_at"]:
+            keep=min(keep,(link["expires_at"]-timezone.now()).total_seconds())
+        if keep>0:
+            token_cache.set((link["id"],identity),body,ttl=keep)
+    return body
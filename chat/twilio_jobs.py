@@ -0,0 +1,255 @@
+#Twilio REST calls for recording rules and compositions, off the request thread.
+#the views store a TwilioJob row and answer 202 straight away; the job then runs on a
+#small thread pool in the same process (INLINE) and/or in `manage.py run_twilio_jobs`.
+#a runner claims a job with a conditional UPDATE, so any number of them can share the
+#table without running a job twice. rate limits (429), Twilio server errors and network
+#failures are retried with exponential backoff up to MAX_ATTEMPTS; anything else fails
+#the job at once. GET /api/twilio-jobs/<id>/ reports the row and can wait for the result.
+#every call goes through one process-wide client whose requests.Session keeps its
+#connections alive, instead of a new client (and TLS handshake) per request.
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import urlsplit
+import requests
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+from twilio.base.exceptions import TwilioRestException
+from twilio.http.http_client import TwilioHttpClient
+from twilio.rest import Client
+
+logger=logging.getLogger(__name__)
+
+DONE=("succeeded","failed")
+
+
+def _client_settings():
+    conf=getattr(settings,"CHAT_TWILIO_JOBS",{})
+    return conf.get("API_BASE"),conf.get("TIMEOUT",10),conf.get("POOL_SIZE",4)
+
+
+def _queue_settings():
+    conf=getattr(settings,"CHAT_TWILIO_JOBS",{})
+    return (
+        conf.get("INLINE",True),conf.get("WORKERS",4),conf.get("MAX_ATTEMPTS",5),
+        conf.get("BACKOFF_SECONDS",2),conf.get("MAX_BACKOFF_SECONDS",300),conf.get("STALE_SECONDS",600),
+    )
+
+
+class _HttpClient(TwilioHttpClient):
+    #keep-alive session with a connection pool sized for the job workers. api_base sends
+    #every request to another host with the same path (e.g. a local fake Twilio)
+
+    def __init__(self,api_base=None,pool_size=4,timeout=None):
+        super().__init__(pool_connections=True,timeout=timeout)
+        adapter=HTTPAdapter(pool_maxsize=pool_size)
+        self.session.mount("https://",adapter)
+        self.session.mount("http://",adapter)
+        self.api_base=api_base.rstrip("/") if api_base else None
+
+    def request(self,method,url,*args,**kwargs):
+        if self.api_base:
+            url=self.api_base+urlsplit(url)._replace(scheme="",netloc="").geturl()
+        return super().request(method,url,*args,**kwargs)
+
+
+_clients={}
+_clients_lock=threading.Lock()
+
+
+def configured():
+    return bool(getattr(settings,"TWILIO_ACCOUNT_SID",None) and getattr(settings,"TWILIO_AUTH_TOKEN",None))
+
+
+def get_client():
+    #the shared client for the current credentials; RuntimeError without them
+    if not configured():
+        raise RuntimeError("Twilio credentials are not configured")
+    key=(settings.TWILIO_ACCOUNT_SID,settings.TWILIO_AUTH_TOKEN,*_client_settings())
+    client=_clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client=_clients.get(key)
+            if client is None:
+                sid,token,api_base,timeout,pool_size=key
+                client=_clients[key]=Client(sid,token,http_client=_HttpClient(api_base,pool_size,timeout))
+    return client
+
+
+def _recording_rules(job,rule,status):
+    get_client().video.rooms(job.room_sid).recording_rules.update(rules=[{"type":rule,"all":True}])
+    return {"status":status,"room_sid":job.room_sid}
+
+
+def _composition(job):
+    comp=get_client().video.compositions.create(
+        room_sid=job.room_sid,
+        audio_sources="*",
+        video_layout={"grid":{"video_sources":["*"]}},
+        format="mp4",
+    )
+    return {"composition_sid":comp.sid,"status":comp.status,"room_sid":job.room_sid}
+
+
+ACTIONS={
+    "recording_start":lambda job:_recording_rules(job,"include","recording_started"),
+    "recording_stop":lambda job:_recording_rules(job,"exclude","recording_stopped"),
+    "composition":_composition,
+}
+
+
+def _record_composition(job,result):
+    #composition_created in the meeting's log, unless the session has been archived since
+    from .ingest import save_event
+    from .models import MeetingLink
+    meeting=MeetingLink.objects.select_related("session").get(id=job.meeting_id)
+    if not meeting.session.archived_at:
+        save_event(meeting,"composition_created",identity=job.identity,
+                   metadata={"composition_sid":result["composition_sid"],"job_id":str(job.id)})
+
+
+def _retryable(exc):
+    if isinstance(exc,TwilioRestException):
+        return exc.status==429 or exc.status>=500
+    return isinstance(exc,requests.RequestException)
+
+
+def describe(job):
+    return {
+        "id":str(job.id),
+        "meeting_id":str(job.meeting_id),
+        "kind":job.kind,
+        "status":job.status,
+        "attempts":job.attempts,
+        "next_attempt_at":job.next_attempt_at,
+        "result":job.result,
+        "error":job.error,
+        "created_at":job.created_at,
+        "updated_at":job.updated_at,
+    }
+
+
+def snapshot(job_id):
+    #describe() of a job, None when it doesn't exist
+    from .models import TwilioJob
+    job=TwilioJob.objects.filter(id=job_id).first()
+    return describe(job) if job else None
+
+
+def enqueue(meeting,kind,identity=None):
+    #a pending job for `meeting`'s room; started here once the row is committed (INLINE)
+    from .models import TwilioJob
+    job=TwilioJob.objects.create(meeting=meeting,kind=kind,room_sid=meeting.room_sid,identity=identity)
+    transaction.on_commit(lambda:dispatch(job.id))
+    return job
+
+
+def _save(job,**fields):
+    fields["updated_at"]=timezone.now()
+    for name,value in fields.items():
+        setattr(job,name,value)
+    job.save(update_fields=list(fields))
+
+
+def run_job(job_id):
+    #one attempt at a job if it is pending and due. returns its status afterwards, or
+    #None when it wasn't ours to run (another runner has it, finished or not due)
+    from .models import TwilioJob
+    now=timezone.now()
+    claimed=TwilioJob.objects.filter(id=job_id,status="pending",next_attempt_at__lte=now).update(
+        status="running",attempts=F("attempts")+1,updated_at=now,
+    )
+    if not claimed:
+        return None
+    job=TwilioJob.objects.get(id=job_id)
+    try:
+        result=ACTIONS[job.kind](job)
+    except Exception as exc:
+        _failed(job,exc)
+        return job.status
+    with transaction.atomic():
+        if job.kind=="composition":
+            _record_composition(job,result)
+        _save(job,status="succeeded",result=result,error="")
+    return job.status
+
+
+def _failed(job,exc):
+    _,_,max_attempts,backoff,max_backoff,_=_queue_settings()
+    error=f"{type(exc).__name__}: {exc}"
+    if _retryable(exc) and job.attempts<max_attempts:
+        delay=min(backoff*2**(job.attempts-1),max_backoff)
+        _save(job,status="pending",error=error,next_attempt_at=timezone.now()+timedelta(seconds=delay))
+        logger.info("twilio job %s (%s) attempt %d failed, retrying in %ss: %s",job.id,job.kind,job.attempts,delay,error)
+        dispatch(job.id,delay)
+    else:
+        _save(job,status="failed",error=error)
+        logger.warning("twilio job %s (%s) failed after %d attempts: %s",job.id,job.kind,job.attempts,error)
+
+
+def requeue_stale():
+    #jobs left running by a runner that died are pending again (their attempt counts).
+    #recording rules are idempotent; a composition may be created twice in that case
+    from .models import TwilioJob
+    *_,stale=_queue_settings()
+    now=timezone.now()
+    return TwilioJob.objects.filter(status="running",updated_at__lt=now-timedelta(seconds=stale)).update(
+        status="pending",next_attempt_at=now,updated_at=now,
+    )
+
+
+def _run_in_thread(job_id):
+    try:
+        return run_job(job_id)
+    except Exception:
+        logger.exception("twilio job %s crashed",job_id)
+        return None
+    finally:
+        connections.close_all()
+
+
+_pool=None
+_pool_lock=threading.Lock()
+
+
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _,workers,*_=_queue_settings()
+            _pool=ThreadPoolExecutor(max_workers=workers,thread_name_prefix="twilio-job")
+        return _pool
+
+
+def dispatch(job_id,delay=0):
+    #run a job on this process's pool after `delay` seconds; no-op unless INLINE
+    inline,*_=_queue_settings()
+    if not inline:
+        return
+    if delay>0:
+        timer=threading.Timer(delay,dispatch,[job_id])
+        timer.daemon=True
+        timer.start()
+        return
+    _executor().submit(_run_in_thread,job_id)
+
+
+def run_due(limit=100,workers=1):
+    #one pass over the jobs that are due, oldest first, run here. returns {status: count}
+    from .models import TwilioJob
+    requeue_stale()
+    ids=list(
+        TwilioJob.objects.filter(status="pending",next_attempt_at__lte=timezone.now())
+        .order_by("next_attempt_at").values_list("id",flat=True)[:limit]
+    )
+    if workers>1:
+        with ThreadPoolExecutor(max_workers=workers,thread_name_prefix="twilio-job") as pool:
+            statuses=list(pool.map(_run_in_thread,ids))
+    else:
+        statuses=[run_job(job_id) for job_id in ids]
+    return Counter(s for s in statuses if s)
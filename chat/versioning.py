@@ -0,0 +1,73 @@
+#version stamps for conditional GETs. Session.version / MeetingLink.version are
+#bumped (with updated_at) on every write that changes what the read endpoints
+#return, so a view can answer If-None-Match / If-Modified-Since with 304 from one
+#indexed row instead of rebuilding its payload. list_sessions covers every active
+#session, so it validates against one global ChangeStamp row bumped alongside them.
+import hashlib
+from calendar import timegm
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+SESSIONS="sessions"
+
+
+def _bump_stamp(name):
+    from .models import ChangeStamp
+    now=timezone.now()
+    if ChangeStamp.objects.filter(name=name).update(value=F("value")+1,updated_at=now):
+        return
+    _,created=ChangeStamp.objects.get_or_create(name=name,defaults={"value":1,"updated_at":now})
+    if not created:
+        ChangeStamp.objects.filter(name=name).update(value=F("value")+1,updated_at=now)
+
+
+def touch_sessions():
+    #the sessions list changed. bumped after commit, so the one global row is locked
+    #for a single statement rather than for the rest of every writer's transaction
+    transaction.on_commit(lambda:_bump_stamp(SESSIONS))
+
+
+def sessions_stamp():
+    #(value, updated_at) of the sessions list stamp; (0, None) before the first write
+    from .models import ChangeStamp
+    return ChangeStamp.objects.filter(name=SESSIONS).values_list("value","updated_at").first() or (0,None)
+
+
+def bump_session(session_id,**fields):
+    #version+1 on the session; extra fields are written in the same UPDATE
+    from .models import Session
+    touch_sessions()
+    return Session.objects.filter(id=session_id).update(
+        version=F("version")+1,updated_at=timezone.now(),**fields,
+    )
+
+
+def bump_meeting(link_id):
+    from .models import MeetingLink
+    return MeetingLink.objects.filter(id=link_id).update(version=F("version")+1,updated_at=timezone.now())
+
+
+def make_etag(*parts):
+    return '"%s"'%hashlib.sha1("|".join(str(p) for p in parts).encode()).hexdigest()[:24]
+
+
+def _timestamp(dt):
+    return timegm(dt.utctimetuple()) if dt else None
+
+
+def not_modified(request,etag,last_modified=None):
+    #HttpResponseNotModified when the client's copy is current, else None
+    return get_conditional_response(request,etag=etag,last_modified=_timestamp(last_modified))
+
+
+def stamp(response,etag,last_modified=None):
+    #validators on a full response; no-cache makes browsers revalidate every poll
+    response["ETag"]=etag
+    if last_modified:
+        response["Last-Modified"]=http_date(_timestamp(last_modified))
+    response["Cache-Control"]="no-cache"
+    return response
@@ -1,21 +1,45 @@
 import uuid
+import json
+import asyncio
+import logging
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny,IsAuthenticated
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django.utils.dateparse import parse_datetime
 from django.utils import timezone
 from django.db.models import Count,Min,Max
-from .models import Session, Message, ROLES, MeetingLink, MeetingEvent
+from .models import Session, Message, ROLES, MeetingLink, SessionStats, MeetingState
 from .serializers import SessionSeralizer, MessageSeralizer,MeetingLinkSerializer
+from . import pipeline
+from .cache import session_cache, load_session, aload_link, link_state
+from . import wire
+from .pagination import encode_cursor, decode_cursor, keyset_page, keyset_slice, int_param
 from django.conf import settings
-from twilio.jwt.access_token import AccessToken
-from twilio.jwt.access_token.grants import VideoGrant
 from datetime import timedelta
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
-from twilio.rest import Client
 from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET, require_POST
+from django.views.decorators.csrf import csrf_exempt
+from channels.db import database_sync_to_async
+from . import replay
+from . import metrics
+from . import export
+from . import search
+from . import archive
+from . import stats
+from . import ingest
+from . import reports
+from . import timeline
+from . import tokens
+from . import twilio_jobs
+from .aggregation import MeetingAccumulator, session_report
+from .versioning import bump_session, make_etag, not_modified, sessions_stamp, stamp, touch_sessions
+
+logger = logging.getLogger(__name__)
 
 #read sender and role from header or query param (simple stub auth)
 def get_sender_and_role(request):
@@ -38,39 +62,321 @@ def create_session(request):
     agent_id = request.data.get("agent_id")
     customer_id = request.data.get("customer_id")
     s=Session.objects.create(title=title, agent_id=agent_id, customer_id=customer_id)
+    session_cache.invalidate(str(s.id))
+    touch_sessions()
     return Response(SessionSeralizer(s).data, status=201)
 
 @api_view(["GET"])
 @permission_classes([AllowAny])
 def list_messages(request, session_id):
     """
-    returns list of messages for the session
+    GET /api/sessions/<session_id>/messages/
+    keyset paginated on (sent_at, id):
+      ?limit=50               page size (max 200)
+      ?before=<cursor>        older page (use before_cursor of the current page)
+      ?after=<cursor>         newer page (use after_cursor of the current page)
+      ?since=<iso datetime>   messages sent after a point in time
+      ?order=newest|oldest    where to start when no cursor is given (default newest)
+    returns { results: [...oldest first], before_cursor, after_cursor, has_more }
+    has_more refers to the direction being paged (older for newest/before).
     """
     session = get_object_or_404(Session, id=session_id)
-    qs = session.messages.all()
-    since = request.query_params.get("since")
-    if since:
-        try:
-            dt = parse_datetime(since)
-            if dt is not None:
-                qs = qs.filter(created_at__gt=dt)
-        except Exception:
-            # ignore invalid
-            pass
-    serializer = MessageSeralizer(qs, many=True)
-    return Response(serializer.data)
+    etag = make_etag("messages", session.id, session.version, request.META.get("QUERY_STRING", ""))
+    cached = not_modified(request, etag, session.updated_at)
+    if cached is not None:
+        return cached
+    params = request.query_params
+    limit = int_param(params, "limit", 50, 1, 200)
+    qs = Message.objects.filter(session=session)
+    before = after = None
+    try:
+        if params.get("before"):
+            before = decode_cursor(params["before"], int)
+        elif params.get("after"):
+            after = decode_cursor(params["after"], int)
+    except ValueError:
+        return Response({"error": "invalid cursor"}, status=400)
+    descending = params.get("order", "newest") != "oldest"
+    since = params.get("since")
+    if since and before is None and after is None:
+        dt = parse_datetime(since)
+        if dt is None:
+            return Response({"error": "invalid since"}, status=400)
+        dt = timezone.make_aware(dt) if timezone.is_naive(dt) else dt
+        qs = qs.filter(sent_at__gt=dt)
+        descending = False
+
+    if session.archived_at is not None:
+        # cold session: same paging over the rows unpacked from its archive
+        rows = archive.archived_messages(session.id)
+        if since and before is None and after is None:
+            rows = [m for m in rows if m.sent_at > dt]
+        rows, has_more = keyset_slice(rows, "sent_at", limit, before=before, after=after, descending=descending)
+    else:
+        rows, has_more = keyset_page(qs, "sent_at", limit, before=before, after=after, descending=descending)
+    rows.sort(key=lambda m: (m.sent_at, m.id))
+    return stamp(Response({
+        "results": MessageSeralizer(rows, many=True).data,
+        "before_cursor": encode_cursor(rows[0].sent_at, rows[0].id) if rows else params.get("before"),
+        "after_cursor": encode_cursor(rows[-1].sent_at, rows[-1].id) if rows else params.get("after"),
+        "has_more": has_more,
+    }), etag, session.updated_at)
 
 @api_view(["POST"])
 @permission_classes([AllowAny])
 def post_message(request, session_id):
+    # POST /api/sessions/<session_id>/messages/post/
+    # goes through the same pipeline as websocket frames: batched insert, seq, group broadcast
     session = get_object_or_404(Session, id=session_id)
+    if not session.is_active:
+        return Response({"error": "session closed"}, status=409)
     sender, role = get_sender_and_role(request)
-    text = request.data.get("text", "").strip()
-    if not text:
+    try:
+        msg = async_to_sync(pipeline.submit)(session.id, sender, role, request.data.get("text", ""))
+    except pipeline.MessageError:
         return Response({"error": "empty text"}, status=400)
-    msg = Message.objects.create(session=session, sender=sender, role=role, text=text)
     return Response(MessageSeralizer(msg).data, status=201)
 
+@api_view(["POST"])
+@permission_classes([AllowAny])
+def post_messages_bulk(request, session_id):
+    """
+    POST /api/sessions/<session_id>/messages/bulk/
+    body: { "messages": [ {"text": "...", "sender": "bot", "role": "system"}, ... ] }
+    sender/role default to the X-User/X-Role headers. one insert, one group send.
+    """
+    session = get_object_or_404(Session, id=session_id)
+    if not session.is_active:
+        return Response({"error": "session closed"}, status=409)
+    sender, role = get_sender_and_role(request)
+    items = request.data.get("messages")
+    if not isinstance(items, list):
+        return Response({"error": "messages must be a list"}, status=400)
+    items = [
+        {"sender": sender, "role": role, **item} if isinstance(item, dict) else item
+        for item in items
+    ]
+    try:
+        msgs = pipeline.persist_many(session.id, items)
+    except pipeline.MessageError as e:
+        return Response({"error": e.code}, status=400)
+    try:
+        async_to_sync(pipeline.broadcast_many)(msgs)
+    except Exception as e:
+        logger.warning("ws chat.batch send error: %s", e)
+    return Response({"messages": MessageSeralizer(msgs, many=True).data}, status=201)
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def search_messages(request):
+    """
+    GET /api/messages/search/?q=refund
+    ranked full-text search over message text and sender (best match first):
+      ?session=<uuid>         only this session
+      ?role=agent|customer|system
+      ?from=<iso> ?to=<iso>   sent_at range (to is exclusive)
+      ?limit=20 (max 100) ?page=1 (max 50)
+    returns { results: [...message + score], page, has_more }
+    """
+    params = request.query_params
+    q = (params.get("q") or "").strip()
+    if not q:
+        return Response({"error": "q is required"}, status=400)
+    session_id = params.get("session")
+    if session_id:
+        try:
+            session_id = uuid.UUID(session_id)
+        except ValueError:
+            return Response({"error": "invalid session"}, status=400)
+    role = params.get("role")
+    if role and role not in {r[0] for r in ROLES}:
+        return Response({"error": "invalid role"}, status=400)
+    bounds = {}
+    for name in ("from", "to"):
+        if params.get(name):
+            dt = parse_datetime(params[name])
+            if dt is None:
+                return Response({"error": f"invalid {name}"}, status=400)
+            bounds[name] = timezone.make_aware(dt) if timezone.is_naive(dt) else dt
+    limit = int_param(params, "limit", 20, 1, 100)
+    page = int_param(params, "page", 1, 1, 50)
+    hits, has_more = search.search(
+        q, session_id=session_id or None, role=role or None,
+        since=bounds.get("from"), until=bounds.get("to"),
+        limit=limit, offset=(page - 1) * limit,
+    )
+    results = []
+    for msg, score in hits:
+        row = MessageSeralizer(msg).data
+        row["score"] = score
+        results.append(row)
+    return Response({"results": results, "page": page, "has_more": has_more})
+
+#event types pushed to SSE / long-poll clients -> SSE event name
+STREAM_EVENTS = {
+    "chat.message": "message",
+    "presence.update": "presence",
+    "meeting_started": "meeting.started",
+    "session.closed": "session.closed",
+}
+
+def _sse_frame(event, name=None):
+    lines = []
+    if event.get("seq") is not None:
+        lines.append(f"id: {event['seq']}")
+    lines.append(f"event: {name or STREAM_EVENTS[event['type']]}")
+    lines.append(f"data: {event.get('_json') or json.dumps(wire.client_message(event))}")
+    return "\n".join(lines) + "\n\n"
+
+async def _subscribe(session_id):
+    # same channel-layer group SessionConsumer uses, on a channel of our own
+    layer = get_channel_layer()
+    group = f"session_{session_id}"
+    channel = await layer.new_channel()
+    await layer.group_add(group, channel)
+    replay.attach(group)
+    return layer, group, channel
+
+async def _unsubscribe(layer, group, channel):
+    replay.detach(group)
+    await layer.group_discard(group, channel)
+
+def _expand(event):
+    # bulk-posted messages arrive as one chat.batch event
+    if event.get("type") == "chat.batch":
+        return event["messages"]
+    return [event]
+
+def _keep(event, group, replayed_seq):
+    # filter and de-duplicate events from the group (also feeds the replay buffer)
+    if event.get("type") not in STREAM_EVENTS:
+        return False
+    if event["type"] == "chat.message":
+        buf = replay.get_buffer(group)
+        if buf is not None:
+            buf.append(event)
+        if replayed_seq is not None and event.get("seq") is not None and event["seq"] <= replayed_seq:
+            return False
+    return True
+
+async def _sse_stream(session_id, last_seq, heartbeat):
+    layer, group, channel = await _subscribe(session_id)
+    try:
+        yield "retry: 3000\n\n"
+        replayed = last_seq
+        if last_seq is not None:
+            events, _, truncated = await replay.missed_events(group, session_id, last_seq)
+            for event in events:
+                yield _sse_frame(event)
+            if events:
+                replayed = events[-1]["seq"]
+            if truncated:
+                # gap too large to stream, client should page through list_messages
+                yield _sse_frame({"_json": json.dumps({"type": "resync", "after_seq": replayed})}, "resync")
+        while True:
+            try:
+                event = await asyncio.wait_for(layer.receive(channel), heartbeat)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            for event in _expand(event):
+                if not _keep(event, group, replayed):
+                    continue
+                yield _sse_frame(event)
+                if event["type"] == "session.closed":
+                    return
+    finally:
+        await _unsubscribe(layer, group, channel)
+
+async def _long_poll(session_id, last_seq, timeout):
+    layer, group, channel = await _subscribe(session_id)
+    try:
+        events, truncated = [], False
+        if last_seq is not None:
+            events, _, truncated = await replay.missed_events(group, session_id, last_seq)
+        if not events:
+            deadline = asyncio.get_running_loop().time() + timeout
+            while not events:
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    break
+                try:
+                    event = await asyncio.wait_for(layer.receive(channel), remaining)
+                except asyncio.TimeoutError:
+                    break
+                events.extend(e for e in _expand(event) if _keep(e, group, last_seq))
+            # pick up whatever arrived together with the first event
+            while events:
+                try:
+                    event = await asyncio.wait_for(layer.receive(channel), 0.01)
+                except asyncio.TimeoutError:
+                    break
+                events.extend(e for e in _expand(event) if _keep(e, group, last_seq))
+        seqs = [e["seq"] for e in events if e.get("seq") is not None]
+        return JsonResponse({
+            "events": [wire.client_message(e) for e in events],
+            "last_seq": max(seqs) if seqs else last_seq,
+            "truncated": truncated,
+        })
+    finally:
+        await _unsubscribe(layer, group, channel)
+
+@require_GET
+async def stream_messages(request, session_id):
+    """
+    GET /api/sessions/<session_id>/messages/stream/
+    Server-Sent Events for clients that can't hold a websocket: message, presence,
+    meeting.started and session.closed events from the session's group.
+    Resumes after the Last-Event-ID header (or ?last_event_id=<seq>).
+    ?mode=poll&after_seq=<seq>&timeout=25 is the long-poll fallback: waits for the
+    next events and returns them as JSON.
+    needs an ASGI server (daphne/uvicorn).
+    """
+    session = await database_sync_to_async(load_session)(session_id)
+    if session is None:
+        return JsonResponse({"error": "not_found"}, status=404)
+    if get_channel_layer() is None:
+        return JsonResponse({"error": "no channel layer"}, status=503)
+    raw = (
+        request.headers.get("Last-Event-ID")
+        or request.GET.get("last_event_id")
+        or request.GET.get("after_seq")
+    )
+    try:
+        last_seq = int(raw) if raw not in (None, "") else None
+    except ValueError:
+        return JsonResponse({"error": "invalid last event id"}, status=400)
+
+    if request.GET.get("mode") == "poll":
+        return await _long_poll(str(session_id), last_seq, int_param(request.GET, "timeout", 25, 0, 55))
+
+    response = StreamingHttpResponse(
+        _sse_stream(str(session_id), last_seq, heartbeat=15),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+@require_GET
+async def export_transcript(request, session_id):
+    """
+    GET /api/sessions/<session_id>/export/?format=ndjson|csv
+    Full transcript (messages and meeting events in time order) streamed as a download.
+    rows are read with chunked iterators, so memory stays flat for any session size.
+    """
+    fmt = request.GET.get("format", "ndjson")
+    if fmt not in export.FORMATS:
+        return JsonResponse({"error": "format must be ndjson or csv"}, status=400)
+    session = await database_sync_to_async(load_session)(session_id)
+    if session is None:
+        return JsonResponse({"error": "not_found"}, status=404)
+    content_type, ext = export.FORMATS[fmt]
+    lines = export.encode_rows(export.transcript_rows(session_id), fmt)
+    response = StreamingHttpResponse(export.aiter_blocks(lines), content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="transcript-{session_id}.{ext}"'
+    return response
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def create_meeting_link(request,session_id):
@@ -91,99 +397,121 @@ def create_meeting_link(request,session_id):
         expires_at=expires_at
     )
 
-    session.meeting_link=m.public_url(base='http://localhost:5173/meet/')
-    session.save(update_fields=['meeting_link'])
+    bump_session(session.id,meeting_link=m.public_url(base='http://localhost:5173/meet/'))
+    stats.on_meeting_created(session.id)
 
     return Response(MeetingLinkSerializer(m).data,status=201)
 
-@api_view(['GET'])
-@permission_classes([AllowAny])
-def validate_meeting_link(request,link_id):
-    #GET /api/meetings/<linkid>/validate/
-    try:
-        m=MeetingLink.objects.get(id=link_id)
-    except MeetingLink.DoesNotExist:
-        return Response({'valid':False,'reason':'not_found'},status=404)
-    
-    if m.is_expired():
-        return Response({'valid':False,'reason':'expired'},status=410)
-    
-    return Response({'valid':True,'room_name':m.room_name,'session_id':str(m.session_id)})
-
-@api_view(['POST'])
-@permission_classes([AllowAny])
-def issue_meeting_token(request, link_id):
-    try:
-        m = MeetingLink.objects.get(id=link_id)
-    except MeetingLink.DoesNotExist:
-        return Response({'error': 'not_found'}, status=404)
-
-    if m.is_expired():
-        return Response({'error': 'expired'}, status=410)
-
-    identity = (
-        request.data.get('identity')
-        or request.headers.get('X-User')
-        or f"user-{uuid.uuid4().hex[:6]}"
+# link_state values that can't be joined -> HTTP status
+LINK_ERRORS = {"not_found": 404, "expired": 410}
+
+@require_GET
+async def validate_meeting_link(request, link_id):
+    # GET /api/meetings/<linkid>/validate/
+    # served from the link cache, including not-found and expired answers
+    link = await aload_link(link_id)
+    state = link_state(link)
+    if state in LINK_ERRORS:
+        return JsonResponse({"valid": False, "reason": state}, status=LINK_ERRORS[state])
+    return JsonResponse({"valid": True, "room_name": link["room_name"], "session_id": link["session_id"]})
+
+# background tasks started by views, kept referenced until they finish
+_background = set()
+
+def _fire_and_forget(coro, what):
+    task = asyncio.ensure_future(coro)
+    _background.add(task)
+
+    def done(t):
+        _background.discard(t)
+        if not t.cancelled() and t.exception() is not None:
+            logger.warning("%s failed: %s", what, t.exception())
+
+    task.add_done_callback(done)
+
+def _announce_meeting(session_id, link_id):
+    # meeting_started to the session group so the agent can auto-join; never awaited
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    group_name = f"session_{session_id}"
+    logger.debug("ws sending meeting_started to group %s", group_name)
+    _fire_and_forget(
+        channel_layer.group_send(
+            group_name,
+            wire.with_frames({
+                "type": "meeting_started",
+                "session_id": str(session_id),
+                "link_id": str(link_id),
+            }),
+        ),
+        "ws meeting_started send",
     )
 
-    account_sid = settings.TWILIO_ACCOUNT_SID
-    api_key_sid = settings.TWILIO_API_KEY_SID
-    api_key_secret = settings.TWILIO_API_KEY_SECRET
-
-    # allow dev mode with dummy token if Twilio not configured
-    if not (account_sid and api_key_sid and api_key_secret):
-        simulated_token = f"DUMMY-TOKEN-{uuid.uuid4().hex[:12]}"
-        token_str = simulated_token
-        mode = "dummy"
-    else:
-        token = AccessToken(account_sid, api_key_sid, api_key_secret, identity=identity)
-        video_grant = VideoGrant(room=m.room_name)
-        token.add_grant(video_grant)
-        jwt = token.to_jwt()
-        if isinstance(jwt, bytes):
-            jwt = jwt.decode("utf-8")
-        token_str = jwt
-        mode = "twilio"
-
-    # broadcast to WS so agent can auto-join
+@csrf_exempt
+@require_POST
+async def issue_meeting_token(request, link_id):
+    """
+    POST /api/meetings/<link_id>/issue/  {"identity": "..."}
+    the link comes from the link cache and signed tokens are cached per (link, identity)
+    (see chat/tokens.py), so a repeat request is answered without touching the database
+    or signing a new JWT.
+    """
     try:
-        channel_layer = get_channel_layer()
-        if channel_layer is not None:
-            safe_session_id=str(m.session_id)
-            group_name=f"session_{safe_session_id}"
-            print("WS sending meeting_started to group:",group_name)
-            async_to_sync(channel_layer.group_send)(
-                group_name,
-                {
-                    "type": "meeting_started",
-                    "session_id": safe_session_id,
-                    "link_id": str(m.id),
-                },
-            )
-    except Exception as e:
-        print("WS meeting_started send error:", e)
-
-    return Response({
-        'token': token_str,
-        'room_name': m.room_name,
-        'identity': identity,
-        'mode': mode,
-    }) 
+        data = json.loads(request.body or b"{}") if request.content_type == "application/json" else request.POST
+    except ValueError:
+        return JsonResponse({"error": "invalid JSON"}, status=400)
+    if not hasattr(data, "get"):
+        data = {}
+    identity = data.get("identity") or request.headers.get("X-User") or None
+
+    link = await aload_link(link_id)
+    state = link_state(link)
+    if state in LINK_ERRORS:
+        return JsonResponse({"error": state}, status=LINK_ERRORS[state])
+    body = tokens.issue(link, identity)
+
+    _announce_meeting(link["session_id"], link_id)
+    return JsonResponse(body)
 
 from django.http import JsonResponse
-from .consumers import PRESENCE
+from .presence import get_presence
 def presence_view(request,session_id):
     #GET /api/sessions/<session_id>/presence/
-    users=list(PRESENCE.get(str(session_id),set()))
+    users=get_presence().online(session_id)
     return JsonResponse({"session_id":str(session_id),"online":users})
 
+def metrics_view(request):
+    #GET /metrics  (Prometheus text format, values are for the worker that answers)
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+def presence_bulk(request):
+    #GET /api/sessions/presence/?ids=<uuid>,<uuid>,...
+    ids=[i for i in request.GET.get("ids","").split(",") if i][:500]
+    return JsonResponse({"online":get_presence().online_many(ids)})
+
+def _stats(session):
+    # SessionStats for a row fetched with select_related("stats"); zeros if not written yet
+    try:
+        return session.stats
+    except SessionStats.DoesNotExist:
+        return SessionStats(session_id=session.id)
+
 @api_view(["GET"])
 def list_sessions(request):
     # GET /api/sessions/list/
-    qs=Session.objects.filter(is_active=True).order_by("-created_at")[:50]
+    # the global sessions stamp (one row by key) decides whether the dashboard's copy
+    # is still current
+    version,changed=sessions_stamp()
+    etag=make_etag("sessions",version)
+    cached=not_modified(request,etag,changed)
+    if cached is not None:
+        return cached
+    qs=Session.objects.filter(is_active=True).select_related("stats").order_by("-created_at")[:50]
     out=[]
     for s in qs:
+        st=_stats(s)
+        last_activity=max((t for t in (s.created_at,st.last_message_at,st.last_meeting_at) if t),default=None)
         out.append({
             "id":str(s.id),
             "title":s.title,
@@ -191,24 +519,57 @@ def list_sessions(request):
             "customer_id":s.customer_id,
             "meeting_link":s.meeting_link,
             "created_at":s.created_at.isoformat(),
+            "message_count":st.message_count,
+            "last_message_at":st.last_message_at.isoformat() if st.last_message_at else None,
+            "last_activity_at":last_activity.isoformat(),
         })
-    return Response(out)
+    return stamp(Response(out),etag,changed)
+
+def history_queryset(params):
+    # filtered Session queryset for the history list; raises ValueError on bad input.
+    # every filter combination is served by one of the Session indexes
+    qs = Session.objects.all()
+    if params.get("agent"):
+        qs = qs.filter(agent_id=params["agent"])
+    if params.get("customer"):
+        qs = qs.filter(customer_id=params["customer"])
+    active = params.get("active")
+    if active:
+        if active.lower() not in ("true", "false", "1", "0"):
+            raise ValueError("active must be true or false")
+        qs = qs.filter(is_active=active.lower() in ("true", "1"))
+    for name, lookup in (("created_after", "created_at__gte"), ("created_before", "created_at__lt")):
+        if params.get(name):
+            dt = parse_datetime(params[name])
+            if dt is None:
+                raise ValueError(f"invalid {name}")
+            qs = qs.filter(**{lookup: timezone.make_aware(dt) if timezone.is_naive(dt) else dt})
+    return qs
 
 @api_view(["GET"])
 @permission_classes([AllowAny])
 def list_all_sessions(request):
-    #GET /api/sessions/history/
-    qs = (
-        Session.objects.all()
-        .annotate(
-            meeting_count=Count("meeting_links", distinct=True),
-            last_meeting_at=Max("meeting_links__events__created_at"),
-        )
-        .order_by("-created_at")[:300]
-    )
+    """
+    GET /api/sessions/history/
+    newest first, keyset paginated on (created_at, id):
+      ?agent=<id> ?customer=<id> ?active=true|false
+      ?created_after=<iso> ?created_before=<iso>
+      ?limit=50 (max 300) ?cursor=<next_cursor of the previous page>
+    returns { results: [...], next_cursor, has_more }
+    """
+    try:
+        qs = history_queryset(request.query_params)
+        cursor = request.query_params.get("cursor")
+        before = decode_cursor(cursor, uuid.UUID) if cursor else None
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+    limit = int_param(request.query_params, "limit", 50, 1, 300)
+    # rollups come from SessionStats (one-to-one join), not from aggregating events
+    rows, has_more = keyset_page(qs.select_related("stats"), "created_at", limit, before=before)
 
     out = []
-    for s in qs:
+    for s in rows:
+        st = _stats(s)
         out.append(
             {
                 "id": str(s.id),
@@ -217,13 +578,22 @@ def list_all_sessions(request):
                 "customer_id": s.customer_id,
                 "is_active": getattr(s, "is_active", True),
                 "created_at": s.created_at.isoformat(),
-                "meeting_count": s.meeting_count,
-                "last_meeting_at": s.last_meeting_at.isoformat()
-                if s.last_meeting_at
+                "meeting_count": st.meeting_count,
+                "last_meeting_at": st.last_meeting_at.isoformat()
+                if st.last_meeting_at
                 else None,
+                "message_count": st.message_count,
+                "last_message_at": st.last_message_at.isoformat()
+                if st.last_message_at
+                else None,
+                "call_seconds": st.call_seconds,
             }
         )
-    return Response(out)
+    return Response({
+        "results": out,
+        "next_cursor": encode_cursor(rows[-1].created_at, rows[-1].id) if rows and has_more else None,
+        "has_more": has_more,
+    })
 
 @api_view(["POST"])
 def close_session(request, pk):
@@ -231,8 +601,18 @@ def close_session(request, pk):
         s = Session.objects.get(pk=pk)
     except Session.DoesNotExist:
         return Response({"detail": "Not found"}, status=404)
-    s.is_active = False
-    s.save(update_fields=["is_active"])
+    bump_session(s.id, is_active=False, closed_at=timezone.now())
+    session_cache.invalidate(str(s.id))
+    # tell connected consumers (in every worker) to stop writing and disconnect
+    try:
+        channel_layer = get_channel_layer()
+        if channel_layer is not None:
+            async_to_sync(channel_layer.group_send)(
+                f"session_{s.id}",
+                {"type": "session.closed", "session_id": str(s.id)},
+            )
+    except Exception as e:
+        logger.warning("ws session.closed send error: %s", e)
     return Response({"status": "closed"})
 
 @api_view(["POST"])
@@ -243,6 +623,8 @@ def meeting_event(request,link_id):
         m=MeetingLink.objects.select_related("session").get(id=link_id)
     except MeetingLink.DoesNotExist:
         return Response({"error":"not_found"},status=404)
+    if m.session.archived_at:
+        return Response({"error":"session archived"},status=409)
     
     event_type=request.data.get("event_type")
     if not event_type:
@@ -256,14 +638,7 @@ def meeting_event(request,link_id):
     )
     metadata = request.data.get("metadata") or {}
 
-    ev = MeetingEvent.objects.create(
-        meeting=m,
-        session=m.session,
-        event_type=event_type,
-        identity=identity,
-        role=role,
-        metadata=metadata,
-    )
+    ev = ingest.save_event(m, event_type, identity=identity, role=role, metadata=metadata)
 
     return Response(
         {
@@ -274,209 +649,130 @@ def meeting_event(request,link_id):
         status=201,
     )
 
+@api_view(["POST"])
+@permission_classes([AllowAny])
+def meeting_events_batch(request,link_id):
+    #POST /api/meetings/<link_id>/events/batch/
+    #{"client_id": "...", "events": [{"client_seq": 1, "client_ts": "<iso>", "event_type": "joined", ...}]}
+    try:
+        m=MeetingLink.objects.select_related("session").get(id=link_id)
+    except MeetingLink.DoesNotExist:
+        return Response({"error":"not_found"},status=404)
+    if m.session.archived_at:
+        return Response({"error":"session archived"},status=409)
+    if not isinstance(request.data,dict):
+        return Response({"error":"expected a JSON object"},status=400)
+
+    try:
+        client_id,items=ingest.parse_batch(
+            request.data,
+            identity=request.data.get("identity") or request.headers.get("X-User") or None,
+            role=request.data.get("role") or request.headers.get("X-Role") or "customer",
+        )
+    except ValueError as e:
+        return Response({"error":str(e)},status=400)
+
+    saved,duplicates=ingest.save_batch(m,client_id,items)
+    return Response(
+        {
+            "accepted":[
+                {"client_seq":ev.client_seq,"id":str(ev.id),"created_at":ev.created_at.isoformat()}
+                for ev in saved
+            ],
+            "duplicates":duplicates,
+        },
+        status=201 if saved else 200,
+    )
+
 @api_view(["GET"])
 @permission_classes([AllowAny])
 def meeting_analytics(request, link_id):
     """
     GET /api/meetings/<link_id>/analytics/
+    summary is read from the meeting's MeetingState row (kept current by meeting_event).
+    the raw event log is included as before; ?include_events=0 leaves it out, so the
+    summary alone costs one row.
     """
     try:
-        m = MeetingLink.objects.get(id=link_id)
+        m = MeetingLink.objects.select_related("session", "state").get(id=link_id)
     except MeetingLink.DoesNotExist:
         return Response({"error": "not_found"}, status=404)
+    include_events = request.query_params.get("include_events") not in ("0", "false")
+    etag = make_etag("analytics", m.id, m.version, include_events)
+    cached = not_modified(request, etag, m.updated_at)
+    if cached is not None:
+        return cached
 
-    events_qs = m.events.order_by("created_at")
-    events = list(events_qs)
-
-    participants = sorted({e.identity for e in events if e.identity})
-
-    start_time = events[0].created_at if events else None
-    end_time = events[-1].created_at if events else None
-    duration_seconds = (
-        (end_time - start_time).total_seconds()
-        if start_time and end_time
-        else None
-    )
-
-    # joined/left per participant
-    first_join = {}
-    last_leave = {}
-    for e in events:
-        if e.event_type == "joined":
-            first_join.setdefault(e.identity, e.created_at)
-        elif e.event_type == "left":
-            last_leave[e.identity] = e.created_at
-
-    # screen share intervals
-    screen_intervals = []  # [{identity, start, end, duration_seconds}, ...]
-    active_share = {}      
-
-    for e in events:
-        if e.event_type == "screen_share_started":
-            active_share[e.identity] = e.created_at
-        elif e.event_type == "screen_share_stopped":
-            start = active_share.pop(e.identity, None)
-            if start:
-                dur = (e.created_at - start).total_seconds()
-                screen_intervals.append({
-                    "identity": e.identity,
-                    "start": start,
-                    "end": e.created_at,
-                    "duration_seconds": dur,
-                })
-
-    # if someone started sharing but never stopped,  close it at meeting end
-    for ident, start in active_share.items():
-        if end_time:
-            dur = (end_time - start).total_seconds()
-            screen_intervals.append({
-                "identity": ident,
-                "start": start,
-                "end": end_time,
-                "duration_seconds": dur,
-            })
-
-    summary = {
-        "meeting_id": str(m.id),
-        "session_id": str(m.session_id),
-        "participants": participants,
-        "start_time": start_time,
-        "end_time": end_time,
-        "duration_seconds": duration_seconds,
-        "first_join": {k: first_join.get(k) for k in participants},
-        "last_leave": {k: last_leave.get(k) for k in participants},
-        "screen_share_sessions": screen_intervals,
-    }
-    events_out = [
-        {
-            "event_type": e.event_type,
-            "identity": e.identity,
-            "role": e.role,
-            "metadata": e.metadata,
-            "created_at": e.created_at,
-        }
-        for e in events
-    ]
-
-    return Response({
+    try:
+        acc = MeetingAccumulator.from_row(m.state)
+    except MeetingState.DoesNotExist:
+        acc = MeetingAccumulator()
+    out = {
         "meta": {
             "meeting_id": str(m.id),
             "session_id": str(m.session_id),
             "room_name": m.room_name,
             "expires_at": m.expires_at,
         },
-        "summary": summary,
-        "events": events_out,
-    })
+        "summary": acc.summary(m.id, m.session_id),
+    }
+
+    if include_events:
+        if m.session.archived_at:
+            events = archive.archived_events(m.session_id, meeting_id=m.id)
+        else:
+            events = m.events.order_by("created_at").iterator()
+        out["events"] = [
+            {
+                "event_type": e.event_type,
+                "identity": e.identity,
+                "role": e.role,
+                "metadata": e.metadata,
+                "created_at": e.created_at,
+            }
+            for e in events
+        ]
+
+    return stamp(Response(out), etag, m.updated_at)
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def meeting_report(request):
+    # GET /api/reports/?from=2026-10-01&to=2026-10-31&agent=agent1
+    # talk / participant / screen-share time and meeting counts per agent per day
+    params = request.query_params
+    try:
+        since, until = reports.parse_range(params.get("from"), params.get("to"))
+        data = reports.report(since, until, agent_id=params.get("agent") or None)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+    return Response(data)
+
+@require_GET
+async def concurrency_timeline(request):
+    """
+    GET /api/reports/concurrency/?from=2026-10-01&to=2026-10-31&resolution=minute|hour
+    peak and average concurrent meetings / participants per bucket, streamed as NDJSON.
+    settled buckets are cached, so repeated queries over past ranges only compute what is new.
+    """
+    try:
+        since, until = reports.parse_range(request.GET.get("from"), request.GET.get("to"))
+        rows = timeline.timeline(since, until, request.GET.get("resolution", "hour"))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return StreamingHttpResponse(export.aiter_blocks(timeline.ndjson(rows)), content_type="application/x-ndjson")
 
 @api_view(["GET"])
 @permission_classes([AllowAny])
 def session_summary(request, session_id):
     # GET /api/sessions/<session_id>/summary/
     session = get_object_or_404(Session, id=session_id)
-    # all MeetingLinks for this session
-    links = (
-        MeetingLink.objects.filter(session=session)
-        .order_by("-created_at")
-    )
-
-    meetings_out = []
-    all_meeting_start_times = []
-    all_meeting_end_times = []
-
-    for link in links:
-        events = list(link.events.order_by("created_at"))
-
-        if events:
-            # participants
-            participants = sorted({e.identity for e in events if e.identity})
-
-            # call-level start/end based on joined/left if present
-            join_times = [e.created_at for e in events
-                          if e.event_type == "joined" and e.identity]
-            leave_times = [e.created_at for e in events
-                           if e.event_type == "left" and e.identity]
-
-            if join_times:
-                call_start = min(join_times)
-            else:
-                # fallback: first event
-                call_start = events[0].created_at
-
-            if leave_times:
-                call_end = max(leave_times)
-            else:
-                # fallback: last event
-                call_end = events[-1].created_at
-
-            call_duration_seconds = (call_end - call_start).total_seconds()
-
-            all_meeting_start_times.append(call_start)
-            all_meeting_end_times.append(call_end)
-
-            # screen share intervals for THIS meeting
-            screen_intervals = []   # [{identity, start, end, duration_seconds}, ...]
-            active_share = {}       # identity -> start_time
-
-            for e in events:
-                if e.event_type == "screen_share_started":
-                    active_share[e.identity] = e.created_at
-                elif e.event_type == "screen_share_stopped":
-                    start = active_share.pop(e.identity, None)
-                    if start:
-                        dur = (e.created_at - start).total_seconds()
-                        screen_intervals.append({
-                            "identity": e.identity,
-                            "start": start.isoformat(),
-                            "end": e.created_at.isoformat(),
-                            "duration_seconds": dur,
-                        })
-
-            # close any screen shares left open when meeting ended
-            for ident, start in active_share.items():
-                dur = (call_end - start).total_seconds()
-                screen_intervals.append({
-                    "identity": ident,
-                    "start": start.isoformat(),
-                    "end": call_end.isoformat(),
-                    "duration_seconds": dur,
-                })
-
-            total_screen_share_seconds = sum(
-                s["duration_seconds"] for s in screen_intervals
-            )
-
-        else:
-            participants = []
-            call_start = None
-            call_end = None
-            call_duration_seconds = None
-            screen_intervals = []
-            total_screen_share_seconds = 0
-
-        meetings_out.append(
-            {
-                "id": str(link.id),
-                "link_id": str(link.id),
-                "room_name": link.room_name,
-                # call-level timing
-                "started_at": call_start.isoformat() if call_start else None,
-                "ended_at": call_end.isoformat() if call_end else None,
-                "duration_seconds": call_duration_seconds,
-                "participants": participants,
-                #screen-share info per meeting
-                "screen_share_sessions": screen_intervals,
-                "total_screen_share_seconds": total_screen_share_seconds,
-            }
-        )
-
-    # overall session-level first/last meeting times
-    first_meeting_at = (
-        min(all_meeting_start_times).isoformat() if all_meeting_start_times else None
-    )
-    last_meeting_at = (
-        max(all_meeting_end_times).isoformat() if all_meeting_end_times else None
-    )
+    etag = make_etag("summary", session.id, session.version)
+    cached = not_modified(request, etag, session.updated_at)
+    if cached is not None:
+        return cached
+    # every meeting with its folded analytics state in one query
+    meetings_out, totals = session_report(session.id)
 
     session_data = {
         "id": str(session.id),
@@ -485,12 +781,10 @@ def session_summary(request, session_id):
         "customer_id": session.customer_id,
         "is_active": getattr(session, "is_active", True),
         "created_at": session.created_at.isoformat(),
-        "meeting_count": links.count(),
-        "first_meeting_at": first_meeting_at,
-        "last_meeting_at": last_meeting_at,
+        **totals,
     }
 
-    return Response({"session": session_data, "meetings": meetings_out})
+    return stamp(Response({"session": session_data, "meetings": meetings_out}), etag, session.updated_at)
 
 @api_view(["POST"])
 @permission_classes([AllowAny])
@@ -508,51 +802,48 @@ def save_room_sid(request,link_id):
         "room_sid":room_sid
     })
 
-def _twilio_client():
-    sid=getattr(settings,"TWILIO_ACCOUNT_SID",None)
-    token=getattr(settings,"TWILIO_AUTH_TOKEN",None)
-    if not sid or not token:
-        raise RuntimeError("Twilio credentials are not configured")
-    return Client(sid,token)
+def _enqueue_twilio_job(request, meeting, kind):
+    # 202 with the new job; the Twilio call itself runs in the background (chat/twilio_jobs.py)
+    if not twilio_jobs.configured():
+        return Response({"error": "Twilio credentials are not configured"}, status=503)
+    job = twilio_jobs.enqueue(
+        meeting,
+        kind,
+        identity=request.data.get("identity") or request.headers.get("X-User") or None,
+    )
+    body = twilio_jobs.describe(job)
+    body["poll"] = reverse("twilio_job_status", args=[job.id])
+    return Response(body, status=202)
 
 @api_view(["POST"])
 @permission_classes([AllowAny])
 def start_recording(request, link_id):
+    # POST /api/meetings/<link_id>/start-recording/ -> 202 {"id": job id, "poll": ...}
     meeting = get_object_or_404(MeetingLink, id=link_id)
     if not meeting.room_sid:
         return Response(
             {"error": "room_sid not saved"},
             status=400
         )
-    client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
-    client.video.rooms(meeting.room_sid).recording_rules.update(
-        rules=[{"type": "include", "all": True}]
-    )
-    return Response({
-        "status": "recording_started",
-        "room_sid": meeting.room_sid
-    })
+    return _enqueue_twilio_job(request, meeting, "recording_start")
 
 @api_view(["POST"])
 @permission_classes([AllowAny])
 def stop_recording(request, link_id):
+    # POST /api/meetings/<link_id>/stop-recording/ -> 202 {"id": job id, "poll": ...}
     meeting = get_object_or_404(MeetingLink, id=link_id)
     if not meeting.room_sid:
         return Response(
             {"error": "room_sid not saved"},
             status=400
         )
-    client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
-    client.video.rooms(meeting.room_sid).recording_rules.update(rules=[{"type": "exclude", "all": True}])
-    return Response({
-        "status": "recording_stopped",
-        "room_sid": meeting.room_sid
-    })
+    return _enqueue_twilio_job(request, meeting, "recording_stop")
 
 @api_view(["POST"])
 @permission_classes([AllowAny])
 def create_composition(request, link_id):
-    # POST /api/meetings/<link_id>/create-composition/
+    # POST /api/meetings/<link_id>/create-composition/ -> 202 {"id": job id, "poll": ...}
+    # the job logs composition_created with the composition sid once Twilio accepts it
     try:
         m = MeetingLink.objects.get(id=link_id)
     except MeetingLink.DoesNotExist:
@@ -561,18 +852,25 @@ def create_composition(request, link_id):
     if not m.room_sid:
         return Response({"error":"missing_room_sid"}, status=400)
 
-    try:
-        client = _twilio_client()
-        comp = client.video.compositions.create(
-            room_sid=m.room_sid,
-            audio_sources="*",
-            video_layout={"grid": {"video_sources": ["*"]}},
-            format="mp4",
-        )
-        MeetingEvent.objects.create(meeting=m, session=m.session,
-                                    event_type="composition_created",
-                                    identity=request.data.get("identity"),
-                                    metadata={"composition_sid": comp.sid})
-        return Response({"composition_sid": comp.sid, "status": comp.status})
-    except Exception as e:
-        return Response({"error": str(e)}, status=500)
+    return _enqueue_twilio_job(request, m, "composition")
+
+@require_GET
+async def twilio_job_status(request, job_id):
+    """
+    GET /api/twilio-jobs/<job_id>/?wait=<seconds>
+    the job's status row. with wait, the response is held until the job has succeeded or
+    failed (or the wait runs out), so clients get the result without polling in a loop.
+    """
+    conf = getattr(settings, "CHAT_TWILIO_JOBS", {})
+    wait = int_param(request.GET, "wait", 0, 0, conf.get("MAX_WAIT_SECONDS", 30))
+    interval = conf.get("WAIT_POLL_SECONDS", 0.5)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    while True:
+        job = await database_sync_to_async(twilio_jobs.snapshot)(job_id)
+        if job is None:
+            return JsonResponse({"error": "not_found"}, status=404)
+        left = deadline - loop.time()
+        if job["status"] in twilio_jobs.DONE or left <= 0:
+            return JsonResponse(job)
+        await asyncio.sleep(min(interval, left))
@@ -0,0 +1,108 @@
+#wire encodings for the session websocket.
+#json (default): text frames, same shapes the widget has always received.
+#msgpack: binary frames with short keys for the hot events, negotiated with the
+#"chat.msgpack.v1" subprotocol or ?proto=msgpack.
+#group events are encoded once by the producer (with_frames) and every recipient
+#just forwards the pre-encoded frame for its protocol.
+import json
+from urllib.parse import parse_qs
+import msgpack
+
+JSON="json"
+MSGPACK="msgpack"
+SUBPROTOCOLS={
+    "chat.json.v1":JSON,
+    "chat.msgpack.v1":MSGPACK,
+}
+
+#short keys accepted in inbound binary frames
+SHORT_IN={
+    "a":"action",
+    "x":"text",
+    "k":"client_id",
+    "u":"user",
+    "r":"role",
+    "q":"last_seq",
+}
+
+
+def negotiate(scope):
+    #returns (protocol, subprotocol to accept with or None)
+    for sub in scope.get("subprotocols") or []:
+        if sub in SUBPROTOCOLS:
+            return SUBPROTOCOLS[sub],sub
+    qs=parse_qs(scope.get("query_string",b"").decode("latin-1"))
+    if qs.get("proto",[""])[0]==MSGPACK:
+        return MSGPACK,None
+    return JSON,None
+
+
+def _public(event):
+    return {k:v for k,v in event.items() if not k.startswith("_")}
+
+
+def client_message(event):
+    #the dict JSON clients receive for a group event
+    t=event.get("type")
+    if t=="meeting_started":
+        return {"type":"meeting.started","session_id":event["session_id"],"link_id":event["link_id"]}
+    return _public(event)
+
+
+def compact_message(event):
+    #short-key form of a group event for binary clients
+    t=event.get("type")
+    if t=="chat.message":
+        return {
+            "t":"m",
+            "i":event["id"],
+            "q":event.get("seq"),
+            "s":event["sender"],
+            "r":event["role"],
+            "x":event["text"],
+            "c":event["created_at"],
+        }
+    if t=="presence.update":
+        return {"t":"p","a":event.get("action"),"u":event.get("user"),"r":event.get("role")}
+    if t=="meeting_started":
+        return {"t":"ms","l":event["link_id"]}
+    return client_message(event)
+
+
+def encode(content,protocol):
+    if protocol==MSGPACK:
+        return msgpack.packb(content,use_bin_type=True)
+    return json.dumps(content)
+
+
+def with_frames(event):
+    #attach both encodings to a group event before group_send
+    event["_json"]=json.dumps(client_message(event))
+    event["_bin"]=msgpack.packb(compact_message(event),use_bin_type=True)
+    return event
+
+
+def frame_for(event,protocol):
+    #pre-encoded frame for this protocol, encoding on the spot for events that
+    #weren't sent through with_frames (e.g. replayed from the DB)
+    key="_bin" if protocol==MSGPACK else "_json"
+    frame=event.get(key)
+    if frame is None:
+        frame=encode(compact_message(event) if protocol==MSGPACK else client_message(event),protocol)
+    return frame
+
+
+def decode(text_data=None,bytes_data=None):
+    #inbound frame -> dict. raises ValueError on garbage
+    if text_data is not None:
+        data=json.loads(text_data)
+    else:
+        try:
+            data=msgpack.unpackb(bytes_data,raw=False)
+        except Exception as e:
+            raise ValueError(str(e))
+        if isinstance(data,dict):
+            data={SHORT_IN.get(k,k):v for k,v in data.items()}
+    if not isinstance(data,dict):
+        raise ValueError("frame is not an object")
+    return data
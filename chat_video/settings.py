@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 from dotenv import load_dotenv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -56,6 +57,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'chat.middleware.RequestTimingMiddleware',
 ]
 
 ROOT_URLCONF = 'chat_video.urls'
@@ -145,8 +147,130 @@ CHANNEL_LAYERS = {
     }
 }
 
+#presence registry shared by all ASGI workers on this host.
+#use chat.presence.MemoryPresence for tests / a single worker.
+CHAT_PRESENCE = {
+    "BACKEND": "chat.presence.SQLitePresence",
+    "OPTIONS": {"path": BASE_DIR / "presence.sqlite3"},
+}
+#the test runner keeps presence in memory rather than writing presence.sqlite3
+if sys.argv[1:2] == ["test"]:
+    CHAT_PRESENCE = {"BACKEND": "chat.presence.MemoryPresence"}
+
+#write-behind batching for websocket chat messages
+CHAT_MESSAGE_BATCH = {
+    "MAX_SIZE": 100,
+    "MAX_DELAY_MS": 5,
+}
+
+#reconnect replay: recent frames kept per session group, and the most a DB
+#fallback resume will send before telling the client to page through REST
+CHAT_REPLAY = {
+    "BUFFER_SIZE": 256,
+    "DB_LIMIT": 500,
+}
+
+#worker-local cache of session metadata used by SessionConsumer
+CHAT_SESSION_CACHE = {
+    "MAX_SIZE": 10000,
+    "TTL": 30,
+}
+
+#per-connection outbound queue: frames that can be waiting, and how long the
+#oldest one may wait before the client is disconnected as a slow consumer
+CHAT_OUTBOX = {
+    "MAX_SIZE": 500,
+    "MAX_LAG_SECONDS": 10,
+}
+
+#logging: chat.* loggers are quiet unless CHAT_LOG_LEVEL asks for more
+#(e.g. CHAT_LOG_LEVEL=DEBUG to see websocket connect/disconnect)
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "plain": {"format": "%(asctime)s %(levelname)s %(name)s %(message)s"},
+    },
+    "handlers": {
+        "console": {"class": "logging.StreamHandler", "formatter": "plain"},
+    },
+    "loggers": {
+        "chat": {
+            "handlers": ["console"],
+            "level": os.environ.get("CHAT_LOG_LEVEL", "WARNING"),
+            "propagate": False,
+        },
+    },
+}
+
 #twilio config
 TWILIO_ACCOUNT_SID = os.environ.get('TWILIO_ACCOUNT_SID')
 TWILIO_API_KEY_SID = os.environ.get('TWILIO_API_KEY_SID')
 TWILIO_API_KEY_SECRET = os.environ.get('TWILIO_API_KEY_SECRET')
-TWILIO_AUTH_TOKEN = os.environ.get('TWILIO_AUTH_TOKEN')
\ No newline at end of file
+TWILIO_AUTH_TOKEN = os.environ.get('TWILIO_AUTH_TOKEN')
+#closed sessions older than AFTER_DAYS are moved into compressed SessionArchive
+#blobs by `manage.py archive_sessions`, BATCH sessions per round
+CHAT_ARCHIVE = {
+    "AFTER_DAYS": 30,
+    "BATCH": 100,
+}
+
+#batched meeting events: most events per POST, and how far in the past a client
+#timestamp may be before it is clamped
+CHAT_MEETING_EVENTS = {
+    "MAX_BATCH": 200,
+    "MAX_CLOCK_SKEW_SECONDS": 300,
+}
+
+#/api/reports/ and manage.py meeting_report: longest date range one report may cover
+CHAT_REPORTS = {
+    "MAX_DAYS": 366,
+}
+
+#concurrency timeline: meetings are assumed to last at most MAX_MEETING_HOURS, so
+#older buckets are final and cached; MAX_BUCKETS per request, computed SPAN_BUCKETS
+#at a time
+CHAT_TIMELINE = {
+    "MAX_MEETING_HOURS": 24,
+    "MAX_BUCKETS": 50000,
+    "SPAN_BUCKETS": 1440,
+}
+
+#issue_meeting_token: signed tokens live TTL seconds and are reused per (link, identity)
+#until REUSE_MARGIN seconds before they expire (or the link does)
+CHAT_MEETING_TOKENS = {
+    "MAX_SIZE": 10000,
+    "TTL": 3600,
+    "REUSE_MARGIN": 300,
+}
+
+#validate_meeting_link / issue_meeting_token link snapshots: worker-local LRU entries live
+#TTL seconds (never past the link's expires_at); unknown and expired links are cached
+#too. SHARED_CACHE names a CACHES alias (e.g. redis) shared by all workers, or None
+CHAT_LINK_CACHE = {
+    "MAX_SIZE": 10000,
+    "TTL": 300,
+    "NOT_FOUND_TTL": 30,
+    "EXPIRED_TTL": 3600,
+    "SHARED_CACHE": None,
+}
+
+#recording-rule and composition calls run as TwilioJob rows on a WORKERS-thread pool in
+#the web process (INLINE) and/or `manage.py run_twilio_jobs`. failed calls are retried
+#MAX_ATTEMPTS times, BACKOFF_SECONDS doubling per attempt (capped); running jobs older
+#than STALE_SECONDS are requeued. one pooled REST client (POOL_SIZE keep-alive
+#connections, TIMEOUT seconds per call); API_BASE sends its requests to another host,
+#e.g. a local fake Twilio. GET /api/twilio-jobs/<id>/?wait= holds up to MAX_WAIT_SECONDS
+CHAT_TWILIO_JOBS = {
+    "INLINE": True,
+    "WORKERS": 4,
+    "MAX_ATTEMPTS": 5,
+    "BACKOFF_SECONDS": 2,
+    "MAX_BACKOFF_SECONDS": 300,
+    "STALE_SECONDS": 600,
+    "POOL_SIZE": 4,
+    "TIMEOUT": 10,
+    "API_BASE": os.environ.get("TWILIO_API_BASE") or None,
+    "MAX_WAIT_SECONDS": 30,
+    "WAIT_POLL_SECONDS": 0.5,
+}
@@ -16,8 +16,10 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path,include
+from chat.views import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/',include('chat.urls')),
+    path('metrics',metrics_view,name='metrics'),
 ]
@@ -8,6 +8,27 @@ export default function AnalyticsPage({ apiBase = "http://127.0.0.1:8000/api", l
     summary: null,
     events: [],
   });
+  // the summary is loaded without the event log (?include_events=0); the log on demand
+  const [eventsLoaded, setEventsLoaded] = useState(false);
+  const [eventsLoading, setEventsLoading] = useState(false);
+
+  async function loadEvents() {
+    try {
+      setEventsLoading(true);
+      const res = await fetch(`${apiBase}/meetings/${linkId}/analytics/`);
+      const data = await res.json().catch(() => ({}));
+      if (!res.ok) {
+        throw new Error(data.error || `Failed to load events (status ${res.status})`);
+      }
+      setState((prev) => ({ ...prev, events: data.events || [] }));
+      setEventsLoaded(true);
+    } catch (e) {
+      console.error("analytics events fetch error", e);
+      setState((prev) => ({ ...prev, error: e.message || "Failed to load events." }));
+    } finally {
+      setEventsLoading(false);
+    }
+  }
 
   useEffect(() => {
     if (!linkId) {
@@ -23,7 +44,7 @@ export default function AnalyticsPage({ apiBase = "http://127.0.0.1:8000/api", l
 
     async function load() {
       try {
-        const res = await fetch(`${apiBase}/meetings/${linkId}/analytics/`);
+        const res = await fetch(`${apiBase}/meetings/${linkId}/analytics/?include_events=0`);
         const data = await res.json().catch(() => ({}));
 
         if (!res.ok) {
@@ -56,6 +77,7 @@ export default function AnalyticsPage({ apiBase = "http://127.0.0.1:8000/api", l
       }
     }
 
+    setEventsLoaded(false);
     load();
   }, [linkId, apiBase]);
 
@@ -144,7 +166,22 @@ export default function AnalyticsPage({ apiBase = "http://127.0.0.1:8000/api", l
           {/* Raw events table */}
           <section style={{ marginTop: 24 }}>
             <h2 style={{ fontSize: 18 }}>Event log</h2>
-            {events.length === 0 ? (
+            {!eventsLoaded ? (
+              <button
+                onClick={loadEvents}
+                disabled={eventsLoading}
+                style={{
+                  padding: "6px 10px",
+                  borderRadius: 6,
+                  border: "1px solid #e5e7eb",
+                  background: "#ffffff",
+                  fontSize: 13,
+                  cursor: "pointer",
+                }}
+              >
+                {eventsLoading ? "Loading…" : "Load event log"}
+              </button>
+            ) : events.length === 0 ? (
               <p style={{ fontSize: 14 }}>No events recorded.</p>
             ) : (
               <div
@@ -9,16 +9,59 @@ export default function ChatRoom({ sessionId, user, role, apiBase = "http://127.
   const [text, setText] = useState("");
   const messagesRef = useRef(null);
   const [sendingInvite,setSendingInvite]=useState(false);
+  // highest message seq we have seen, sent on reconnect so the server only replays the gap
+  const lastSeqRef = useRef(0);
 
-  // Load initial messages
+  const trackSeq = (seq) => {
+    if (typeof seq === "number" && seq > lastSeqRef.current) lastSeqRef.current = seq;
+  };
+
+  // append a message unless we already have it (replayed frames can overlap)
+  const addMessage = (m) => {
+    trackSeq(m.seq);
+    setMessages((prev) => (prev.some((p) => String(p.id) === String(m.id)) ? prev : [...prev, m]));
+  };
+
+  // cursor for the next older page, null once we reached the start of the session
+  const [olderCursor, setOlderCursor] = useState(null);
+  const [loadingOlder, setLoadingOlder] = useState(false);
+
+  // Load the newest page of messages
   useEffect(() => {
     if (!sessionId) return;
-    fetch(`${apiBase}/sessions/${sessionId}/messages/`)
+    lastSeqRef.current = 0;
+    fetch(`${apiBase}/sessions/${sessionId}/messages/?order=newest&limit=50`)
       .then((r) => r.json())
-      .then((arr) => setMessages(arr || []))
+      .then((page) => {
+        const arr = (page && page.results) || [];
+        arr.forEach((m) => trackSeq(m.seq));
+        setMessages(arr);
+        setOlderCursor(page && page.has_more ? page.before_cursor : null);
+      })
       .catch((e) => console.error("load messages:", e));
   }, [sessionId, apiBase]);
 
+  async function loadOlder() {
+    if (!olderCursor || loadingOlder) return;
+    setLoadingOlder(true);
+    try {
+      const res = await fetch(
+        `${apiBase}/sessions/${sessionId}/messages/?before=${encodeURIComponent(olderCursor)}&limit=50`
+      );
+      const page = await res.json();
+      const arr = page.results || [];
+      setMessages((prev) => {
+        const seen = new Set(prev.map((m) => String(m.id)));
+        return [...arr.filter((m) => !seen.has(String(m.id))), ...prev];
+      });
+      setOlderCursor(page.has_more ? page.before_cursor : null);
+    } catch (e) {
+      console.error("load older messages:", e);
+    } finally {
+      setLoadingOlder(false);
+    }
+  }
+
   // WebSocket setup
   useEffect(() => {
   if (!sessionId || !user) return;
@@ -29,103 +72,127 @@ export default function ChatRoom({ sessionId, user, role, apiBase = "http://127.
 
   console.log("ChatRoom: opening WS", { url, user, role });
 
-  const socket = new WebSocket(url);
-
-  socket.onopen = () => {
-    console.log("WS opened", { sessionId, user, role });
-    setConnected(true);
-    socket.send(JSON.stringify({ action: "identify", user, role }));
-  };
-
-  socket.onmessage = (ev) => {
-    console.log("WS EVENT RAW:", ev.data); 
-
-    let data;
-    try {
-      data = JSON.parse(ev.data);
-    } catch (e) {
-      console.error("WS JSON parse error", e, ev.data);
-      return;
-    }
+  let socket = null;
+  let closedByUs = false;
+  let retry = 0;
+  let retryTimer = null;
+
+  const connect = () => {
+    socket = new WebSocket(url);
+
+    socket.onopen = () => {
+      console.log("WS opened", { sessionId, user, role });
+      setConnected(true);
+      retry = 0;
+      // on a reconnect, last_seq makes the server replay only what we missed while
+      // disconnected; a first connect already has the history from REST
+      const identify = { action: "identify", user, role };
+      if (lastSeqRef.current > 0) identify.last_seq = lastSeqRef.current;
+      socket.send(JSON.stringify(identify));
+    };
+
+    socket.onmessage = (ev) => {
+      console.log("WS EVENT RAW:", ev.data); 
+
+      let data;
+      try {
+        data = JSON.parse(ev.data);
+      } catch (e) {
+        console.error("WS JSON parse error", e, ev.data);
+        return;
+      }
 
-    const t = data.type;
-    console.log("WS EVENT PARSED:", t, data);
+      const t = data.type;
+      console.log("WS EVENT PARSED:", t, data);
 
-    const isChatMsg =
-      t === "message" ||
-      t === "chat.message" ||
-      t === "chat_message";
+      const isChatMsg =
+        t === "message" ||
+        t === "chat.message" ||
+        t === "chat_message";
 
-    const isPresence =
-      t === "presence" ||
-      t === "presence.update" ||
-      t === "presence_update";
+      const isPresence =
+        t === "presence" ||
+        t === "presence.update" ||
+        t === "presence_update";
 
-    const isIdent = t === "identified";
+      const isIdent = t === "identified";
 
-    const isMeeting = t === "meeting.started" || t === "meeting_started";
+      const isMeeting = t === "meeting.started" || t === "meeting_started";
 
-    if (isChatMsg) {
-      setMessages((prev) => [
-        ...prev,
-        {
+      if (isChatMsg) {
+        addMessage({
           id: data.id,
+          seq: data.seq,
           sender: data.sender,
           role: data.role,
           text: data.text || data.message,
           created_at: data.created_at,
-        },
-      ]);
-      return;
-    }
-
-    if (isPresence) {
-      if (data.action === "joined") {
-        setOnline((o) => Array.from(new Set([...o, data.user])));
-      } else if (data.action === "left") {
-        setOnline((o) => o.filter((u) => u !== data.user));
+        });
+        return;
       }
-      return;
-    }
-
-    if (isIdent) {
-      setOnline(data.online || []);
-      return;
-    }
 
-    if (isMeeting) {
-      console.log("WS meeting.started for role", role, data);
+      if (t === "ack" || t === "resumed" || t === "session.closed") {
+        return;
+      }
 
-      if (role === "agent") {
-        const identity = user || "agent";
-        const joinUrl = `${window.location.origin}/meet/${data.link_id}?identity=${encodeURIComponent(
-          identity
-        )}&auto_join=1&role=agent`;
+      if (isPresence) {
+        if (data.action === "joined") {
+          setOnline((o) => Array.from(new Set([...o, data.user])));
+        } else if (data.action === "left") {
+          setOnline((o) => o.filter((u) => u !== data.user));
+        }
+        return;
+      }
 
-        console.log("Agent redirecting to", joinUrl);
-        // Same-tab navigation so browser cannot block it
-        window.location.href = joinUrl;
+      if (isIdent) {
+        setOnline(data.online || []);
+        return;
       }
-      return;
-    }
 
-    console.log("WS OTHER EVENT:", data);
-  };
+      if (isMeeting) {
+        console.log("WS meeting.started for role", role, data);
 
-  socket.onerror = (err) => {
-    console.error("WS error", err);
-  };
+        if (role === "agent") {
+          const identity = user || "agent";
+          const joinUrl = `${window.location.origin}/meet/${data.link_id}?identity=${encodeURIComponent(
+            identity
+          )}&auto_join=1&role=agent`;
 
-  socket.onclose = () => {
-    console.log("WS closed", { sessionId, user, role });
-    setConnected(false);
-    setWs(null);
+          console.log("Agent redirecting to", joinUrl);
+          // Same-tab navigation so browser cannot block it
+          window.location.href = joinUrl;
+        }
+        return;
+      }
+
+      console.log("WS OTHER EVENT:", data);
+    };
+
+    socket.onerror = (err) => {
+      console.error("WS error", err);
+    };
+
+    socket.onclose = (ev) => {
+      console.log("WS closed", { sessionId, user, role, code: ev.code });
+      setConnected(false);
+      setWs(null);
+      // 4404 = unknown session, 4410 = session closed: reconnecting won't help
+      if (closedByUs || ev.code === 4404 || ev.code === 4410) return;
+      // reconnect with backoff, the identify on open resumes from lastSeqRef
+      const delay = Math.min(1000 * 2 ** retry, 15000);
+      retry += 1;
+      retryTimer = setTimeout(connect, delay);
+    };
+
+    setWs(socket);
   };
 
-  setWs(socket);
+  connect();
 
   return () => {
     console.log("ChatRoom: closing WS", { sessionId, user, role });
+    closedByUs = true;
+    clearTimeout(retryTimer);
     if (socket && socket.readyState === 1) {
       socket.close();
     }
@@ -310,6 +377,16 @@ export default function ChatRoom({ sessionId, user, role, apiBase = "http://127.
           boxSizing: "border-box",
         }}
       >
+        {olderCursor && (
+          <button
+            type="button"
+            onClick={loadOlder}
+            disabled={loadingOlder}
+            style={{ display: "block", margin: "0 auto 8px", fontSize: 12, padding: "2px 8px" }}
+          >
+            {loadingOlder ? "Loading..." : "Load older messages"}
+          </button>
+        )}
         {messages.map((m) => (
           <div key={m.id} style={{ marginBottom: 8 }}>
             <div style={{ fontSize: 12, color: "#555" }}>
@@ -4,17 +4,22 @@ export default function SessionsLogPage({ apiBase = "http://127.0.0.1:8000/api"
   const [sessions, setSessions] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
+  const [nextCursor, setNextCursor] = useState(null);
 
-  async function loadSessions() {
+  // cursor=null loads the newest page, otherwise appends the next (older) one
+  async function loadSessions(cursor = null) {
     try {
       setLoading(true);
       setError(null);
-      const res = await fetch(`${apiBase}/sessions/history/`);
+      const qs = cursor ? `?cursor=${encodeURIComponent(cursor)}` : "";
+      const res = await fetch(`${apiBase}/sessions/history/${qs}`);
       const data = await res.json();
       if (!res.ok) {
         throw new Error(data.detail || data.error || `Failed (status ${res.status})`);
       }
-      setSessions(data || []);
+      const rows = data.results || [];
+      setSessions((prev) => (cursor ? [...prev, ...rows] : rows));
+      setNextCursor(data.has_more ? data.next_cursor : null);
     } catch (e) {
       console.error("sessions history error", e);
       setError(e.message || "Failed to load sessions history.");
@@ -94,7 +99,7 @@ export default function SessionsLogPage({ apiBase = "http://127.0.0.1:8000/api"
           )}
         </div>
         <button
-          onClick={loadSessions}
+          onClick={() => loadSessions()}
           style={{
             padding: "6px 10px",
             borderRadius: 6,
@@ -206,6 +211,26 @@ export default function SessionsLogPage({ apiBase = "http://127.0.0.1:8000/api"
           </tbody>
         </table>
       </div>
+
+      {nextCursor && (
+        <div style={{ marginTop: 12, textAlign: "center" }}>
+          <button
+            onClick={() => loadSessions(nextCursor)}
+            disabled={loading}
+            style={{
+              padding: "6px 10px",
+              borderRadius: 6,
+              border: "1px solid #e5e7eb",
+              background: "#ffffff",
+              fontSize: 13,
+              cursor: "pointer",
+              color: "#111827",
+            }}
+          >
+            Load more
+          </button>
+        </div>
+      )}
     </div>
   );
 }
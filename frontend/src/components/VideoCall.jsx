@@ -50,24 +50,82 @@ export default function VideoCall({ token, roomName, sessionId, identity,linkId,
     const stopRecBtn=stopRecBtnRef.current;
     const createCompBtn=createCompBtnRef.current;
 
-    async function logEvent(eventType,extra={}){
-        if(!linkId) return;
-        try{
-            await fetch(`${apiBase}/meetings/${linkId}/events/`,{
-                method: "POST",
-                headers: { "Content-Type": "application/json" },
-                body: JSON.stringify({
-                event_type: eventType,
-                identity,
-                role: extra.role || undefined,
-                metadata: extra.metadata || undefined,
-
-            }),
-        });
-    } catch(e){
-        console.debug("meeting_event log error",e);
+    // meeting events are queued with the local time and a per-tab sequence number,
+    // then sent in batches; the server drops any client_seq it already stored, so a
+    // failed batch can simply be resent
+    const eventClientId =
+      (window.crypto && window.crypto.randomUUID && window.crypto.randomUUID()) ||
+      `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+    const EVENT_FLUSH_MS = 2000;
+    const EVENT_BATCH_MAX = 200;
+    let eventSeq = 0;
+    let pendingEvents = [];
+    let eventFlushTimer = null;
+    let eventFlushing = null;
+
+    function scheduleEventFlush() {
+      if (eventFlushTimer) return;
+      eventFlushTimer = setTimeout(() => {
+        eventFlushTimer = null;
+        flushEvents();
+      }, EVENT_FLUSH_MS);
+    }
+
+    async function flushEvents({ keepalive = false } = {}) {
+      if (eventFlushTimer) {
+        clearTimeout(eventFlushTimer);
+        eventFlushTimer = null;
+      }
+      if (eventFlushing) await eventFlushing;
+      if (!linkId || pendingEvents.length === 0) return;
+      const batch = pendingEvents.slice(0, EVENT_BATCH_MAX);
+      eventFlushing = (async () => {
+        let sent = false;
+        try {
+          const res = await fetch(`${apiBase}/meetings/${linkId}/events/batch/`, {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            // keepalive lets the last batch outlive the page on leave/unload
+            keepalive,
+            body: JSON.stringify({ client_id: eventClientId, identity, events: batch }),
+          });
+          // 4xx won't succeed on retry, drop the batch instead of looping
+          sent = res.ok || (res.status >= 400 && res.status < 500);
+          if (!res.ok) console.debug("meeting_events batch rejected", res.status);
+        } catch (e) {
+          console.debug("meeting_events batch error", e);
+        }
+        if (sent) {
+          const last = batch[batch.length - 1].client_seq;
+          pendingEvents = pendingEvents.filter((e) => e.client_seq > last);
+        }
+        return sent;
+      })();
+      const sent = await eventFlushing;
+      eventFlushing = null;
+      if (pendingEvents.length) {
+        if (sent && pendingEvents.length >= EVENT_BATCH_MAX) flushEvents({ keepalive });
+        else scheduleEventFlush();
+      }
+    }
+
+    async function logEvent(eventType, extra = {}) {
+      if (!linkId) return;
+      pendingEvents.push({
+        client_seq: ++eventSeq,
+        client_ts: new Date().toISOString(),
+        event_type: eventType,
+        role: extra.role || undefined,
+        metadata: extra.metadata || undefined,
+      });
+      if (pendingEvents.length >= EVENT_BATCH_MAX) flushEvents();
+      else scheduleEventFlush();
     }
-} 
+
+    function handlePageHide() {
+      flushEvents({ keepalive: true });
+    }
+    window.addEventListener("pagehide", handlePageHide);
 
     function setStatus(s) {
       if (statusTextEl) statusTextEl.textContent = s;
@@ -617,24 +675,46 @@ export default function VideoCall({ token, roomName, sessionId, identity,linkId,
 
     async function handleLeaveClick() {
       await logEvent("left");
+      await flushEvents({ keepalive: true });
       if (room) {
         room.disconnect();
       }
       if (onLeave) onLeave();
     }
 
+    // recording / composition requests are queued server-side (202 + job); wait for the
+    // job to succeed or fail, a long-poll at a time
+    async function waitForJob(job) {
+      const base = apiBase.replace(/\/$/, "").replace(/\/api$/, "");
+      for (let i = 0; i < 10; i++) {
+        const res = await fetch(`${base}${job.poll}?wait=20`);
+        job = { ...job, ...(await res.json().catch(() => ({}))) };
+        if (!res.ok || job.status === "succeeded" || job.status === "failed") break;
+      }
+      return job;
+    }
+
+    async function runTwilioJob(action, body) {
+      const res = await fetch(`${apiBase.replace(/\/$/, "")}/meetings/${linkId}/${action}/`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify(body),
+      });
+      const data = await res.json().catch(() => ({}));
+      if (!res.ok) {
+        console.error(`${action} failed`, data);
+        return data;
+      }
+      return waitForJob(data);
+    }
+
     async function startRecordingHandler(){
       if(!linkId) return alert("missing link id for record");
       setStatus("Starting recording...");
       try{
-        const res=await fetch(`${apiBase.replace(/\/$/,"")}/meetings/${linkId}/start-recording/`,{
-          method:"POST",
-          headers:{"Content-Type": "application/json"},
-          body: JSON.stringify({ identity, role }),
-        });
-        const data= await res.json().catch(()=>({}));
-        if(!res.ok){
-          console.error("start-recording failed", data);
+        const job = await runTwilioJob("start-recording", { identity, role });
+        if(job.status !== "succeeded"){
+          console.error("start-recording failed", job);
           setStatus("Recording start failed");
           return;
         }
@@ -651,14 +731,9 @@ export default function VideoCall({ token, roomName, sessionId, identity,linkId,
       if (!linkId) return alert("missing link id for record");
       setStatus("Stopping recording…");
       try {
-        const res = await fetch(`${apiBase.replace(/\/$/, "")}/meetings/${linkId}/stop-recording/`, {
-          method: "POST",
-          headers: { "Content-Type": "application/json" },
-          body: JSON.stringify({ identity, role }),
-        });
-        const data = await res.json().catch(() => ({}));
-        if (!res.ok) {
-          console.error("stop-recording failed", data);
+        const job = await runTwilioJob("stop-recording", { identity, role });
+        if (job.status !== "succeeded") {
+          console.error("stop-recording failed", job);
           setStatus("Recording stop failed");
           return;
         }
@@ -675,18 +750,14 @@ export default function VideoCall({ token, roomName, sessionId, identity,linkId,
       if (!linkId) return alert("missing link id for composition");
       setStatus("Creating composition…");
       try {
-        const res = await fetch(`${apiBase.replace(/\/$/, "")}/meetings/${linkId}/create-composition/`, {
-          method: "POST",
-          headers: { "Content-Type": "application/json" },
-        });
-        const data = await res.json().catch(() => ({}));
-        if (!res.ok) {
-          console.error("create-composition failed", data);
+        // the server logs composition_created itself once Twilio accepts the request
+        const job = await runTwilioJob("create-composition", { identity, role });
+        if (job.status !== "succeeded") {
+          console.error("create-composition failed", job);
           setStatus("Composition failed");
           return;
         }
-        setStatus("Composition created: " + (data.composition_sid || "ok"));
-        await logEvent("composition_created", { metadata: { sid: data.composition_sid } });
+        setStatus("Composition created: " + (job.result?.composition_sid || "ok"));
       } catch (err) {
         console.error("createComposition error", err);
         setStatus("Composition error");
@@ -735,6 +806,8 @@ export default function VideoCall({ token, roomName, sessionId, identity,linkId,
       if (startRecBtn) startRecBtn.removeEventListener("click",startRecordingHandler);
       if (stopRecBtn) stopRecBtn.removeEventListener("click",stopRecordingHandler);
       if(createCompBtn) createCompBtn.removeEventListener("click",createCompositionHandler);
+      window.removeEventListener("pagehide", handlePageHide);
+      flushEvents({ keepalive: true });
       try {
         if (room) room.disconnect();
       } catch (_) {}